@@ -2,24 +2,67 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 
+from app.utils.replicas import RoutingSession
+
 # Initialize DB here (outside create_app to avoid circular imports)
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 from flask_cors import CORS
 
-def create_app():
+def create_app(config_object='app.config.Config'):
     app = Flask(__name__)
-    app.config.from_object('app.config.Config')
+    app.config.from_object(config_object)
 
     # Initialize db with app
     db.init_app(app)
     CORS(app)
+
+    from app.utils.replicas import replica_router
+    replica_router.init_app(app)
+
+    from app.utils.query_budget import init_query_budgets
+    init_query_budgets(app)
+
+    from app.utils.metrics import metrics
+    metrics.init_app(app)
+
+    from app.cache import cache
+    cache.init_app(app)
+
+    from app.services.like_buffer import like_buffer
+    like_buffer.init_app(app)
+
+    from app.services.event_broadcaster import broadcaster
+    broadcaster.init_app(app)
+
+    from app.services.ranking_service import ranking
+    ranking.init_app(app)
+
+    from app.services.market_data import market_data
+    market_data.init_app(app)
+
     from app.models.models import User
     from app.models.models import Posts
 
     from app.routes import init_routes
     init_routes(app)  # Register all routes
 
-    with app.app_context():
-        db.create_all()
+    from app.commands import init_commands
+    init_commands(app)
+
+    # Registers the listeners that partition posts and comment as they are created
+    from app.services.partitions import partitions
+
+    if app.config.get('DB_CREATE_ALL', True):
+        with app.app_context():
+            db.create_all()
+
+    partitions.init_app(app)
+
+    # After create_all: the flusher starts by replaying logs left by dead processes
+    from app.services.write_behind import write_behind
+    write_behind.init_app(app)
+
+    from app.services.reference_data import reference_data
+    reference_data.init_app(app)
 
     return app
\ No newline at end of file
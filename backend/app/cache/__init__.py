@@ -0,0 +1,113 @@
+import logging
+import time
+import uuid
+
+from app.cache.backends import CacheStats, LRUCache, RedisCache
+from app.utils.replicas import primary_reads
+
+logger = logging.getLogger(__name__)
+
+
+class Cache:
+    """Read-through cache for endpoint payloads, invalidated by tag.
+
+    Every entry is stored under its key plus the current version token of each of its
+    tags, so invalidating a tag just swaps its token and every entry that depended on
+    it stops being addressable (and ages out through LRU/TTL). Tokens are random, so a
+    version that was itself evicted can never bring an older entry back.
+
+    Tokens also carry the time of the invalidation. Entries rebuilt within
+    REPLICA_MAX_LAG_SECONDS of one are read from the primary, since a replica may not
+    have the write yet and would otherwise be cached stale for a whole TTL.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.primary_refill_seconds = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('CACHE_BACKEND', 'memory')
+        self.primary_refill_seconds = app.config.get('REPLICA_MAX_LAG_SECONDS', 0)
+        ttl = app.config.get('CACHE_DEFAULT_TTL', 30)
+        if kind == 'memory':
+            self.backend = LRUCache(app.config.get('CACHE_MAX_ENTRIES', 10000), ttl)
+        elif kind == 'redis':
+            self.backend = RedisCache.from_url(app.config['CACHE_REDIS_URL'], default_ttl=ttl)
+        elif kind in (None, 'none'):
+            self.backend = None
+        else:
+            raise ValueError('Unknown CACHE_BACKEND {}'.format(kind))
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _versions(self, tags):
+        version_keys = ['tag:' + tag for tag in tags]
+        versions = self.backend.get_many(version_keys)
+        for i, version in enumerate(versions):
+            if version is None:
+                self.backend.set(version_keys[i], uuid.uuid4().hex, ttl=0, only_if_missing=True)
+                versions[i] = self.backend.get(version_keys[i])
+        return versions
+
+    def _recently_invalidated(self, versions):
+        cutoff = time.time() - self.primary_refill_seconds
+        return any(float(version.partition('.')[2] or 0) > cutoff for version in versions)
+
+    def get_or_set(self, key, tags, producer, ttl=None):
+        """Return the cached payload for key, or build it with producer() and store it"""
+        if not self.enabled:
+            return producer()
+
+        try:
+            versions = self._versions(tags)
+            versioned = '{}|{}'.format(key, ','.join(versions))
+            value = self.backend.get(versioned)
+        except Exception:
+            logger.exception('Cache read failed for %s', key)
+            return producer()
+
+        if value is not None:
+            self.backend.stats.hits += 1
+            return value
+
+        self.backend.stats.misses += 1
+        if self._recently_invalidated(versions):
+            with primary_reads():
+                value = producer()
+        else:
+            value = producer()
+        try:
+            self.backend.set(versioned, value, ttl)
+            self.backend.stats.sets += 1
+        except Exception:
+            logger.exception('Cache write failed for %s', key)
+        return value
+
+    def invalidate(self, *tags):
+        if not self.enabled:
+            return
+        for tag in tags:
+            try:
+                self.backend.set('tag:' + tag, '{}.{:.3f}'.format(uuid.uuid4().hex, time.time()), ttl=0)
+                self.backend.stats.invalidations += 1
+            except Exception:
+                logger.exception('Cache invalidation failed for %s', tag)
+
+    def stats(self):
+        if not self.enabled:
+            return {'backend': None}
+        data = self.backend.stats.to_dict()
+        data['backend'] = type(self.backend).__name__
+        data['size'] = self.backend.size()
+        if isinstance(self.backend, RedisCache):
+            data['evictions'] = self.backend.evictions()
+        return data
+
+
+cache = Cache()
+
+__all__ = ['Cache', 'CacheStats', 'LRUCache', 'RedisCache', 'cache']
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheStats:
+    """Counters shared by every backend, read through Cache.stats()"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def to_dict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'sets': self.sets,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'hit_ratio': self.hits / (self.hits + self.misses) if self.hits + self.misses else None,
+        }
+
+
+class LRUCache:
+    """In-process LRU cache with per-entry TTL, safe to share between request threads"""
+
+    def __init__(self, max_entries=10000, default_ttl=30):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= now:
+            del self._entries[key]
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            return None if entry is None else entry[1]
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            entries = [self._live(key, now) for key in keys]
+        return [None if entry is None else entry[1] for entry in entries]
+
+    def set(self, key, value, ttl=None, only_if_missing=False):
+        """Store a value, returns False if only_if_missing and a live entry exists"""
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            if only_if_missing and self._live(key, now) is not None:
+                return False
+            self._entries[key] = (now + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def size(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Cache on any client speaking the redis-py API (redis.Redis, or a local stand-in in tests)"""
+
+    def __init__(self, client, default_ttl=30, prefix='ssi:'):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        raw = self.client.mget([self.prefix + key for key in keys])
+        return [None if value is None else json.loads(value) for value in raw]
+
+    def set(self, key, value, ttl=None, only_if_missing=False):
+        ttl = self.default_ttl if ttl is None else ttl
+        return bool(self.client.set(self.prefix + key, json.dumps(value),
+                                    ex=ttl or None, nx=only_if_missing))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def size(self):
+        return self.client.dbsize()
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+    def evictions(self):
+        """Server-side evicted key count, Redis does not report evictions per client"""
+        try:
+            return self.client.info('stats').get('evicted_keys', 0)
+        except Exception:
+            return None
@@ -0,0 +1,19 @@
+"""Invalidation tags shared by the cached GET routes and the service write paths"""
+
+FEED = 'posts'
+
+
+def user_posts(user_id):
+    return 'posts:user:{}'.format(user_id)
+
+
+def symbol_posts(symbol_code):
+    return 'posts:symbol:{}'.format(symbol_code)
+
+
+def comments(post_id):
+    return 'comments:{}'.format(post_id)
+
+
+def user(username):
+    return 'user:{}'.format(username)
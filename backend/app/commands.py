@@ -0,0 +1,91 @@
+import click
+
+
+def init_commands(app):
+    @app.cli.command('create-tables')
+    def create_tables():
+        """Create missing tables and indexes, for deployments that boot with DB_CREATE_ALL off"""
+        from app import db
+        db.create_all()
+        click.echo('Created missing tables')
+
+    @app.cli.command('backfill-rollups')
+    def backfill_rollups():
+        """Rebuild the per-symbol sentiment rollups from existing posts"""
+        from app.services.sentiment_service import SentimentService
+        buckets = SentimentService.backfill()
+        click.echo('Rebuilt {} sentiment rollup buckets'.format(buckets))
+
+    @app.cli.command('create-search-index')
+    def create_search_index():
+        """Create the full-text GIN index on an existing Postgres posts table"""
+        from app import db
+        from app.services.search_service import create_search_index
+        if db.engine.dialect.name != 'postgresql':
+            click.echo('Not on Postgres, search uses the in-process index instead')
+            return
+        with db.engine.begin() as connection:
+            create_search_index(connection)
+        click.echo('Created ix_posts_content_fts')
+
+    @app.cli.command('process-sentiment')
+    @click.option('--batch-size', type=int, default=None, help='Posts claimed per batch')
+    @click.option('--concurrency', type=int, default=None, help='Scoring processes, 0 scores inline')
+    @click.option('--drain', is_flag=True, help='Exit once no unprocessed posts are left')
+    def process_sentiment(batch_size, concurrency, drain):
+        """Score unprocessed posts in the background and record the results"""
+        from app.services.sentiment_worker import SentimentWorker
+        worker = SentimentWorker(app, batch_size=batch_size, concurrency=concurrency)
+        metrics = worker.run(drain=drain)
+        click.echo('Processed {posts} posts in {batches} batches ({posts_per_second} posts/s, '
+                   'claim {claim_seconds}s, score {score_seconds}s, write {write_seconds}s, '
+                   '{failures} failed batches)'.format(**metrics))
+
+    @app.cli.command('recompute-reputation')
+    @click.option('--chunk-size', type=int, default=1000, help='Users recomputed per transaction')
+    def recompute_reputation(chunk_size):
+        """Rebuild every user's post count, quality average and reputation from their posts"""
+        from app.services.reputation_service import ReputationService
+        users = ReputationService.recompute_all(chunk_size)
+        click.echo('Recomputed scores for {} users'.format(users))
+
+    @app.cli.command('add-comment-paths')
+    def add_comment_paths():
+        """Add the path, depth and reply count columns to an existing comment table, run before backfill-comment-paths"""
+        from app import db
+        from app.services.comment_paths import add_path_columns
+        with db.engine.begin() as connection:
+            added = add_path_columns(connection)
+        click.echo('Added columns: {}'.format(', '.join(added)) if added else 'Comment path columns already present')
+
+    @app.cli.command('backfill-comment-paths')
+    @click.option('--batch-size', type=int, default=5000, help='Comments updated per transaction')
+    def backfill_comment_paths(batch_size):
+        """Give comments created before materialized paths a path, depth and reply counts (after add-comment-paths)"""
+        from app.services.comment_paths import backfill_paths
+        comments = backfill_paths(batch_size)
+        click.echo('Backfilled paths for {} comments'.format(comments))
+
+    @app.cli.command('partition-tables')
+    def partition_tables():
+        """Convert existing posts and comment tables to monthly partitions (Postgres, locks both)"""
+        from app import db
+        from app.services.partitions import PARTITIONED, partition_table, partitions
+        if db.engine.dialect.name != 'postgresql':
+            click.echo('Not on Postgres, tables stay unpartitioned')
+            return
+        for table in PARTITIONED:
+            with db.engine.begin() as connection:
+                converted = partition_table(connection, table, partitions.months_ahead)
+            click.echo('{} {}'.format('Partitioned' if converted else 'Already partitioned:', table.name))
+
+    @app.cli.command('maintain-partitions')
+    @click.option('--no-archive', is_flag=True, help='Only create upcoming partitions')
+    def maintain_partitions(no_archive):
+        """Create upcoming partitions and archive months older than ARCHIVE_AFTER_MONTHS, for cron"""
+        from app.services.partitions import partitions
+        for name in partitions.create_partitions():
+            click.echo('Created partition {}'.format(name))
+        if not no_archive:
+            for table_name, month, rows in partitions.archive():
+                click.echo('Archived {} {} rows of {}'.format(month.strftime('%Y-%m'), rows, table_name))
@@ -1,16 +1,176 @@
 import os
 from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool
 
 # Load environment variables from .env file
 load_dotenv()
 
+
+def engine_options(database_url, base, workers, threads, max_connections, pool_timeout, pgbouncer):
+    """SQLAlchemy engine options for one worker process.
+
+    Each worker keeps threads + 1 connections (one per request thread plus one for the
+    background flushers) and may overflow up to its share of max_connections, so
+    `workers` processes together never exceed the server's connection limit.
+    """
+    options = dict(base)
+    if not (database_url or '').startswith('postgres'):
+        # keepalives are libpq settings, and SQLite needs no pool tuning
+        options.pop('connect_args', None)
+        return options
+
+    if pgbouncer:
+        # PgBouncer in transaction mode owns the pooling: open a connection per checkout,
+        # and disable psycopg 3's automatic prepared statements (psycopg2 never prepares)
+        options['poolclass'] = NullPool
+        if database_url.startswith('postgresql+psycopg:'):
+            options['connect_args'] = dict(options.get('connect_args', {}), prepare_threshold=None)
+        return options
+
+    budget = max(1, max_connections // max(1, workers))
+    pool_size = min(threads + 1, budget)
+    options.update(pool_size=pool_size, max_overflow=budget - pool_size, pool_timeout=pool_timeout)
+    return options
+
+
+def replica_binds(urls, options):
+    """SQLALCHEMY_BINDS entries replica_0..replica_N for a comma-separated list of replica URLs"""
+    binds = {}
+    for index, url in enumerate(u.strip() for u in (urls or '').split(',') if u.strip()):
+        binds['replica_{}'.format(index)] = dict(options, url=url)
+    return binds
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Keyset pagination for the post feeds
+    POSTS_PAGE_SIZE = int(os.environ.get('POSTS_PAGE_SIZE', 50))
+    POSTS_MAX_PAGE_SIZE = int(os.environ.get('POSTS_MAX_PAGE_SIZE', 200))
+    # Rows fetched per server-side cursor round trip when streaming exports (?stream=ndjson|json)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    # Reply levels returned below each comment by the comment thread endpoints (?depth=)
+    COMMENTS_REPLY_DEPTH = int(os.environ.get('COMMENTS_REPLY_DEPTH', 2))
+    # Replies inlined under each top-level comment of a thread page, the rest page through /replies
+    COMMENTS_REPLIES_PER_COMMENT = int(os.environ.get('COMMENTS_REPLIES_PER_COMMENT', 5))
+    # Max posts accepted by one POST /api/posts/bulk
+    BULK_MAX_POSTS = int(os.environ.get('BULK_MAX_POSTS', 5000))
+
+    # Max SQL statements per request, keyed by endpoint. Exceeding a budget logs a
+    # warning, or fails the request when QUERY_BUDGET_ENFORCE is set or under TESTING
+    QUERY_BUDGETS = {
+        'get_all_posts': 1,
+        'get_posts': 1,
+        'get_posts_by_symbol': 1,
+        'get_comments': 1,
+        'get_comments_replies': 2,
+        'get_user': 1,
+        'get_symbol_sentiment': 2,
+    }
+    QUERY_BUDGET_ENFORCE = os.environ.get('QUERY_BUDGET_ENFORCE', '').lower() in ('1', 'true', 'yes')
+
+    # Buffered likes: coalesce increments in process and flush them as bulk UPDATEs
+    LIKE_BUFFER_ENABLED = os.environ.get('LIKE_BUFFER_ENABLED', '').lower() in ('1', 'true', 'yes')
+    LIKE_BUFFER_FLUSH_INTERVAL = float(os.environ.get('LIKE_BUFFER_FLUSH_INTERVAL', 1.0))
+    LIKE_BUFFER_FLUSH_SIZE = int(os.environ.get('LIKE_BUFFER_FLUSH_SIZE', 500))
+
+    # Write-behind posts and comments: validated writes are logged to a WAL file under
+    # WRITE_BEHIND_WAL_DIR, answered 202 with a provisional id and committed by a background
+    # flusher, WRITE_BEHIND_FLUSH_SIZE per transaction. With WRITE_BEHIND_QUEUE_SIZE writes
+    # waiting, requests wait WRITE_BEHIND_ENQUEUE_TIMEOUT seconds for room, then get a 503
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', '').lower() in ('1', 'true', 'yes')
+    WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 10000))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 0.2))
+    WRITE_BEHIND_FLUSH_SIZE = int(os.environ.get('WRITE_BEHIND_FLUSH_SIZE', 500))
+    WRITE_BEHIND_ENQUEUE_TIMEOUT = float(os.environ.get('WRITE_BEHIND_ENQUEUE_TIMEOUT', 1.0))
+    WRITE_BEHIND_WAL_DIR = os.environ.get('WRITE_BEHIND_WAL_DIR', 'wal')
+    WRITE_BEHIND_FSYNC = os.environ.get('WRITE_BEHIND_FSYNC', 'true').lower() in ('1', 'true', 'yes')
+    # Provisional ids resolve to the committed ones for this long (/api/writes/<id>)
+    WRITE_BEHIND_KEY_RETENTION_HOURS = int(os.environ.get('WRITE_BEHIND_KEY_RETENTION_HOURS', 168))
+
+    # Read-through cache for the hot GET endpoints: 'memory' (per-process LRU), 'redis' or 'none'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 30))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+    # Server-sent event streams (/api/stream). SSE_BUS 'local' fans events out inside this
+    # process only, 'redis' relays them over Redis pub/sub (SSE_REDIS_URL) so a stream
+    # server (gunicorn -c gunicorn_stream.conf.py wsgi:app) gets every worker's events.
+    # With SSE_STREAMS off this app leaves /api/stream to that server
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 256))
+    SSE_BUS = os.environ.get('SSE_BUS', 'local')
+    SSE_REDIS_URL = os.environ.get('SSE_REDIS_URL', CACHE_REDIS_URL)
+    SSE_STREAMS = os.environ.get('SSE_STREAMS', 'true').lower() in ('1', 'true', 'yes')
+
+    # Symbol/Sentiment reference data cache, reloaded after this many seconds or on change
+    REFDATA_TTL = int(os.environ.get('REFDATA_TTL', 300))
+    REFDATA_MISS_REFRESH = int(os.environ.get('REFDATA_MISS_REFRESH', 5))
+
+    # Full-text search: Postgres text search configuration (GIN index on to_tsvector)
+    SEARCH_LANGUAGE = os.environ.get('SEARCH_LANGUAGE', 'english')
+
+    # Trending symbols / hot posts leaderboards (/api/trending)
+    RANKING_TOP_K = int(os.environ.get('RANKING_TOP_K', 100))
+    RANKING_HALF_LIFE_HOURS = float(os.environ.get('RANKING_HALF_LIFE_HOURS', 12))
+    RANKING_WINDOW_HOURS = int(os.environ.get('RANKING_WINDOW_HOURS', 72))
+    RANKING_REFRESH_SECONDS = int(os.environ.get('RANKING_REFRESH_SECONDS', 300))
+
+    # Background sentiment scoring of unprocessed posts (flask process-sentiment).
+    # SENTIMENT_CONCURRENCY worker processes score batches, 0 scores in the worker itself
+    SENTIMENT_SCORER = os.environ.get('SENTIMENT_SCORER', 'app.services.sentiment_scoring.LexiconScorer')
+    SENTIMENT_BATCH_SIZE = int(os.environ.get('SENTIMENT_BATCH_SIZE', 500))
+    SENTIMENT_CONCURRENCY = int(os.environ.get('SENTIMENT_CONCURRENCY', 2))
+    SENTIMENT_IDLE_SECONDS = float(os.environ.get('SENTIMENT_IDLE_SECONDS', 2.0))
+
+    # Posts and comments are partitioned by month on Postgres, PARTITION_MONTHS_AHEAD months
+    # are created ahead every PARTITION_MAINTENANCE_SECONDS. `flask maintain-partitions` moves
+    # months older than ARCHIVE_AFTER_MONTHS (0 keeps everything) to Parquet under ARCHIVE_DIR
+    PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', 2))
+    PARTITION_MAINTENANCE_SECONDS = int(os.environ.get('PARTITION_MAINTENANCE_SECONDS', 3600))
+    ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', 3))
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+
+    # Market data gateway (/api/market/*): one cached, coalesced, rate-limited client of the
+    # Massive API for every browser tab. MARKET_DATA_RATE_LIMIT and MARKET_DATA_BURST are
+    # for the whole deployment and split across WEB_CONCURRENCY workers
+    MASSIVE_API_KEY = os.environ.get('MASSIVE_API_KEY')
+    MARKET_DATA_URL = os.environ.get('MARKET_DATA_URL', 'https://api.massive.com')
+    MARKET_DATA_INSIGHTS_URL = os.environ.get('MARKET_DATA_INSIGHTS_URL')
+    MARKET_DATA_TIMEOUT = float(os.environ.get('MARKET_DATA_TIMEOUT', 5))
+    MARKET_DATA_TTL = int(os.environ.get('MARKET_DATA_TTL', 3600))
+    MARKET_DATA_EVENTS_TTL = int(os.environ.get('MARKET_DATA_EVENTS_TTL', 300))
+    MARKET_DATA_INSIGHTS_TTL = int(os.environ.get('MARKET_DATA_INSIGHTS_TTL', 10))
+    MARKET_DATA_MAX_ENTRIES = int(os.environ.get('MARKET_DATA_MAX_ENTRIES', 10000))
+    MARKET_DATA_MAX_BATCH = int(os.environ.get('MARKET_DATA_MAX_BATCH', 50))
+    MARKET_DATA_CONCURRENCY = int(os.environ.get('MARKET_DATA_CONCURRENCY', 4))
+    MARKET_DATA_RATE_LIMIT = float(os.environ.get('MARKET_DATA_RATE_LIMIT', 5))
+    MARKET_DATA_BURST = int(os.environ.get('MARKET_DATA_BURST', 10))
+
+    # Request instrumentation: Prometheus metrics on /metrics and Server-Timing headers
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # Opt-in sampling profiler, writes folded stacks of requests slower than PROFILE_SLOW_MS
+    PROFILE_SLOW_REQUESTS = os.environ.get('PROFILE_SLOW_REQUESTS', '').lower() in ('1', 'true', 'yes')
+    PROFILE_SLOW_MS = int(os.environ.get('PROFILE_SLOW_MS', 500))
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+    # Serving: gunicorn.conf.py exports WEB_CONCURRENCY/WEB_THREADS so each worker sizes its
+    # pool to its share of DB_MAX_CONNECTIONS. DB_PGBOUNCER is for a transaction-mode PgBouncer
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 100))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '').lower() in ('1', 'true', 'yes')
+    # Create missing tables on startup, off in ProductionConfig (use flask create-tables)
+    DB_CREATE_ALL = os.environ.get('DB_CREATE_ALL', 'true').lower() in ('1', 'true', 'yes')
+
     # ✅ Add these for Neon connection handling
-    SQLALCHEMY_ENGINE_OPTIONS = {
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, {
         'pool_recycle': 300,  # Recycle connections every 5 minutes
         'pool_pre_ping': True,  # Verify connection before using
         'connect_args': {
@@ -19,4 +179,21 @@ class Config:
             'keepalives_interval': 10,
             'keepalives_count': 5,
         }
-    }
\ No newline at end of file
+    }, WEB_CONCURRENCY, WEB_THREADS, DB_MAX_CONNECTIONS, DB_POOL_TIMEOUT, DB_PGBOUNCER)
+
+    # Read replicas for the read-only service methods, comma-separated URLs. Each gets the
+    # primary's engine options; a replica whose heartbeat is older than
+    # REPLICA_MAX_LAG_SECONDS, or that stops answering, is skipped until it catches up.
+    # Cached payloads rebuilt within REPLICA_MAX_LAG_SECONDS of an invalidation read the
+    # primary. A REPLICA_CHECK_INTERVAL of 0 turns the background health check off
+    DATABASE_REPLICA_URLS = os.environ.get('DATABASE_REPLICA_URLS', '')
+    SQLALCHEMY_BINDS = replica_binds(DATABASE_REPLICA_URLS, engine_options(
+        DATABASE_REPLICA_URLS.split(',')[0].strip(), SQLALCHEMY_ENGINE_OPTIONS, WEB_CONCURRENCY, WEB_THREADS,
+        DB_MAX_CONNECTIONS, DB_POOL_TIMEOUT, DB_PGBOUNCER))
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 2))
+
+
+class ProductionConfig(Config):
+    """Used by wsgi.py: the schema is managed explicitly, not on every boot"""
+    DB_CREATE_ALL = os.environ.get('DB_CREATE_ALL', '').lower() in ('1', 'true', 'yes')
\ No newline at end of file
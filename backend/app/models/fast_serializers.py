@@ -0,0 +1,95 @@
+"""Column-level serializers for the post list endpoints.
+
+These produce the same JSON shape as PostSerializer and PostDetailSerializer, but work
+on plain row tuples selected column by column, so large pages skip both ORM hydration
+and per-field marshmallow dispatch. Nested symbols come from the reference data cache
+rather than a JOIN. Single-object endpoints keep using the schemas.
+"""
+from app.models.models import Posts, User
+
+POST_COLUMNS = (
+    Posts.id,
+    Posts.content,
+    Posts.created_at,
+    Posts.processed,
+    Posts.sentiment_score,
+    Posts.user_id,
+    Posts.sentiment,
+    Posts.symbol_id,
+    Posts.image_attachment,
+    Posts.likes_count,
+)
+
+USER_PUBLIC_COLUMNS = (
+    User.id,
+    User.username,
+    User.first_name,
+    User.last_name,
+    User.profile_picture,
+    User.reputation_score,
+    User.post_count,
+    User.post_quality_avg,
+)
+
+POST_DETAIL_COLUMNS = tuple(
+    c for c in POST_COLUMNS if c.key != 'user_id'
+) + USER_PUBLIC_COLUMNS
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def dump_post_row(row):
+    """Same output as PostSerializer().dump(post) for a POST_COLUMNS row"""
+    (post_id, content, created_at, processed, sentiment_score, user_id,
+     sentiment, symbol_id, image_attachment, likes_count) = row
+    return {
+        'id': post_id,
+        'content': content,
+        'created_at': _iso(created_at),
+        'processed': processed,
+        'sentiment_score': sentiment_score,
+        'user_id': user_id,
+        'sentiment': sentiment,
+        'symbol_id': symbol_id,
+        'image_attachment': image_attachment,
+        'likes_count': likes_count,
+    }
+
+
+def dump_post_detail_row(row, symbol_for):
+    """Same output as PostDetailSerializer().dump(post) for a POST_DETAIL_COLUMNS row.
+
+    symbol_for maps a symbol id to its SymbolSerializer-shaped dict, normally
+    reference_data.symbol.
+    """
+    (post_id, content, created_at, processed, sentiment_score, sentiment,
+     symbol_id, image_attachment, likes_count,
+     user_id, username, first_name, last_name, profile_picture,
+     reputation_score, post_count, post_quality_avg) = row
+    return {
+        'id': post_id,
+        'content': content,
+        'created_at': _iso(created_at),
+        'processed': processed,
+        'sentiment_score': sentiment_score,
+        'sentiment': sentiment,
+        'image_attachment': image_attachment,
+        'likes_count': likes_count,
+        'user': {
+            'id': user_id,
+            'username': username,
+            'first_name': first_name,
+            'last_name': last_name,
+            'profile_picture': profile_picture,
+            'reputation_score': _float(reputation_score),
+            'post_count': post_count,
+            'post_quality_avg': _float(post_quality_avg),
+        },
+        'symbol': symbol_for(symbol_id),
+    }
@@ -33,6 +33,7 @@ class User(db.Model):
     reputation_score = db.Column(db.Float, default=50.0)  # 0-100 score
     post_quality_avg = db.Column(db.Float, default=0.0)   # Average quality of posts
     post_count = db.Column(db.Integer, default=0)         # Number of posts
+    likes_received = db.Column(db.Integer, default=0)     # Likes across all posts
 
     def to_dict(self):
         return {
@@ -65,9 +66,17 @@ class Symbol(db.Model):
         }
 class Posts(db.Model):
      __tablename__ = 'posts'
+     # Composite indexes backing the (created_at, id) keyset pagination of each feed
+     __table_args__ = (
+         db.Index('ix_posts_user_created_id', 'user_id', 'created_at', 'id'),
+         db.Index('ix_posts_symbol_created_id', 'symbol_id', 'created_at', 'id'),
+         # Partial index over the sentiment worker's backlog, stays small as posts get processed
+         db.Index('ix_posts_unprocessed', 'id',
+                  postgresql_where=db.text('processed = false'), sqlite_where=db.text('processed = 0')),
+     )
      id = db.Column(db.Integer(), primary_key=True)
      content=db.Column(db.Text, nullable=False)
-     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+     created_at = db.Column(db.DateTime, default=datetime.now, index=True)
      processed= db.Column(db.Boolean, default=False)
      sentiment_score=db.Column(db.Integer, default=0)
      user_id= db.Column(db.Integer(), db.ForeignKey('cust.id'), nullable=False, index=True)
@@ -76,34 +85,53 @@ class Posts(db.Model):
      image_attachment = db.Column(db.String())
      likes_count = db.Column(db.Integer, default=0)
      user = db.relationship("User", lazy="joined")
-     symbol = db.relationship("Symbol", lazy="joined")
+     # Not joined: symbol codes are served from app.services.reference_data
+     symbol = db.relationship("Symbol", lazy="select")
      def to_dict(self):
+         from app.services.reference_data import reference_data
          return {
              'id': self.id,
              'created_at': self.created_at.isoformat() if self.created_at else None,
              'content': self.content,
-             'user_id': User.query.filter_by(id=self.user_id).first().first_name ,
+             'user_id': self.user.first_name,
              'sentiment': self.sentiment,
-             'symbol_id': Symbol.query.filter_by(id= self.symbol_id).first().code,
+             'symbol_id': reference_data.symbol_code(self.symbol_id),
              'image_attachment': self.image_attachment,
              'sentiment_score': self.sentiment_score,
              'likes_count': self.likes_count
          }
 
 
+def _unpartitioned(ddl, target, bind, dialect=None, **kw):
+    # Postgres partitions posts and comment, a partitioned table cannot be a foreign key target
+    return dialect.name != 'postgresql'
+
+
 class Comment(db.Model):
     __tablename__ = 'comment'
+    # Threads and subtrees are range scans over the materialized path, see app.services.comment_paths
+    __table_args__ = (
+        db.Index('ix_comment_post_path', 'post_id', 'path'),
+        db.ForeignKeyConstraint(['parent_id'], ['comment.id']).ddl_if(callable_=_unpartitioned),
+        db.ForeignKeyConstraint(['post_id'], ['posts.id']).ddl_if(callable_=_unpartitioned),
+    )
 
     id = db.Column(db.Integer(), primary_key=True)
     content = db.Column(db.String(10))
-    parent_id = db.Column(db.Integer(), db.ForeignKey('comment.id'), nullable=True, index=True)
-    post_id = db.Column(db.Integer(), db.ForeignKey('posts.id'), nullable=False, index=True)
+    # Foreign keys everywhere but on Postgres, where PostService checks the post and parent instead
+    parent_id = db.Column(db.Integer(), nullable=True, index=True)
+    post_id = db.Column(db.Integer(), nullable=False, index=True)
     is_active = db.Column(db.Boolean, default=True)
     user_id = db.Column(db.Integer, db.ForeignKey('cust.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    path = db.Column(db.String())                        # Zero-padded ids from the root down to this comment
+    depth = db.Column(db.Integer, default=0)             # 0 for comments on the post itself
+    reply_count = db.Column(db.Integer, default=0)       # Direct replies
+    descendant_count = db.Column(db.Integer, default=0)  # Replies at any depth
 
     user = db.relationship("User", lazy="joined")
-    replies = db.relationship("Comment", lazy="joined")
+    # Never loaded by the API, threads are read by path range in PostService
+    replies = db.relationship("Comment", lazy="select", primaryjoin="Comment.id == foreign(Comment.parent_id)")
     def to_dict(self):
         return {
             'id': self.id,
@@ -112,5 +140,58 @@ class Comment(db.Model):
             'post_id': self.post_id,
             'user_id': self.user_id,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'depth': self.depth,
+            'reply_count': self.reply_count,
+            'descendant_count': self.descendant_count
+        }
+
+class SentimentRollup(db.Model):
+    """Per-symbol, per-hour sentiment counters maintained incrementally on write"""
+    __tablename__ = 'sentiment_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('symbol_id', 'bucket_start', name='uq_sentiment_rollup_bucket'),
+    )
+
+    id = db.Column(db.Integer(), primary_key=True)
+    symbol_id = db.Column(db.Integer(), db.ForeignKey('symbol.id'), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    post_count = db.Column(db.Integer, nullable=False, default=0)
+    bullish_count = db.Column(db.Integer, nullable=False, default=0)
+    bearish_count = db.Column(db.Integer, nullable=False, default=0)
+    neutral_count = db.Column(db.Integer, nullable=False, default=0)
+    sentiment_score_sum = db.Column(db.Integer, nullable=False, default=0)
+    likes_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'post_count': self.post_count,
+            'bullish': self.bullish_count,
+            'bearish': self.bearish_count,
+            'neutral': self.neutral_count,
+            'sentiment_score_sum': self.sentiment_score_sum,
+            'likes_count': self.likes_count
+        }
+
+
+class ReplicationHeartbeat(db.Model):
+    """Single row rewritten on the primary by the replica health check, its age on a replica is the lag"""
+    __tablename__ = 'replication_heartbeat'
+
+    id = db.Column(db.Integer(), primary_key=True)
+    beat_at = db.Column(db.DateTime, nullable=False)
+
+
+class WriteBehindKey(db.Model):
+    """Provisional key of every write committed by the write-behind flusher and the row it became.
+
+    Inserted in the flusher's transaction, so a WAL replayed after a crash skips what was
+    already committed. target_id is null for writes rejected at flush time.
+    """
+    __tablename__ = 'write_behind_key'
+
+    key = db.Column(db.String(40), primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)
+    target_id = db.Column(db.Integer(), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -1,6 +1,16 @@
 from marshmallow import Schema, fields, validate, EXCLUDE
 
-class SentimentSerializer(Schema):
+from app.utils.metrics import serialization_timer
+
+
+class TimedSchema(Schema):
+    """Schema whose dumps count toward the request's serialization time in /metrics"""
+
+    def dump(self, obj, *, many=None):
+        with serialization_timer():
+            return super().dump(obj, many=many)
+
+class SentimentSerializer(TimedSchema):
     """Serializer for Sentiment model"""
     id = fields.Int(dump_only=True)
     name = fields.Str(required=True, validate=validate.Length(max=10))
@@ -11,7 +21,7 @@ class SentimentSerializer(Schema):
         unknown = EXCLUDE
 
 
-class UserSerializer(Schema):
+class UserSerializer(TimedSchema):
     """Serializer for User model"""
     id = fields.Int(dump_only=True)
     username = fields.Str(required=True, validate=validate.Length(max=64))
@@ -30,7 +40,7 @@ class UserSerializer(Schema):
         unknown = EXCLUDE
 
 
-class UserPublicSerializer(Schema):
+class UserPublicSerializer(TimedSchema):
     """Public serializer for User model (excludes sensitive data)"""
     id = fields.Int(dump_only=True)
     username = fields.Str()
@@ -44,7 +54,7 @@ class UserPublicSerializer(Schema):
         unknown = EXCLUDE
 
 
-class SymbolSerializer(Schema):
+class SymbolSerializer(TimedSchema):
     """Serializer for Symbol model"""
     id = fields.Int(dump_only=True)
     name = fields.Str(required=True, validate=validate.Length(max=10))
@@ -55,7 +65,7 @@ class SymbolSerializer(Schema):
         unknown = EXCLUDE
 
 
-class PostSerializer(Schema):
+class PostSerializer(TimedSchema):
     """Serializer for Posts model"""
     id = fields.Int(dump_only=True)
     content = fields.Str(required=True)
@@ -73,7 +83,7 @@ class PostSerializer(Schema):
         unknown = EXCLUDE
 
 
-class PostDetailSerializer(Schema):
+class PostDetailSerializer(TimedSchema):
     """Detailed serializer for Posts model with all related data"""
     id = fields.Int(dump_only=True)
     content = fields.Str(required=True)
@@ -92,7 +102,7 @@ class PostDetailSerializer(Schema):
         unknown = EXCLUDE
 
 
-class CommentSerializer(Schema):
+class CommentSerializer(TimedSchema):
     """Serializer for Comment model"""
     id = fields.Int(dump_only=True)
     content = fields.Str(required=True, validate=validate.Length(max=10))
@@ -101,6 +111,9 @@ class CommentSerializer(Schema):
     is_active = fields.Bool(dump_default=True)
     user_id = fields.Int(required=True)
     created_at = fields.DateTime(dump_only=True)
+    depth = fields.Int(dump_only=True)
+    reply_count = fields.Int(dump_only=True)
+    descendant_count = fields.Int(dump_only=True)
     
     # Nested serializer for user
     user = fields.Nested(UserPublicSerializer, dump_only=True)
@@ -109,7 +122,7 @@ class CommentSerializer(Schema):
         unknown = EXCLUDE
 
 
-class CommentDetailSerializer(Schema):
+class CommentDetailSerializer(TimedSchema):
     """Detailed serializer for Comment model with nested replies"""
     id = fields.Int(dump_only=True)
     content = fields.Str(required=True)
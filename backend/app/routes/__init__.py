@@ -1,6 +1,20 @@
 from .user_routes import init_routes as user_routes
 from .posts_routes import init_routes as post_routes
+from .symbol_routes import init_routes as symbol_routes
+from .cache_routes import init_routes as cache_routes
+from .stream_routes import init_routes as stream_routes
+from .trending_routes import init_routes as trending_routes
+from .metrics_routes import init_routes as metrics_routes
+from .market_routes import init_routes as market_routes
+from .write_routes import init_routes as write_routes
 
 def init_routes(app):
     user_routes(app)
-    post_routes(app)
\ No newline at end of file
+    post_routes(app)
+    symbol_routes(app)
+    cache_routes(app)
+    stream_routes(app)
+    trending_routes(app)
+    metrics_routes(app)
+    market_routes(app)
+    write_routes(app)
\ No newline at end of file
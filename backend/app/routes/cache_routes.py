@@ -0,0 +1,14 @@
+from flask import jsonify
+
+from app.cache import cache
+from app.services.market_data import market_data
+from app.services.reference_data import reference_data
+from app.services.write_behind import write_behind
+
+
+def init_routes(app):
+    @app.route('/api/cache/stats', methods=['GET'])
+    def get_cache_stats():
+        """Hit/miss/eviction counters for sizing the read-through cache"""
+        return jsonify({'cache': cache.stats(), 'reference_data': reference_data.stats(),
+                        'market_data': market_data.stats(), 'write_behind': write_behind.stats()}), 200
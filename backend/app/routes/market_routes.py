@@ -0,0 +1,62 @@
+from flask import jsonify, request
+
+from app.services.market_data import MarketDataError, market_data
+from app.utils.fast_json import json_response
+
+
+def _upstream_error(e):
+    response = jsonify({'error': str(e)})
+    response.status_code = e.status
+    if e.retry_after:
+        response.headers['Retry-After'] = str(max(1, round(e.retry_after)))
+    return response
+
+
+def init_routes(app):
+    @app.route('/api/market/tickers', methods=['GET'])
+    def get_market_tickers():
+        """Reference data for ?symbols=AAPL,MSFT,... in one round trip, unknown tickers are omitted"""
+        symbols = [s for s in request.args.get('symbols', '').split(',') if s.strip()]
+        if not symbols:
+            return jsonify({'error': 'symbols required'}), 400
+
+        try:
+            tickers = market_data.tickers(symbols)
+            return json_response({'results': [ticker for ticker in tickers.values() if ticker is not None]})
+
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except MarketDataError as e:
+            return _upstream_error(e)
+        except Exception as e:
+            return jsonify({'error': 'An error occurred while fetching tickers'}), 500
+
+    @app.route('/api/market/tickers/<symbol>/events', methods=['GET'])
+    def get_market_ticker_events(symbol):
+        """Ticker events, same shape as the upstream results object"""
+        try:
+            events = market_data.events(symbol)
+            if events is None:
+                return jsonify({'error': 'Ticker not found'}), 404
+            return json_response({'results': events})
+
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except MarketDataError as e:
+            return _upstream_error(e)
+        except Exception as e:
+            return jsonify({'error': 'An error occurred while fetching ticker events'}), 500
+
+    @app.route('/api/market/insights', methods=['GET'])
+    def get_market_insights():
+        """Upstream insights payload, shared by every client for MARKET_DATA_INSIGHTS_TTL seconds"""
+        try:
+            insights = market_data.insights()
+            if insights is None:
+                return jsonify({'error': 'Insights not found'}), 404
+            return json_response(insights)
+
+        except MarketDataError as e:
+            return _upstream_error(e)
+        except Exception as e:
+            return jsonify({'error': 'An error occurred while fetching insights'}), 500
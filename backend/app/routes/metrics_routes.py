@@ -0,0 +1,10 @@
+from flask import Response
+
+from app.utils.metrics import metrics
+
+
+def init_routes(app):
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        """Request latency, SQL and serialization metrics for Prometheus to scrape"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
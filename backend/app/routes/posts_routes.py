@@ -1,8 +1,94 @@
-from flask import jsonify, request
+from datetime import datetime
+
+from flask import Response, current_app, jsonify, request, stream_with_context
 from marshmallow import ValidationError
 
+from app.cache import cache, tags
 from app.services.post_service import PostService
-from app.models.serializers import PostSerializer, PostDetailSerializer, CommentSerializer, CommentDetailSerializer
+from app.services.reference_data import reference_data
+from app.services.search_service import SearchService
+from app.services.write_behind import WriteQueueFull, write_behind
+from app.services.pagination import decode_cursor, decode_offset, decode_path, page_size
+from app.models.fast_serializers import dump_post_detail_row, dump_post_row
+from app.models.serializers import PostSerializer, CommentSerializer
+from app.utils.fast_json import dumps, json_response
+
+
+def _page_args():
+    """Read the limit/cursor keyset pagination contract from the query string"""
+    limit = page_size(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def _thread_args():
+    """limit/depth/cursor for comment threads, depth counts reply levels below the listed comments"""
+    limit = page_size(request.args.get('limit'))
+    depth = request.args.get('depth', current_app.config['COMMENTS_REPLY_DEPTH'])
+    try:
+        depth = int(depth)
+    except (TypeError, ValueError):
+        raise ValueError('depth must be a non-negative integer')
+    if depth < 0:
+        raise ValueError('depth must be a non-negative integer')
+    cursor = request.args.get('cursor')
+    return limit, depth, decode_path(cursor) if cursor else None
+
+
+def _page_key(tag, limit):
+    return '{}:{}:{}'.format(tag, limit, request.args.get('cursor', ''))
+
+
+def _reader_id():
+    """The user reading (X-User-Id header), whose queued writes are merged into what they read"""
+    try:
+        return int(request.headers.get('X-User-Id', ''))
+    except ValueError:
+        return None
+
+
+def _with_pending(payload, queued, detail=False):
+    """Put the reader's queued posts ahead of the first page of a feed, see app.services.write_behind"""
+    if not queued or request.args.get('cursor'):
+        return payload
+    return dict(payload, posts=[entry.detail if detail else entry.view for entry in queued] + payload['posts'])
+
+
+def _queue_full(e):
+    response = jsonify({'error': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, round(e.retry_after)))
+    return response
+
+
+def _still_queued():
+    """409 for an action on a post the write-behind queue has not committed yet"""
+    response = jsonify({'error': 'Post is still being saved, retry shortly'})
+    response.status_code = 409
+    response.headers['Retry-After'] = str(max(1, round(write_behind.flush_interval)))
+    return response
+
+
+def _stream_response(batches, dump, fmt):
+    """Export every row as NDJSON (stream=ndjson) or an incrementally encoded {"posts": [...]} (stream=json)"""
+    if fmt == 'ndjson':
+        def generate():
+            for batch in batches:
+                yield b''.join(dumps(dump(row)) + b'\n' for row in batch)
+        mimetype = 'application/x-ndjson'
+    elif fmt == 'json':
+        def generate():
+            yield b'{"posts":['
+            separator = b''
+            for batch in batches:
+                yield separator + b','.join(dumps(dump(row)) for row in batch)
+                separator = b','
+            yield b']}'
+        mimetype = 'application/json'
+    else:
+        return jsonify({'error': 'stream must be ndjson or json'}), 400
+
+    return Response(stream_with_context(generate()), mimetype=mimetype)
 
 
 def init_routes(app):
@@ -16,6 +102,11 @@ def init_routes(app):
             return jsonify({'error': 'Content required'}), 400
 
         try:
+            if write_behind.enabled:
+                # Committed by the flusher, the id is provisional until then
+                queued = PostService.queue_post(data)
+                return jsonify({'post': queued.view}), 202
+
             # Call service to create post
             post = PostService.create_post(data)
             
@@ -25,18 +116,71 @@ def init_routes(app):
 
         except ValueError as e:
             return jsonify({'error': str(e)}), 400
+        except WriteQueueFull as e:
+            return _queue_full(e)
         except Exception as e:
             return jsonify({'error': 'An error occurred while creating the post'}), 500
 
+    @app.route('/api/posts/bulk', methods=['POST'])
+    def create_posts_bulk():
+        """Import a batch of posts in one transaction, body is {"posts": [...]}"""
+        data = request.get_json() or {}
+
+        try:
+            inserted = PostService.create_posts_bulk(data.get('posts') or [])
+            return jsonify({'inserted': inserted}), 201
+
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': 'An error occurred while importing posts'}), 500
+
+    @app.route('/api/posts/search', methods=['GET'])
+    def search_posts():
+        """Full-text search over post content, ranked by relevance"""
+        try:
+            limit = page_size(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            offset = decode_offset(cursor) if cursor else 0
+            since = request.args.get('since')
+            until = request.args.get('until')
+            filters = {
+                'symbol_code': request.args.get('symbol'),
+                'sentiment': request.args.get('sentiment'),
+                'since': datetime.fromisoformat(since) if since else None,
+                'until': datetime.fromisoformat(until) if until else None,
+            }
+            posts, next_cursor = SearchService.search(request.args.get('q'), limit, offset, **filters)
+            return json_response({'posts': posts, 'next_cursor': next_cursor})
+
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': 'An error occurred while searching posts'}), 500
+
     @app.route('/api/posts/<user_id>', methods=['GET'])
     def get_posts(user_id):
-        """Get all posts for a specific user"""
+        """Get a page of posts for a specific user, newest first"""
+        if request.args.get('stream'):
+            return _stream_response(PostService.stream_posts(user_id), dump_post_row, request.args['stream'])
+
         try:
-            posts = PostService.get_posts(user_id)
-            
-            # Use serializer to format response
-            schema = PostSerializer(many=True)
-            return jsonify({'posts': schema.dump(posts)}), 200
+            limit, cursor = _page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            def load():
+                posts, next_cursor = PostService.get_posts(user_id, limit, cursor)
+
+                # Rows are dumped column by column, same shape as PostSerializer
+                return {'posts': [dump_post_row(row) for row in posts], 'next_cursor': next_cursor}
+
+            tag = tags.user_posts(user_id)
+            payload = cache.get_or_set(_page_key(tag, limit), [tag], load)
+            if str(_reader_id()) == user_id:
+                payload = _with_pending(payload, write_behind.pending('post', _reader_id()))
+            return json_response(payload)
 
         except ValueError as e:
             return jsonify({'error': str(e)}), 404
@@ -45,13 +189,26 @@ def init_routes(app):
 
     @app.route('/api/posts/symbol/<symbol_code>', methods=['GET'])
     def get_posts_by_symbol(symbol_code):
-        """Get all posts for a specific user"""
+        """Get a page of posts for a specific symbol, newest first"""
+        if request.args.get('stream'):
+            return _stream_response(PostService.stream_posts_by_symbol(symbol_code), dump_post_row, request.args['stream'])
+
         try:
-            posts = PostService.get_posts_by_symbol(symbol_code)
+            limit, cursor = _page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-            # Use serializer to format response
-            schema = PostSerializer(many=True)
-            return jsonify({'posts': schema.dump(posts)}), 200
+        try:
+            def load():
+                posts, next_cursor = PostService.get_posts_by_symbol(symbol_code, limit, cursor)
+
+                # Rows are dumped column by column, same shape as PostSerializer
+                return {'posts': [dump_post_row(row) for row in posts], 'next_cursor': next_cursor}
+
+            tag = tags.symbol_posts(symbol_code)
+            payload = cache.get_or_set(_page_key(tag, limit), [tag], load)
+            queued = write_behind.pending('post', _reader_id(), scope=reference_data.symbol_id(symbol_code))
+            return json_response(_with_pending(payload, queued))
 
         except ValueError as e:
             return jsonify({'error': str(e)}), 404
@@ -59,13 +216,28 @@ def init_routes(app):
             return jsonify({'error': 'An error occurred while fetching posts'}), 500
     @app.route('/api/posts', methods=['GET'])
     def get_all_posts():
-        """Get all posts"""
+        """Get a page of the global feed, newest first"""
+        if request.args.get('stream'):
+            return _stream_response(PostService.stream_all_posts(),
+                                    lambda row: dump_post_detail_row(row, reference_data.symbol),
+                                    request.args['stream'])
+
         try:
-            posts = PostService.get_all_posts()
-            
-            # Use serializer to format response
-            schema = PostDetailSerializer(many=True)
-            return jsonify({'posts': schema.dump(posts)}), 200
+            limit, cursor = _page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            def load():
+                posts, next_cursor = PostService.get_all_posts(limit, cursor)
+
+                # Rows are dumped column by column, same shape as PostDetailSerializer
+                posts = [dump_post_detail_row(row, reference_data.symbol) for row in posts]
+                return {'posts': posts, 'next_cursor': next_cursor}
+
+            tag = tags.FEED
+            payload = cache.get_or_set(_page_key(tag, limit), [tag], load)
+            return json_response(_with_pending(payload, write_behind.pending('post', _reader_id()), detail=True))
 
         except ValueError as e:
             return jsonify({'error': str(e)}), 404
@@ -74,8 +246,13 @@ def init_routes(app):
 
     @app.route('/api/posts/<post_id>/like', methods=['POST'])
     def post_like(post_id):
-        """Like a post"""
+        """Like a post, by id or by the provisional id it was answered with while queued"""
         try:
+            post_id = write_behind.resolve(post_id)
+            if write_behind.queued(post_id) is not None:
+                return _still_queued()
+            if write_behind.is_key(post_id):
+                return jsonify({'error': 'Post not found'}), 404
             post = PostService.post_like(post_id)
             
             # Use serializer to format response
@@ -91,20 +268,46 @@ def init_routes(app):
     def add_comment(post_id):
         try:
             data = request.get_json()
+            if write_behind.enabled:
+                queued = PostService.queue_comment(data, post_id)
+                return jsonify({'comment': queued.view}), 202
+
             comment = PostService.add_comment(data, post_id)
             schema = CommentSerializer()
             return jsonify({'comment': schema.dump(comment)})
         except ValueError as e:
             return jsonify({'error': str(e)}), 404
+        except WriteQueueFull as e:
+            return _queue_full(e)
         except Exception as e:
             return jsonify({'error': 'An error occurred while adding comment'}), 500
 
     @app.route('/api/posts/<post_id>/comments', methods=['GET'])
     def get_comments(post_id):
+        """A page of top-level comments with their first replies, ?limit=&depth=&cursor=
+
+        Threads with more replies than COMMENTS_REPLIES_PER_COMMENT carry a next_cursor
+        for /api/posts/<post_id>/comments/<comment_id>/replies.
+        """
         try:
-            comments = PostService.get_comments_with_replies(post_id)
+            limit, depth, cursor = _thread_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            def load():
+                comments, next_cursor = PostService.get_comments_with_replies(
+                    post_id, limit, depth, current_app.config['COMMENTS_REPLIES_PER_COMMENT'], cursor)
+                return {'comments': comments, 'next_cursor': next_cursor}
 
-            return jsonify({'comments': comments}), 200
+            tag = tags.comments(post_id)
+            key = '{}:{}'.format(_page_key(tag, limit), depth)
+            payload = cache.get_or_set(key, [tag], load)
+            # The reader's queued comments on the post, oldest first, until the flusher commits them
+            queued = write_behind.pending('comment', _reader_id(), scope=post_id)
+            if queued:
+                payload = dict(payload, pending=[entry.view for entry in reversed(queued)])
+            return jsonify(payload), 200
 
         except ValueError as e:
             return jsonify({'error': str(e)}), 404
@@ -112,14 +315,20 @@ def init_routes(app):
             return jsonify({'error': 'An error occurred while fetching comments'}), 500
 
     @app.route('/api/posts/<post_id>/comments/<comment_id>/replies', methods=['GET'])
-    def get_comments_replies(comment_id):
+    def get_comments_replies(post_id, comment_id):
+        """A page of the replies under a comment, depth first, ?limit=&depth=&cursor="""
+        try:
+            limit, depth, cursor = _thread_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         try:
-            comments = PostService.get_comments_replies(comment_id)
+            comments, next_cursor = PostService.get_comments_replies(post_id, comment_id, limit, depth, cursor)
 
-            schema = CommentDetailSerializer(many=True)
-            return jsonify({'comments': schema.dump(comments)}), 200
+            schema = CommentSerializer(many=True)
+            return jsonify({'comments': schema.dump(comments), 'next_cursor': next_cursor}), 200
 
         except ValueError as e:
             return jsonify({'error': str(e)}), 404
         except Exception as e:
-            return jsonify({'error': 'An error occurred while fetching comments'}), 500
\ No newline at end of file
+            return jsonify({'error': 'An error occurred while fetching comments'}), 500
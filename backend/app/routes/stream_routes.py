@@ -0,0 +1,49 @@
+import queue
+
+from flask import Response, current_app
+
+from app.services.event_broadcaster import GLOBAL, broadcaster, symbol_channel
+
+
+def _event_stream(channel):
+    """Server-sent events for a channel, with heartbeats and a resync signal on overflow"""
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+    sub = broadcaster.subscribe(channel)
+
+    def generate():
+        try:
+            yield b'retry: 3000\n\n'
+            while True:
+                try:
+                    frame = sub.frames.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield b': keepalive\n\n'
+                    continue
+                yield frame
+                if sub.overflowed:
+                    # Events were dropped for this client, have it refetch and reconnect
+                    yield b'event: resync\ndata: {}\n\n'
+                    return
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+def init_routes(app):
+    if not app.config.get('SSE_STREAMS', True):
+        # Served by the evented stream server instead, see gunicorn_stream.conf.py
+        return
+
+    @app.route('/api/stream', methods=['GET'])
+    def stream_all():
+        """Live post_created, post_liked and comment_added deltas for every symbol"""
+        return _event_stream(GLOBAL)
+
+    @app.route('/api/stream/symbol/<symbol_code>', methods=['GET'])
+    def stream_symbol(symbol_code):
+        """Live deltas for a single symbol"""
+        return _event_stream(symbol_channel(symbol_code))
@@ -0,0 +1,20 @@
+from flask import jsonify, request
+
+from app.services.sentiment_service import WINDOWS, SentimentService
+
+
+def init_routes(app):
+    @app.route('/api/symbols/<symbol_code>/sentiment', methods=['GET'])
+    def get_symbol_sentiment(symbol_code):
+        """Sentiment summary and hourly series for a symbol, served from the rollup table"""
+        window = request.args.get('window', '24h')
+        if window not in WINDOWS:
+            return jsonify({'error': 'window must be one of: {}'.format(', '.join(WINDOWS))}), 400
+
+        try:
+            return jsonify(SentimentService.get_sentiment(symbol_code, window)), 200
+
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 404
+        except Exception as e:
+            return jsonify({'error': 'An error occurred while fetching sentiment'}), 500
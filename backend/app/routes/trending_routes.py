@@ -0,0 +1,35 @@
+from flask import jsonify, request
+
+from app.models.fast_serializers import dump_post_detail_row
+from app.services.post_service import PostService
+from app.services.ranking_service import ranking
+from app.services.reference_data import reference_data
+from app.utils.fast_json import json_response
+
+
+def init_routes(app):
+    @app.route('/api/trending', methods=['GET'])
+    def get_trending():
+        """Trending symbols and hot posts, served from the precomputed leaderboards"""
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), ranking.top_k)
+        except ValueError:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+
+        try:
+            symbols, hot = ranking.trending(limit)
+            scores = dict(hot)
+            posts = []
+            for row in PostService.get_posts_by_ids([post_id for post_id, _ in hot]):
+                post = dump_post_detail_row(row, reference_data.symbol)
+                post['score'] = round(scores[row.id], 4)
+                posts.append(post)
+
+            return json_response({
+                'symbols': [dict(reference_data.symbol(symbol_id) or {'id': symbol_id}, score=round(score, 4))
+                            for symbol_id, score in symbols],
+                'posts': posts,
+            })
+
+        except Exception as e:
+            return jsonify({'error': 'An error occurred while fetching trending data'}), 500
@@ -1,5 +1,6 @@
 from flask import request, jsonify
 
+from app.cache import cache, tags
 from app.services.user_service import UserService
 from app.models.serializers import UserSerializer, UserPublicSerializer
 
@@ -27,22 +28,26 @@ def init_routes(app):
     def get_user(username):
         """Get user by username"""
         try:
-            user = UserService.getUser(username)
-            
-            # Use public serializer (excludes sensitive data like email)
-            schema = UserPublicSerializer()
-            return jsonify({'user': schema.dump(user)}), 200
+            def load():
+                user = UserService.getUser(username)
+
+                # Use public serializer (excludes sensitive data like email)
+                schema = UserPublicSerializer()
+                return {'user': schema.dump(user)}
+
+            tag = tags.user(username)
+            return jsonify(cache.get_or_set(tag, [tag], load)), 200
             
         except ValueError as e:
             return jsonify({'error': str(e)}), 404
         except Exception as e:
             return jsonify({'error': 'An error occurred while fetching the user'}), 500
 
-    @app.route('/api/users/<userId>/score', methods=['POST'])
-    def update_score(userId):
+    @app.route('/api/users/<userId>/score', methods=['GET'])
+    def get_score(userId):
+        """A user's reputation and post quality, read only: the server keeps them current"""
         try:
-            data = request.get_json()
-            user = UserService.update_score(userId, data)
+            user = UserService.get_score(int(userId))
             schema = UserPublicSerializer()
             return jsonify({'user': schema.dump(user)}), 200
 
@@ -0,0 +1,18 @@
+from flask import jsonify
+
+from app.services.write_behind import write_behind
+
+
+def init_routes(app):
+    @app.route('/api/writes/<key>', methods=['GET'])
+    def get_write_status(key):
+        """Status of a post or comment answered with a provisional id: pending, committed (with its id) or rejected"""
+        try:
+            status = write_behind.status(key)
+            if status is None:
+                return jsonify({'error': 'Write not found'}), 404
+            state, target_id = status
+            return jsonify({'key': key, 'status': state, 'id': target_id}), 200
+
+        except Exception as e:
+            return jsonify({'error': 'An error occurred while fetching the write status'}), 500
@@ -0,0 +1,104 @@
+"""Materialized paths for comment threads.
+
+A comment's path is the concatenation of the zero-padded ids of its ancestors and
+itself, e.g. '00000000420000000107' for comment 107 replying to 42. Ids grow with
+creation time, so ordering by path walks a thread depth first with siblings oldest
+first, and a subtree is the contiguous range [path, subtree_end(path)), one index
+range scan on (post_id, path). Paths are digits only, so the range holds under any
+collation.
+"""
+from sqlalchemy import bindparam, func, inspect, select, text
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models.models import Comment
+
+SEGMENT = 10
+# Sorts after every real path (a first segment of ten nines would take 10^10 comments)
+PATH_MAX = '9' * (SEGMENT + 1)
+
+
+def segment(comment_id):
+    return '{:0{}d}'.format(comment_id, SEGMENT)
+
+
+def depth_of(path):
+    return len(path) // SEGMENT - 1
+
+
+def ancestor_ids(path):
+    """Ids on the path from the root down to and including the comment itself"""
+    return [int(path[i:i + SEGMENT]) for i in range(0, len(path), SEGMENT)]
+
+
+def subtree_end(path):
+    """Smallest path after every descendant of `path`: its last segment plus one"""
+    return path[:-SEGMENT] + segment(int(path[-SEGMENT:]) + 1)
+
+
+PATH_COLUMNS = ('path', 'depth', 'reply_count', 'descendant_count')
+
+
+def add_path_columns(connection):
+    """Add the path columns and ix_comment_post_path to a comment table created before them.
+
+    create_all never alters an existing table, so databases from before materialized
+    paths need this once before backfill_paths. Returns the names of the columns added.
+    """
+    table = Comment.__table__
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    quoted = connection.dialect.identifier_preparer.format_table(table)
+    added = []
+    for name in PATH_COLUMNS:
+        if name not in existing:
+            column = table.c[name]
+            connection.execute(text('ALTER TABLE {} ADD COLUMN {} {}'.format(
+                quoted, name, column.type.compile(dialect=connection.dialect))))
+            added.append(name)
+    for index in table.indexes:
+        if index.name == 'ix_comment_post_path':
+            index.create(connection, checkfirst=True)
+    return added
+
+
+def backfill_paths(batch_size=5000):
+    """Set path and depth on comments created before paths existed, then recount replies.
+
+    Parents always have lower ids than their replies, so a single pass in id order
+    sees every parent's path before its children.
+    """
+    table = Comment.__table__
+    last_id = 0
+    updated = 0
+    while True:
+        rows = db.session.execute(
+            select(Comment.id, Comment.parent_id).where(Comment.path.is_(None), Comment.id > last_id)
+            .order_by(Comment.id).limit(batch_size)).all()
+        if not rows:
+            break
+        # Parents from earlier batches are already written, ones in this batch are resolved below
+        parent_ids = {parent_id for _, parent_id in rows if parent_id}
+        paths = dict(db.session.execute(
+            select(Comment.id, Comment.path).where(Comment.id.in_(parent_ids), Comment.path.isnot(None))).all())
+        params = []
+        for comment_id, parent_id in rows:
+            path = paths.get(parent_id, '') + segment(comment_id) if parent_id else segment(comment_id)
+            paths[comment_id] = path
+            params.append({'comment_id': comment_id, 'new_path': path, 'new_depth': depth_of(path)})
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('comment_id'))
+            .values(path=bindparam('new_path'), depth=bindparam('new_depth')),
+            params)
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+
+    replies = aliased(Comment)
+    db.session.execute(table.update().values(
+        reply_count=select(func.count(replies.id)).where(replies.parent_id == table.c.id).scalar_subquery(),
+        descendant_count=select(func.count(replies.id)).where(
+            replies.post_id == table.c.post_id,
+            replies.path > table.c.path,
+            replies.path.startswith(table.c.path, autoescape=False)).scalar_subquery()))
+    db.session.commit()
+    return updated
@@ -0,0 +1,177 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = 'global'
+
+
+def symbol_channel(symbol_code):
+    return 'symbol:{}'.format(symbol_code)
+
+
+class Subscription:
+    """One connected stream client: a bounded queue of encoded SSE frames"""
+
+    def __init__(self, channels, max_queued):
+        self.channels = channels
+        self.frames = queue.Queue(maxsize=max_queued)
+        self.overflowed = False
+
+    def offer(self, frame):
+        try:
+            self.frames.put_nowait(frame)
+        except queue.Full:
+            # Slow client: stop queueing and let the stream tell it to resync
+            self.overflowed = True
+
+
+class RedisBus:
+    """Relays published events between processes over one Redis pub/sub topic.
+
+    Publishers send the encoded frame and its channels; every process that serves
+    streams runs a listener thread that hands them to its own subscribers. Works with
+    any client speaking the redis-py API.
+    """
+
+    topic = 'ssi:events'
+
+    def __init__(self, client, deliver, reset):
+        self.client = client
+        self.deliver = deliver
+        self.reset = reset
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url, deliver, reset):
+        import redis
+        return cls(redis.Redis.from_url(url), deliver, reset)
+
+    def next_id(self):
+        return self.client.incr(self.topic + ':id')
+
+    def publish(self, channels, frame):
+        return self.client.publish(self.topic, json.dumps({'channels': channels, 'frame': frame.decode('utf-8')}))
+
+    def listen(self):
+        """Start relaying to this process's subscribers, once"""
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='event-relay', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        connected_before = False
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.topic)
+                if connected_before:
+                    # Events published while we were away are gone, clients must refetch
+                    self.reset()
+                connected_before = True
+                for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    payload = json.loads(message['data'])
+                    self.deliver(payload['channels'], payload['frame'].encode('utf-8'))
+            except Exception:
+                logger.exception('Event relay lost its Redis subscription, reconnecting')
+                time.sleep(1)
+
+
+class EventBroadcaster:
+    """Fans each published event out to every subscriber of its channels.
+
+    Events are encoded to an SSE frame once and the same bytes are queued for every
+    subscriber, so publishing costs one encode plus one queue put per listener, and
+    nothing at all when nobody is listening. With SSE_BUS=redis frames go through a
+    RedisBus instead, and reach the subscribers of every process, including a separate
+    stream server; publishing then always costs a Redis round trip.
+    """
+
+    def __init__(self, max_queued=256):
+        self.max_queued = max_queued
+        self.bus = None
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def init_app(self, app):
+        self.max_queued = app.config.get('SSE_QUEUE_SIZE', self.max_queued)
+        kind = app.config.get('SSE_BUS', 'local')
+        if kind == 'redis':
+            self.bus = RedisBus.from_url(app.config['SSE_REDIS_URL'], self._deliver, self._resync_all)
+        elif kind in (None, 'local'):
+            self.bus = None
+            if not app.config.get('SSE_STREAMS', True):
+                logger.warning('SSE_STREAMS is off and SSE_BUS is local: events published here reach no stream')
+        else:
+            raise ValueError('Unknown SSE_BUS {}'.format(kind))
+
+    def subscribe(self, *channels):
+        if self.bus is not None:
+            self.bus.listen()
+        sub = Subscription(channels, self.max_queued)
+        with self._lock:
+            for channel in channels:
+                self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(sub)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def has_subscribers(self):
+        """Whether publishing can reach anyone; always with a bus, listeners are in other processes"""
+        return self.bus is not None or bool(self._channels)
+
+    def publish(self, event, data, symbol_code=None):
+        """Send an event to the global channel and, if given, the symbol's channel.
+
+        Called after the write it reports is committed, so a bus outage is logged and
+        the event dropped rather than failing the write; returns the number reached.
+        """
+        channels = [GLOBAL] if symbol_code is None else [GLOBAL, symbol_channel(symbol_code)]
+        if self.bus is not None:
+            try:
+                return self.bus.publish(channels, self._frame(self.bus.next_id(), event, data))
+            except Exception:
+                logger.exception('Failed to publish %s to the event bus', event)
+                return 0
+        if not self.has_subscribers():
+            return 0
+        return self._deliver(channels, self._frame(next(self._ids), event, data))
+
+    @staticmethod
+    def _frame(event_id, event, data):
+        return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+            event_id, event, json.dumps(data, separators=(',', ':'))).encode('utf-8')
+
+    def _deliver(self, channels, frame):
+        with self._lock:
+            targets = set().union(*(self._channels.get(c, ()) for c in channels))
+        for sub in targets:
+            sub.offer(frame)
+        return len(targets)
+
+    def _resync_all(self):
+        with self._lock:
+            targets = set().union(*self._channels.values())
+        for sub in targets:
+            sub.overflowed = True
+            sub.offer(b': relay reconnected\n\n')
+
+
+broadcaster = EventBroadcaster()
@@ -0,0 +1,127 @@
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from sqlalchemy import bindparam, func, select
+
+from app import db
+from app.cache import cache, tags
+from app.models.models import Posts, User
+
+logger = logging.getLogger(__name__)
+
+
+class LikeBuffer:
+    """Coalesces like increments in process and applies them as periodic bulk UPDATEs.
+
+    Enabled with LIKE_BUFFER_ENABLED. Pending likes are flushed every
+    LIKE_BUFFER_FLUSH_INTERVAL seconds, as soon as LIKE_BUFFER_FLUSH_SIZE likes are
+    waiting, and at interpreter exit. Likes still pending when the process dies are lost.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.flush_interval = 1.0
+        self.flush_size = 500
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('LIKE_BUFFER_ENABLED', False)
+        self.flush_interval = app.config.get('LIKE_BUFFER_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_size = app.config.get('LIKE_BUFFER_FLUSH_SIZE', self.flush_size)
+        if self.enabled:
+            atexit.register(self.flush)
+
+    def add(self, post_id, count=1):
+        """Queue likes for a post, returns the number still pending for it"""
+        with self._lock:
+            self._pending[post_id] += count
+            pending = self._pending[post_id]
+            backlog = sum(self._pending.values())
+        self._ensure_flusher()
+        if backlog >= self.flush_size:
+            self._wake.set()
+        return pending
+
+    def pending(self, post_id):
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def _ensure_flusher(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='like-buffer-flusher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered likes')
+
+    def flush(self):
+        """Apply all pending likes in one transaction, returns the number of posts updated"""
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+        if not batch:
+            return 0
+
+        try:
+            with self.app.app_context():
+                LikeBuffer._apply(batch)
+        except Exception:
+            # Put the increments back so the next flush retries them
+            with self._lock:
+                self._pending.update(batch)
+            raise
+        return len(batch)
+
+    @staticmethod
+    def _apply(batch):
+        from app.services.reference_data import reference_data
+        from app.services.reputation_service import ReputationService
+        from app.services.sentiment_service import SentimentService, bucket_for
+
+        posts = Posts.__table__
+        db.session.execute(
+            posts.update()
+            .where(posts.c.id == bindparam('post_id'))
+            .values(likes_count=func.coalesce(posts.c.likes_count, 0) + bindparam('delta')),
+            [{'post_id': post_id, 'delta': delta} for post_id, delta in batch.items()])
+        db.session.execute(
+            User.__table__.update()
+            .where(User.id == select(posts.c.user_id).where(posts.c.id == bindparam('post_id')).scalar_subquery())
+            .values(**ReputationService.score_values(likes=bindparam('delta'))),
+            [{'post_id': post_id, 'delta': delta} for post_id, delta in batch.items()])
+
+        # Fold the likes into one rollup increment per (symbol, bucket)
+        rollups = defaultdict(int)
+        invalidated = {tags.FEED}
+        rows = db.session.execute(
+            select(posts.c.id, posts.c.user_id, posts.c.symbol_id, posts.c.created_at, User.username)
+            .join(User, User.id == posts.c.user_id)
+            .where(posts.c.id.in_(list(batch))))
+        for post_id, user_id, symbol_id, created_at, username in rows:
+            rollups[(symbol_id, bucket_for(created_at))] += batch[post_id]
+            invalidated.update((tags.user_posts(user_id), tags.user(username),
+                                tags.symbol_posts(reference_data.symbol_code(symbol_id))))
+        for (symbol_id, bucket_start), delta in rollups.items():
+            SentimentService.increment(symbol_id, bucket_start, likes_count=delta)
+
+        db.session.commit()
+        cache.invalidate(*invalidated)
+
+
+like_buffer = LikeBuffer()
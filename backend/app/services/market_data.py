@@ -0,0 +1,267 @@
+import functools
+import json
+import logging
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.cache.backends import LRUCache
+
+logger = logging.getLogger(__name__)
+
+TICKER_PATTERN = re.compile(r'^[A-Z0-9.\-]{1,12}$')
+
+
+class MarketDataError(Exception):
+    """Upstream failure surfaced to the routes, status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=502, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Upstream rate limit: `rate` requests per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout):
+        """Take a token, waiting up to timeout seconds; returns the seconds to wait when it cannot"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return 0
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                self.throttled += 1
+                return wait
+            time.sleep(wait)
+
+    def drain(self, seconds):
+        """Upstream answered 429: spend nothing for `seconds`"""
+        with self._lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+            self.updated = time.monotonic()
+
+
+class SingleFlight:
+    """Runs one producer per key at a time, concurrent callers for the key share its future"""
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _run(self, key, future, producer):
+        try:
+            future.set_result(producer())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def do(self, key, producer):
+        """Run producer in this thread, or wait for the call already in flight for key"""
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, producer)
+        return future.result()
+
+    def submit(self, key, producer, executor):
+        """Like do(), but the leader runs on executor and every caller gets the future"""
+        future, leader = self._join(key)
+        if leader:
+            executor.submit(self._run, key, future, producer)
+        return future
+
+
+class MarketDataGateway:
+    """Server-side gateway to the Massive market data API shared by every client.
+
+    Responses are cached for MARKET_DATA_TTL seconds (events and insights for their own,
+    shorter TTLs), concurrent misses for the same upstream URL are coalesced into one
+    request, multi-ticker lookups fetch only the symbols that missed, and every upstream
+    request takes a token from a MARKET_DATA_RATE_LIMIT/s bucket split across the
+    WEB_CONCURRENCY workers. Upstream load therefore follows the number of distinct
+    symbols per TTL, not the number of open tabs. Per process, like the other caches.
+    """
+
+    def __init__(self):
+        self.base_url = 'https://api.massive.com'
+        self.insights_url = None
+        self.api_key = None
+        self.timeout = 5.0
+        self.ttl = 3600
+        self.events_ttl = 300
+        self.insights_ttl = 10
+        self.not_found_ttl = 300
+        self.max_batch = 50
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self.cache = LRUCache(10000, self.ttl)
+        self.bucket = TokenBucket(5, 5)
+        self.flight = SingleFlight()
+        self._pool = None
+
+    def init_app(self, app):
+        config = app.config
+        self.base_url = config.get('MARKET_DATA_URL', self.base_url).rstrip('/')
+        self.insights_url = config.get('MARKET_DATA_INSIGHTS_URL') or None
+        self.api_key = config.get('MASSIVE_API_KEY')
+        self.timeout = config.get('MARKET_DATA_TIMEOUT', self.timeout)
+        self.ttl = config.get('MARKET_DATA_TTL', self.ttl)
+        self.events_ttl = config.get('MARKET_DATA_EVENTS_TTL', self.events_ttl)
+        self.insights_ttl = config.get('MARKET_DATA_INSIGHTS_TTL', self.insights_ttl)
+        self.max_batch = config.get('MARKET_DATA_MAX_BATCH', self.max_batch)
+        self.cache = LRUCache(config.get('MARKET_DATA_MAX_ENTRIES', 10000), self.ttl)
+
+        workers = max(1, config.get('WEB_CONCURRENCY', 1))
+        rate = config.get('MARKET_DATA_RATE_LIMIT', 5.0) / workers
+        self.bucket = TokenBucket(rate, max(1, config.get('MARKET_DATA_BURST', 10) // workers))
+        self._pool = ThreadPoolExecutor(max_workers=config.get('MARKET_DATA_CONCURRENCY', 4),
+                                        thread_name_prefix='market-data')
+
+    def _request(self, url):
+        if not self.api_key:
+            raise MarketDataError('MASSIVE_API_KEY not set', status=503)
+        wait = self.bucket.acquire(self.timeout)
+        if wait:
+            raise MarketDataError('Market data rate limit reached', status=503, retry_after=wait)
+
+        self.upstream_requests += 1
+        request = urllib.request.Request(url, headers={
+            'Authorization': 'Bearer {}'.format(self.api_key), 'Accept': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            self.upstream_errors += 1
+            if e.code == 429:
+                retry_after = float(e.headers.get('Retry-After') or 1)
+                self.bucket.drain(retry_after)
+                raise MarketDataError('Market data rate limit reached', status=503, retry_after=retry_after)
+            raise MarketDataError('Market data upstream returned {}'.format(e.code))
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            self.upstream_errors += 1
+            logger.warning('Market data request to %s failed: %s', url.split('?')[0], e)
+            raise MarketDataError('Market data upstream unavailable')
+
+    def _hit(self, url):
+        entry = self.cache.get(url)
+        if entry is None:
+            self.cache.stats.misses += 1
+        else:
+            self.cache.stats.hits += 1
+        return entry
+
+    def _load(self, url, ttl, extract):
+        """GET url into the cache, missing upstream resources cache as None"""
+        entry = self.cache.get(url)  # a flight for url may have landed since our miss
+        if entry is not None:
+            return entry[0]
+        payload = self._request(url)
+        value = None if payload is None else extract(payload)
+        self.cache.set(url, (value,), self.not_found_ttl if value is None else ttl)
+        self.cache.stats.sets += 1
+        return value
+
+    def _cached(self, url, ttl, extract=lambda payload: payload):
+        entry = self._hit(url)
+        return entry[0] if entry is not None else self.flight.do(url, functools.partial(self._load, url, ttl, extract))
+
+    def _url(self, path, **params):
+        query = urllib.parse.urlencode(params)
+        return '{}{}{}'.format(self.base_url, path, '?' + query if query else '')
+
+    @staticmethod
+    def normalize(symbol):
+        symbol = (symbol or '').strip().upper()
+        if not TICKER_PATTERN.match(symbol):
+            raise ValueError('Invalid ticker {!r}'.format(symbol))
+        return symbol
+
+    def _ticker_url(self, symbol):
+        return self._url('/v3/reference/tickers', ticker=symbol)
+
+    @staticmethod
+    def _first_result(payload):
+        return (payload.get('results') or [None])[0]
+
+    def ticker(self, symbol):
+        """Reference data for one ticker, or None when upstream does not know it"""
+        return self._cached(self._ticker_url(self.normalize(symbol)), self.ttl, self._first_result)
+
+    def tickers(self, symbols):
+        """{symbol: reference data or None} for up to MARKET_DATA_MAX_BATCH tickers.
+
+        Duplicates collapse, cached tickers are answered from memory and only the misses
+        go upstream, in parallel on the gateway's small pool.
+        """
+        symbols = list(dict.fromkeys(self.normalize(s) for s in symbols))
+        if len(symbols) > self.max_batch:
+            raise ValueError('At most {} tickers per request'.format(self.max_batch))
+
+        results, misses = {}, {}
+        for symbol in symbols:
+            url = self._ticker_url(symbol)
+            entry = self._hit(url)
+            if entry is not None:
+                results[symbol] = entry[0]
+            else:
+                misses[symbol] = self.flight.submit(
+                    url, functools.partial(self._load, url, self.ttl, self._first_result), self._pool)
+        for symbol, future in misses.items():
+            results[symbol] = future.result()
+        return {symbol: results[symbol] for symbol in symbols}
+
+    def events(self, symbol):
+        """Ticker events (name changes, splits...) for one ticker"""
+        symbol = self.normalize(symbol)
+        return self._cached(self._url('/v3/reference/tickers/{}/events'.format(urllib.parse.quote(symbol))),
+                            self.events_ttl, lambda payload: payload.get('results'))
+
+    def insights(self):
+        if not self.insights_url:
+            raise MarketDataError('MARKET_DATA_INSIGHTS_URL not set', status=404)
+        return self._cached(self.insights_url, self.insights_ttl)
+
+    def stats(self):
+        data = self.cache.stats.to_dict()
+        data.update(size=self.cache.size(), upstream_requests=self.upstream_requests,
+                    upstream_errors=self.upstream_errors, coalesced=self.flight.shared,
+                    throttled=self.bucket.throttled)
+        return data
+
+
+market_data = MarketDataGateway()
@@ -0,0 +1,85 @@
+import base64
+import binascii
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(created_at, item_id):
+    """Encode a (created_at, id) position into an opaque URL-safe cursor"""
+    raw = '{}|{}'.format(created_at.isoformat(), item_id)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        created_at, item_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def page_size(limit):
+    """Clamp a requested page size to the configured bounds"""
+    if limit is None:
+        return current_app.config['POSTS_PAGE_SIZE']
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be a positive integer')
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, current_app.config['POSTS_MAX_PAGE_SIZE'])
+
+
+def apply_keyset(query, created_col, id_col, limit, cursor=None):
+    """Order newest first and seek past the cursor, fetching one extra row to detect a next page"""
+    if cursor is not None:
+        created_at, item_id = cursor
+        query = query.filter(or_(created_col < created_at,
+                                 and_(created_col == created_at, id_col < item_id)))
+    return query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def split_page(rows, limit, key=lambda row: (row.created_at, row.id), encode=encode_cursor):
+    """Trim the look-ahead row and build the cursor for the next page"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode(*key(rows[-1]))
+
+
+def encode_offset(offset):
+    """Opaque cursor for ranked result sets that page by position"""
+    return base64.urlsafe_b64encode('o|{}'.format(offset).encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_offset(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        tag, offset = base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii').split('|')
+        if tag != 'o' or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def encode_path(path):
+    """Opaque cursor for comment threads, which page by materialized path"""
+    return base64.urlsafe_b64encode('p|{}'.format(path).encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_path(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        tag, path = base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii').split('|')
+        if tag != 'p' or not path.isdigit():
+            raise ValueError
+        return path
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor')
@@ -0,0 +1,253 @@
+"""Monthly range partitions for posts and comment, and archival of months past retention.
+
+On Postgres both tables are PARTITION BY RANGE (created_at) with one partition per
+month (posts_p202405, ...) plus a default partition for rows outside every range.
+Tables are partitioned as create_all() creates them; existing ones are converted by
+`flask partition-tables`. A partitioned table needs the partition key in its primary
+key, so the key is (id, created_at), and it cannot be the target of a foreign key, so
+comment.post_id and comment.parent_id only have one on other databases.
+
+Partitions are created PARTITION_MONTHS_AHEAD months ahead by a background thread in
+each app process and by `flask maintain-partitions`, which also moves months older
+than ARCHIVE_AFTER_MONTHS into the Parquet archive (app.services.post_archive). An
+archived partition is detached and dropped, freeing its space at once instead of
+leaving dead rows to vacuum. SQLite has no partitions, archived months are deleted.
+
+Months are on the clock the rows are stamped with, the app's local time (datetime.now(),
+as PostService stamps created_at), so a post written just after midnight on the 1st lands
+in the new month's partition.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect, select, text
+from sqlalchemy.schema import AddConstraint
+
+from app import db
+from app.cache import cache, tags
+from app.models.models import Comment, Posts
+from app.services.post_archive import add_months, month_start, post_archive
+from app.services.search_service import create_search_index
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED = (Posts.__table__, Comment.__table__)
+# Postgres advisory lock held while creating or archiving partitions, one process at a time
+LOCK_KEY = 72021
+
+
+def partition_name(table_name, month):
+    return '{}_p{}'.format(table_name, month.strftime('%Y%m'))
+
+
+def _bound(moment):
+    # Partition bounds are DDL, they cannot be bind parameters
+    return "'{}'".format(moment.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def is_partitioned(connection, table_name):
+    return connection.scalar(text('SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)'),
+                             {'name': table_name}) == 'p'
+
+
+def partition_months(connection, table_name):
+    """Months that have a partition, oldest first"""
+    prefix = table_name + '_p'
+    names = connection.scalars(text(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = to_regclass(:name)'), {'name': table_name})
+    return sorted(datetime.strptime(name[len(prefix):], '%Y%m') for name in names
+                  if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+
+def create_partition(connection, table_name, month):
+    name = partition_name(table_name, month)
+    bounds = 'FROM ({}) TO ({})'.format(_bound(month), _bound(add_months(month, 1)))
+    in_month = 'created_at >= {} AND created_at < {}'.format(_bound(month), _bound(add_months(month, 1)))
+    default = table_name + '_default'
+
+    if connection.scalar(text('SELECT EXISTS (SELECT 1 FROM {} WHERE {})'.format(default, in_month))):
+        # Rows that landed in the default partition move to the new one before it is attached
+        connection.execute(text('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)'.format(name, table_name)))
+        connection.execute(text('WITH moved AS (DELETE FROM {} WHERE {} RETURNING *) '
+                                'INSERT INTO {} SELECT * FROM moved'.format(default, in_month, name)))
+        connection.execute(text('ALTER TABLE {} ATTACH PARTITION {} FOR VALUES {}'.format(table_name, name, bounds)))
+    else:
+        connection.execute(text('CREATE TABLE {} PARTITION OF {} FOR VALUES {}'.format(name, table_name, bounds)))
+    return name
+
+
+def partition_table(connection, table, months_ahead):
+    """Convert a plain posts/comment table into a monthly partitioned one, rows included.
+
+    Returns False if it already is partitioned. Holds an exclusive lock on the table
+    while rows are copied, run it on existing data in a maintenance window.
+    """
+    name = table.name
+    if is_partitioned(connection, name):
+        return False
+
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for other in inspector.get_table_names():
+        for foreign_key in inspector.get_foreign_keys(other):
+            if foreign_key['referred_table'] == name and foreign_key.get('name'):
+                connection.execute(text('ALTER TABLE {} DROP CONSTRAINT {}'.format(
+                    preparer.quote(other), preparer.quote(foreign_key['name']))))
+
+    legacy = name + '_unpartitioned'
+    primary_key = inspector.get_pk_constraint(name).get('name')
+    connection.execute(text('ALTER TABLE {} RENAME TO {}'.format(name, legacy)))
+    if primary_key:
+        # Frees the index name for the new table's key
+        connection.execute(text('ALTER TABLE {} DROP CONSTRAINT {}'.format(legacy, preparer.quote(primary_key))))
+    connection.execute(text('UPDATE {} SET created_at = :now WHERE created_at IS NULL'.format(legacy)),
+                       {'now': datetime.now()})
+
+    connection.execute(text('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'
+                            .format(name, legacy)))
+    connection.execute(text('ALTER TABLE {} ADD PRIMARY KEY (id, created_at)'.format(name)))
+    for constraint in table.foreign_key_constraints:
+        if constraint.referred_table not in PARTITIONED:
+            connection.execute(AddConstraint(constraint))
+    connection.execute(text('CREATE TABLE {0}_default PARTITION OF {0} DEFAULT'.format(name)))
+
+    first = connection.scalar(text('SELECT min(created_at) FROM {}'.format(legacy)))
+    last = add_months(month_start(datetime.now()), months_ahead)
+    month = month_start(min(first, last) if first else last)
+    while month <= last:
+        create_partition(connection, name, month)
+        month = add_months(month, 1)
+
+    connection.execute(text('INSERT INTO {} SELECT * FROM {}'.format(name, legacy)))
+    sequence = connection.scalar(text("SELECT pg_get_serial_sequence(:name, 'id')"), {'name': legacy})
+    if sequence:
+        connection.execute(text('ALTER SEQUENCE {} OWNED BY {}.id'.format(sequence, name)))
+    connection.execute(text('DROP TABLE {}'.format(legacy)))
+
+    # Indexes on the parent cascade to every partition, present and future
+    for index in table.indexes:
+        index.create(connection)
+    if table is Posts.__table__:
+        create_search_index(connection)
+    return True
+
+
+def _partition_on_create(table, connection, **kw):
+    if connection.dialect.name == 'postgresql':
+        partition_table(connection, table, partitions.months_ahead)
+
+
+for _table in PARTITIONED:
+    event.listen(_table, 'after_create', _partition_on_create)
+
+
+class PartitionManager:
+    def __init__(self):
+        self.app = None
+        self.months_ahead = 2
+        self.archive_after = 3
+        self.interval = 3600
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.months_ahead = app.config.get('PARTITION_MONTHS_AHEAD', self.months_ahead)
+        self.archive_after = app.config.get('ARCHIVE_AFTER_MONTHS', self.archive_after)
+        self.interval = app.config.get('PARTITION_MAINTENANCE_SECONDS', self.interval)
+        post_archive.init_app(app)
+
+        with app.app_context():
+            postgres = db.engine.dialect.name == 'postgresql'
+        if postgres and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='partition-maintenance', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.create_partitions()
+            except Exception:
+                logger.exception('Failed to create partitions')
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _locked(connection):
+        if connection.dialect.name != 'postgresql':
+            return True
+        return connection.scalar(text('SELECT pg_try_advisory_xact_lock(:key)'), {'key': LOCK_KEY})
+
+    def create_partitions(self, now=None):
+        """Create any missing partition for this month and the next PARTITION_MONTHS_AHEAD"""
+        created = []
+        with db.engine.begin() as connection:
+            if connection.dialect.name != 'postgresql' or not self._locked(connection):
+                return created
+            current = month_start(now or datetime.now())
+            for table in PARTITIONED:
+                if not is_partitioned(connection, table.name):
+                    continue
+                existing = set(partition_months(connection, table.name))
+                for offset in range(self.months_ahead + 1):
+                    month = add_months(current, offset)
+                    if month not in existing:
+                        created.append(create_partition(connection, table.name, month))
+        return created
+
+    def archive(self, now=None):
+        """Move every month older than ARCHIVE_AFTER_MONTHS to the archive, oldest first.
+
+        Each month is one transaction: rows are streamed into its Parquet file, then
+        the partition is dropped (or the rows deleted). Returns (table, month, rows).
+        """
+        if self.archive_after <= 0:
+            return []
+        post_archive._require()
+        cutoff = add_months(month_start(now or datetime.now()), -self.archive_after)
+        archived = []
+        for table in PARTITIONED:
+            while True:
+                with db.engine.begin() as connection:
+                    if not self._locked(connection):
+                        return archived
+                    first = connection.scalar(select(func.min(table.c.created_at)).where(table.c.created_at < cutoff))
+                    if first is None:
+                        self._drop_empty(connection, table, cutoff)
+                        break
+                    month = month_start(first)
+                    rows = self._archive_month(connection, table, month)
+                archived.append((table.name, month, rows))
+                logger.info('Archived %s rows of %s for %s', rows, table.name, month.strftime('%Y-%m'))
+
+        if archived:
+            cache.invalidate(tags.FEED)
+        return archived
+
+    @staticmethod
+    def _archive_month(connection, table, month):
+        in_month = (table.c.created_at >= month) & (table.c.created_at < add_months(month, 1))
+        result = connection.execute(select(table).where(in_month).order_by(table.c.id)
+                                    .execution_options(stream_results=True, yield_per=post_archive.batch_size))
+        rows = post_archive.write(table, month, result.partitions())
+
+        if connection.dialect.name == 'postgresql' and month in partition_months(connection, table.name):
+            name = partition_name(table.name, month)
+            connection.execute(text('ALTER TABLE {} DETACH PARTITION {}'.format(table.name, name)))
+            connection.execute(text('DROP TABLE {}'.format(name)))
+        # SQLite, and rows of the month left in the default partition
+        connection.execute(table.delete().where(in_month))
+        return rows
+
+    @staticmethod
+    def _drop_empty(connection, table, cutoff):
+        if connection.dialect.name != 'postgresql' or not is_partitioned(connection, table.name):
+            return
+        for month in partition_months(connection, table.name):
+            if add_months(month, 1) <= cutoff:
+                connection.execute(text('DROP TABLE {}'.format(partition_name(table.name, month))))
+
+
+partitions = PartitionManager()
@@ -0,0 +1,153 @@
+"""Columnar archive of cold posts and comments.
+
+Months older than the hot retention are moved out of the database into one Parquet
+file per table and month under ARCHIVE_DIR (posts/2024-01.parquet, ...), see
+app.services.partitions. Months are archived oldest first, so the archive of a table
+always covers everything before archived_until(table) and the aggregation paths that
+rebuild state from posts (the sentiment rollup backfill, the reputation recompute)
+read the archive for that range and the database only after it. Needs pyarrow.
+"""
+import glob
+import os
+from collections import Counter
+from datetime import datetime
+
+from app import db
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional, without it cold rows simply stay in the database
+    pa = None
+
+MONTH_FORMAT = '%Y-%m'
+
+
+def month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, months):
+    years, index = divmod(month.month - 1 + months, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+
+def _arrow_type(column):
+    if isinstance(column.type, db.Boolean):
+        return pa.bool_()
+    if isinstance(column.type, db.Integer):
+        return pa.int64()
+    if isinstance(column.type, db.DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+
+class PostArchive:
+    def __init__(self):
+        self.directory = 'archive'
+        self.batch_size = 1000
+
+    def init_app(self, app):
+        self.directory = app.config.get('ARCHIVE_DIR', self.directory)
+        self.batch_size = app.config.get('EXPORT_BATCH_SIZE', self.batch_size)
+
+    @property
+    def available(self):
+        return pa is not None
+
+    def _require(self):
+        if pa is None:
+            raise RuntimeError('Archiving needs pyarrow (pip install pyarrow)')
+
+    def path(self, table_name, month):
+        return os.path.join(self.directory, table_name, '{}.parquet'.format(month.strftime(MONTH_FORMAT)))
+
+    def months(self, table_name):
+        """Archived months of a table, oldest first"""
+        names = glob.glob(os.path.join(self.directory, table_name, '*.parquet'))
+        return sorted(datetime.strptime(os.path.basename(name)[:-len('.parquet')], MONTH_FORMAT) for name in names)
+
+    def archived_until(self, table_name):
+        """Start of the first month not in the archive, None when nothing is archived"""
+        months = self.months(table_name)
+        return add_months(months[-1], 1) if months else None
+
+    def write(self, table, month, batches):
+        """Write row batches of one table-month, merged with any rows archived for it before.
+
+        The file is written next to its final path and renamed into place, so a reader
+        sees either the old or the new file. Rows already archived under an id that is
+        written again (a run that failed after writing, before deleting) are replaced.
+        """
+        self._require()
+        schema = pa.schema([pa.field(column.name, _arrow_type(column)) for column in table.columns])
+        path = self.path(table.name, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        id_index = [column.name for column in table.columns].index('id')
+        written = []
+        with pq.ParquetWriter(path + '.tmp', schema, compression='zstd') as writer:
+            for batch in batches:
+                columns = list(zip(*batch))
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+                written.append(pa.array(columns[id_index], type=pa.int64()))
+            if os.path.exists(path):
+                earlier = pq.read_table(path, schema=schema)
+                if written:
+                    earlier = earlier.filter(pc.invert(pc.is_in(earlier['id'], value_set=pa.concat_arrays(written))))
+                writer.write_table(earlier)
+        os.replace(path + '.tmp', path)
+        return sum(len(ids) for ids in written)
+
+    def _tables(self, table_name, columns, filter=None):
+        """Each archived month of a table as an Arrow table, one month in memory at a time"""
+        months = self.months(table_name)
+        if months:
+            self._require()
+        for month in months:
+            yield pq.read_table(self.path(table_name, month), columns=columns, filters=filter)
+
+    def sentiment_buckets(self):
+        """{(symbol_id, hour): counters} over archived posts, the SentimentService.backfill shape"""
+        buckets = {}
+        for table in self._tables('posts', ['symbol_id', 'created_at', 'sentiment', 'sentiment_score',
+                                            'likes_count']):
+            sentiment = table['sentiment']
+            bullish = pc.equal(sentiment, 'Bullish').fill_null(False)
+            bearish = pc.equal(sentiment, 'Bearish').fill_null(False)
+            table = table.append_column('bucket', pc.floor_temporal(table['created_at'], unit='hour')) \
+                .append_column('bullish', pc.cast(bullish, pa.int64())) \
+                .append_column('bearish', pc.cast(bearish, pa.int64())) \
+                .append_column('neutral', pc.cast(pc.invert(pc.or_(bullish, bearish)), pa.int64()))
+            grouped = table.group_by(['symbol_id', 'bucket']).aggregate([
+                ('symbol_id', 'count'), ('bullish', 'sum'), ('bearish', 'sum'), ('neutral', 'sum'),
+                ('sentiment_score', 'sum'), ('likes_count', 'sum')])
+            for row in grouped.to_pylist():
+                counters = buckets.setdefault((row['symbol_id'], row['bucket']), Counter())
+                counters.update({
+                    'post_count': row['symbol_id_count'],
+                    'bullish_count': row['bullish_sum'],
+                    'bearish_count': row['bearish_sum'],
+                    'neutral_count': row['neutral_sum'],
+                    'sentiment_score_sum': row['sentiment_score_sum'] or 0,
+                    'likes_count': row['likes_count_sum'] or 0,
+                })
+        return buckets
+
+    def user_totals(self, user_id=None):
+        """{user_id: (posts, sentiment score sum, likes)} over archived posts, for one user or all"""
+        totals = {}
+        filter = None if user_id is None else [('user_id', '=', user_id)]
+        for table in self._tables('posts', ['user_id', 'sentiment_score', 'likes_count'], filter):
+            grouped = table.group_by('user_id').aggregate([
+                ('user_id', 'count'), ('sentiment_score', 'sum'), ('likes_count', 'sum')])
+            for row in grouped.to_pylist():
+                posts, score_sum, likes = totals.get(row['user_id'], (0, 0, 0))
+                totals[row['user_id']] = (posts + row['user_id_count'], score_sum + (row['sentiment_score_sum'] or 0),
+                                          likes + (row['likes_count_sum'] or 0))
+        return totals
+
+
+post_archive = PostArchive()
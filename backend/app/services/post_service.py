@@ -2,78 +2,501 @@ from sqlalchemy.util import symbol
 
 from app.models.models import Posts, Sentiment, Symbol, Comment, User
 from app import db
+from app.cache import cache, tags
 from datetime import datetime
+from flask import current_app
+from collections import Counter, defaultdict
+from sqlalchemy import bindparam, case, func, insert, select, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app.models.serializers import CommentDetailSerializer
+from app.models.fast_serializers import (POST_COLUMNS, POST_DETAIL_COLUMNS, USER_PUBLIC_COLUMNS,
+                                        dump_post_detail_row, dump_post_row)
+from app.models.serializers import CommentSerializer, PostDetailSerializer
+from app.services.event_broadcaster import broadcaster
+from app.services.like_buffer import like_buffer
+from app.services import comment_paths
+from app.services.pagination import apply_keyset, encode_path, split_page
+from app.services.ranking_service import ranking
+from app.services.reference_data import reference_data
+from app.services.reputation_service import ReputationService
+from app.services.search_index import search_index
+from app.services.sentiment_service import SentimentService
+from app.services.write_behind import write_behind
+from app.utils.replicas import read_replica
 
 
 class PostService:
     @staticmethod
     def create_post(data):
-        # Database operations
-        symbol_id = Symbol.query.filter_by(code = data['symbol']).first_or_404()
+        symbol_id = reference_data.symbol_id(data['symbol'])
+        if symbol_id is None:
+            raise ValueError('Unknown symbol {}'.format(data['symbol']))
+
+        # Post, rollup and author scores are written in a single transaction
         post = Posts(user_id=data['userId'],
                 content=data['content'],
                 sentiment=data['sentiment'],
                 sentiment_score=data['sentimentScore'],
-                symbol_id=symbol_id.to_dict()['id'],
+                symbol_id=symbol_id,
                 image_attachment= data.get('imageAttachment', None),
                 created_at = datetime.now())
         db.session.add(post)
-        db.session.commit()
-        user = User.query.filter_by(id = data['userId']).first_or_404()
-        user.post_count = user.post_count +1
+        SentimentService.record_post(post)
+        author = db.session.execute(
+            update(User).where(User.id == post.user_id)
+            .values(**ReputationService.score_values(posts=1, score_sum=post.sentiment_score or 0))
+            .returning(User.username, User.reputation_score)).first()
+        if author is None:
+            db.session.rollback()
+            raise ValueError('User not found')
         db.session.commit()
 
+        search_index.add_post(post)
+        ranking.record_post(post, author.reputation_score)
+        cache.invalidate(tags.FEED, tags.user_posts(post.user_id),
+                         tags.symbol_posts(data['symbol']), tags.user(author.username))
+        if broadcaster.has_subscribers():
+            broadcaster.publish('post_created', PostDetailSerializer().dump(post), symbol_code=data['symbol'])
+
         return post
 
     @staticmethod
-    def get_posts(user_id):
-        posts = Posts.query.filter_by(user_id = user_id).all();
-        return posts
+    def queue_post(data):
+        """Validate a post and queue it for the write-behind flusher instead of committing it.
+
+        Returns the queued write, whose view is the post as PostSerializer would dump it
+        with a provisional id in place of the real one.
+        """
+        symbol_id = reference_data.symbol_id(data['symbol'])
+        if symbol_id is None:
+            raise ValueError('Unknown symbol {}'.format(data['symbol']))
+        author = db.session.execute(select(*USER_PUBLIC_COLUMNS).where(User.id == data['userId'])).first()
+        if author is None:
+            raise ValueError('User not found')
+
+        row = {
+            'user_id': author.id,
+            'content': data['content'],
+            'sentiment': data['sentiment'],
+            'sentiment_score': data['sentimentScore'],
+            'symbol_id': symbol_id,
+            'image_attachment': data.get('imageAttachment'),
+            'created_at': datetime.now(),
+            'processed': False,
+            'likes_count': 0,
+        }
+        columns = (None, row['content'], row['created_at'], False, row['sentiment_score'])
+        view = dump_post_row(columns + (row['user_id'], row['sentiment'], symbol_id, row['image_attachment'], 0))
+        detail = dump_post_detail_row(columns + (row['sentiment'], symbol_id, row['image_attachment'], 0) + tuple(author),
+                                      reference_data.symbol)
+        return write_behind.submit('post', row, author.id, symbol_id, view, detail)
+
+    @staticmethod
+    def create_posts_bulk(items):
+        """Insert many posts in one transaction: multi-row INSERTs, one grouped post_count UPDATE"""
+        if not items:
+            raise ValueError('No posts to import')
+        if len(items) > current_app.config['BULK_MAX_POSTS']:
+            raise ValueError('At most {} posts per request'.format(current_app.config['BULK_MAX_POSTS']))
+
+        symbol_ids = {code: reference_data.symbol_id(code) for code in {item.get('symbol') for item in items}}
+        now = datetime.now()
+        rows = []
+        for i, item in enumerate(items):
+            if not item.get('content') or not item.get('userId'):
+                raise ValueError('Post {}: content and userId required'.format(i))
+            if symbol_ids.get(item.get('symbol')) is None:
+                raise ValueError('Post {}: unknown symbol {}'.format(i, item.get('symbol')))
+            rows.append({
+                'user_id': int(item['userId']),
+                'content': item['content'],
+                'sentiment': item.get('sentiment'),
+                'sentiment_score': item.get('sentimentScore', 0),
+                'symbol_id': symbol_ids[item['symbol']],
+                'image_attachment': item.get('imageAttachment'),
+                'created_at': datetime.fromisoformat(item['createdAt']) if item.get('createdAt') else now,
+                'processed': False,
+                'likes_count': 0,
+            })
+
+        user_ids = {row['user_id'] for row in rows}
+        usernames = dict(db.session.execute(select(User.id, User.username).where(User.id.in_(list(user_ids)))).all())
+        unknown = user_ids - set(usernames)
+        if unknown:
+            raise ValueError('Unknown users: {}'.format(', '.join(str(u) for u in sorted(unknown))))
+
+        try:
+            post_ids = PostService._insert_posts(rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        PostService._after_posts_created(post_ids)
+        return len(rows)
+
+    @staticmethod
+    def _insert_posts(rows):
+        """Multi-row INSERT of post rows (dicts) with their rollups and one grouped author UPDATE.
+
+        Does not commit. Returns the new ids in row order.
+        """
+        per_user = Counter(row['user_id'] for row in rows)
+        score_sums = Counter()
+        for row in rows:
+            score_sums[row['user_id']] += row['sentiment_score'] or 0
+
+        post_ids = db.session.scalars(insert(Posts).returning(Posts.id, sort_by_parameter_order=True), rows).all()
+        SentimentService.record_posts(rows)
+        db.session.execute(
+            update(User).where(User.id.in_(list(per_user)))
+            .values(**ReputationService.score_values(posts=case(per_user, value=User.id),
+                                                     score_sum=case(score_sums, value=User.id, else_=0))))
+        return post_ids
+
+    @staticmethod
+    def _after_posts_created(post_ids):
+        """Cache invalidation, search index, hot posts and stream events for committed posts.
+
+        The batch paths' equivalent of the tail of create_post, one query for all posts
+        (two with stream subscribers).
+        """
+        invalidated = {tags.FEED}
+        rows = db.session.execute(
+            select(Posts.id, Posts.content, Posts.symbol_id, Posts.sentiment, Posts.sentiment_score,
+                   Posts.created_at, Posts.likes_count, Posts.user_id, User.username, User.reputation_score)
+            .join(Posts.user).where(Posts.id.in_(post_ids))).all()
+        for post in rows:
+            invalidated.update((tags.user_posts(post.user_id), tags.user(post.username),
+                                tags.symbol_posts(reference_data.symbol_code(post.symbol_id))))
+            search_index.add_post(post)
+            ranking.record_post(post, post.reputation_score)
+        cache.invalidate(*invalidated)
+
+        if broadcaster.has_subscribers():
+            for row in PostService.get_posts_by_ids(post_ids):
+                broadcaster.publish('post_created', dump_post_detail_row(row, reference_data.symbol),
+                                    symbol_code=reference_data.symbol_code(row.symbol_id))
+
+    @staticmethod
+    def _after_comments_added(comment_ids):
+        """Cache invalidation, hot posts and stream events for committed comments, see add_comment"""
+        comments = Comment.query.filter(Comment.id.in_(comment_ids)).order_by(Comment.id).all()
+        symbol_ids = dict(db.session.execute(
+            select(Posts.id, Posts.symbol_id).where(Posts.id.in_({c.post_id for c in comments}))).all())
+        for comment in comments:
+            ranking.record_comment(comment.post_id, symbol_ids.get(comment.post_id))
+        cache.invalidate(*{tags.comments(comment.post_id) for comment in comments})
+
+        if broadcaster.has_subscribers():
+            schema = CommentSerializer()
+            for comment in comments:
+                broadcaster.publish('comment_added', schema.dump(comment),
+                                    symbol_code=reference_data.symbol_code(symbol_ids.get(comment.post_id)))
+
+    @staticmethod
+    def _user_posts_query(user_id):
+        return select(*POST_COLUMNS).where(Posts.user_id == user_id)
+
+    @staticmethod
+    def _symbol_posts_query(symbol_code):
+        return select(*POST_COLUMNS).where(Posts.symbol_id == reference_data.symbol_id(symbol_code))
+
+    @staticmethod
+    def _feed_query():
+        return select(*POST_DETAIL_COLUMNS).join(Posts.user)
+
+    @staticmethod
+    def _page(query, limit, cursor):
+        rows = db.session.execute(apply_keyset(query, Posts.created_at, Posts.id, limit, cursor)).all()
+        return split_page(rows, limit)
+
+    @staticmethod
+    def _stream(query):
+        """Yield batches of rows newest first through a server-side cursor, memory stays flat"""
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+        query = query.order_by(Posts.created_at.desc(), Posts.id.desc()) \
+            .execution_options(yield_per=batch_size, stream_results=True)
+        result = db.session.execute(query)
+        try:
+            for batch in result.partitions():
+                yield batch
+        finally:
+            result.close()
+
+    @staticmethod
+    @read_replica
+    def get_posts(user_id, limit, cursor=None):
+        """Page of POST_COLUMNS rows for a user, see app.models.fast_serializers"""
+        return PostService._page(PostService._user_posts_query(user_id), limit, cursor)
+
+    @staticmethod
+    @read_replica
+    def get_posts_by_symbol(symbol_code, limit, cursor=None):
+        """Page of POST_COLUMNS rows for a symbol"""
+        return PostService._page(PostService._symbol_posts_query(symbol_code), limit, cursor)
+
+    @staticmethod
+    @read_replica
+    def get_all_posts(limit, cursor=None):
+        """Page of POST_DETAIL_COLUMNS rows for the global feed"""
+        return PostService._page(PostService._feed_query(), limit, cursor)
+
+    @staticmethod
+    def get_posts_by_ids(post_ids):
+        """POST_DETAIL_COLUMNS rows for the given ids, in the order given"""
+        rows = db.session.execute(PostService._feed_query().where(Posts.id.in_(post_ids))).all()
+        by_id = {row.id: row for row in rows}
+        return [by_id[post_id] for post_id in post_ids if post_id in by_id]
+
+    @staticmethod
+    def stream_posts(user_id):
+        return PostService._stream(PostService._user_posts_query(user_id))
 
     @staticmethod
-    def get_posts_by_symbol(symbol_code):
-        posts = Posts.query.join(Posts.symbol).filter(Symbol.code == symbol_code).all()
-        return posts
+    def stream_posts_by_symbol(symbol_code):
+        return PostService._stream(PostService._symbol_posts_query(symbol_code))
 
     @staticmethod
-    def get_all_posts():
-        posts = Posts.query.filter_by().all();
-        return posts
+    def stream_all_posts():
+        return PostService._stream(PostService._feed_query())
 
     @staticmethod
     def post_like(post_id):
-        post = Posts.query.filter_by(id = post_id).first_or_404()
+        if like_buffer.enabled:
+            post = Posts.query.filter_by(id = post_id).first()
+            if post is None:
+                raise ValueError('Post not found')
+            # Respond with the projected count, the flusher applies it in bulk later
+            pending = like_buffer.add(post.id)
+            set_committed_value(post, 'likes_count', (post.likes_count or 0) + pending)
+            PostService._after_like(post)
+            return post
+
+        # Atomic in-database increment, concurrent likes cannot overwrite each other
+        liked = db.session.execute(
+            update(Posts).where(Posts.id == post_id)
+            .values(likes_count=func.coalesce(Posts.likes_count, 0) + 1)
+            .returning(Posts.id, Posts.symbol_id, Posts.created_at)).first()
+        if liked is None:
+            raise ValueError('Post not found')
 
-        post.likes_count = (post.likes_count or 0) + 1
+        SentimentService.record_like(liked)
+        author = db.session.execute(
+            update(User).where(User.id == select(Posts.user_id).where(Posts.id == liked.id).scalar_subquery())
+            .values(**ReputationService.score_values(likes=1))
+            .returning(User.username)).first()
         db.session.commit()
 
+        post = db.session.get(Posts, liked.id)
+        cache.invalidate(tags.FEED, tags.user_posts(post.user_id), tags.user(author.username),
+                         tags.symbol_posts(reference_data.symbol_code(post.symbol_id)))
+        PostService._after_like(post)
         return post
 
+    @staticmethod
+    def _after_like(post):
+        ranking.record_like(post, post.user.reputation_score)
+        if broadcaster.has_subscribers():
+            broadcaster.publish('post_liked', {'post_id': post.id, 'likes_count': post.likes_count},
+                                symbol_code=reference_data.symbol_code(post.symbol_id))
+
     @staticmethod
     def add_comment(data, post_id):
-       comment = Comment(content= data['content'], post_id= post_id, user_id = data['userId'], parent_id= data.get('parentId', None), created_at = datetime.now())
+       # comment has no foreign keys on Postgres and SQLite does not enforce them
+       symbol_id = db.session.scalar(select(Posts.symbol_id).where(Posts.id == int(post_id)))
+       if symbol_id is None:
+           raise ValueError('Post not found')
+       parent_id = data.get('parentId', None)
+       parent_path = ''
+       if parent_id is not None:
+           parent = db.session.execute(
+               select(Comment.path, Comment.post_id).where(Comment.id == parent_id)).first()
+           if parent is None or parent.post_id != int(post_id) or parent.path is None:
+               raise ValueError('Parent comment not found')
+           parent_path = parent.path
+
+       # Insert, set the path from the new id and bump every ancestor's reply counts, one transaction
+       comment = Comment(content= data['content'], post_id= post_id, user_id = data['userId'], parent_id= parent_id, created_at = datetime.now(),
+                         depth=comment_paths.depth_of(parent_path) + 1 if parent_path else 0,
+                         reply_count=0, descendant_count=0)
        db.session.add(comment)
+       db.session.flush()
+       comment.path = parent_path + comment_paths.segment(comment.id)
+       if parent_path:
+           db.session.execute(
+               update(Comment).where(Comment.id.in_(comment_paths.ancestor_ids(parent_path)))
+               .values(descendant_count=func.coalesce(Comment.descendant_count, 0) + 1,
+                       reply_count=func.coalesce(Comment.reply_count, 0) + case((Comment.id == parent_id, 1), else_=0)),
+               execution_options={'synchronize_session': False})
        db.session.commit()
+       cache.invalidate(tags.comments(post_id))
+       ranking.record_comment(comment.post_id, symbol_id)
+       if broadcaster.has_subscribers():
+           broadcaster.publish('comment_added', CommentSerializer().dump(comment),
+                               symbol_code=reference_data.symbol_code(symbol_id))
 
        return comment
 
     @staticmethod
-    def get_comments_with_replies(post_id):
-        comments = Comment.query.filter_by(post_id=post_id, parent_id=None).all()
+    def queue_comment(data, post_id):
+        """Validate a comment and queue it for the write-behind flusher, see queue_post.
 
-        comment_schema = CommentDetailSerializer()
-        reply_schema = CommentDetailSerializer(many=True)
+        post_id and parentId may be provisional ids of writes still queued.
+        """
+        content = data.get('content')
+        max_length = Comment.__table__.c.content.type.length
+        if not content or len(content) > max_length:
+            raise ValueError('Comment content must be 1 to {} characters'.format(max_length))
+        user_id = db.session.scalar(select(User.id).where(User.id == data['userId']))
+        if user_id is None:
+            raise ValueError('User not found')
 
-        data = []
+        row = {'content': content, 'post_id': None, 'user_id': user_id, 'parent_id': None,
+               'created_at': datetime.now()}
+        post_ref = write_behind.resolve(str(post_id))
+        if write_behind.is_key(post_ref):
+            if write_behind.queued(post_ref) is None:
+                raise ValueError('Post not found')
+            row['post_key'] = post_ref
+        else:
+            row['post_id'] = db.session.scalar(select(Posts.id).where(Posts.id == int(post_ref)))
+            if row['post_id'] is None:
+                raise ValueError('Post not found')
 
+        depth = 0
+        parent_ref = data.get('parentId')
+        if parent_ref is not None:
+            parent_ref = write_behind.resolve(str(parent_ref))
+            if write_behind.is_key(parent_ref):
+                parent = write_behind.queued(parent_ref)
+                if parent is None or parent.kind != 'comment' or write_behind.resolve(parent.scope) != post_ref:
+                    raise ValueError('Parent comment not found')
+                row['parent_key'] = parent_ref
+                depth = parent.view['depth'] + 1
+            else:
+                parent = db.session.execute(
+                    select(Comment.path, Comment.post_id).where(Comment.id == int(parent_ref))).first()
+                if parent is None or str(parent.post_id) != post_ref or parent.path is None:
+                    raise ValueError('Parent comment not found')
+                row['parent_id'] = int(parent_ref)
+                depth = comment_paths.depth_of(parent.path) + 1
+
+        view = {'id': None, 'content': content, 'parent_id': None if parent_ref is None else row['parent_id'] or parent_ref,
+                'post_id': row['post_id'] or post_ref, 'is_active': True, 'user_id': user_id,
+                'created_at': row['created_at'].isoformat(), 'depth': depth, 'reply_count': 0, 'descendant_count': 0}
+        return write_behind.submit('comment', row, user_id, post_ref, view)
+
+    @staticmethod
+    def _insert_comments(rows, parents=None):
+        """Multi-row INSERT of comment rows (dicts), then their paths and the ancestors' reply counts.
+
+        parents maps the index of a row to the index of its parent when both are in
+        rows, parents first; otherwise parent_id is an existing comment or None. Does not
+        commit. Returns the new ids in row order.
+        """
+        parents = parents or {}
+        existing = {row['parent_id'] for row in rows if row['parent_id'] is not None}
+        paths = dict(db.session.execute(
+            select(Comment.id, Comment.path).where(Comment.id.in_(existing), Comment.path.isnot(None))).all()) \
+            if existing else {}
+        comment_ids = db.session.scalars(
+            insert(Comment).returning(Comment.id, sort_by_parameter_order=True),
+            [dict(row, is_active=True, reply_count=0, descendant_count=0) for row in rows]).all()
+
+        params = []
+        bumps = defaultdict(Counter)
+        for i, (row, comment_id) in enumerate(zip(rows, comment_ids)):
+            parent_id = comment_ids[parents[i]] if i in parents else row['parent_id']
+            if parent_id is not None and parent_id not in paths:
+                raise ValueError('Parent comment {} not found'.format(parent_id))
+            parent_path = paths[parent_id] if parent_id is not None else ''
+            path = paths[comment_id] = parent_path + comment_paths.segment(comment_id)
+            params.append({'comment_id': comment_id, 'new_parent_id': parent_id,
+                           'new_path': path, 'new_depth': comment_paths.depth_of(path)})
+            if parent_path:
+                for ancestor_id in comment_paths.ancestor_ids(parent_path):
+                    bumps[ancestor_id]['descendants'] += 1
+                bumps[parent_id]['replies'] += 1
+
+        table = Comment.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('comment_id'))
+            .values(parent_id=bindparam('new_parent_id'), path=bindparam('new_path'), depth=bindparam('new_depth')),
+            params)
+        if bumps:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('comment_id'))
+                .values(descendant_count=func.coalesce(table.c.descendant_count, 0) + bindparam('descendants'),
+                        reply_count=func.coalesce(table.c.reply_count, 0) + bindparam('replies')),
+                [{'comment_id': comment_id, 'descendants': counts['descendants'], 'replies': counts['replies']}
+                 for comment_id, counts in bumps.items()])
+        return comment_ids
+
+    @staticmethod
+    @read_replica
+    def get_comments_with_replies(post_id, limit, depth, replies, cursor=None):
+        """A page of top-level comments, each with its first `replies` replies down to `depth` levels, in one range scan.
+
+        The cursor is the path of the first top-level comment of the next page. The scan
+        reads from the cursor up to and including the (limit + 1)th top-level comment,
+        which is split off as the next cursor. Rows are numbered per thread in path order
+        so the statement returns at most replies + 1 per thread; a thread with more carries
+        its own next_cursor for /replies.
+        """
+        top_level = select(Comment.path).where(Comment.post_id == post_id, Comment.depth == 0)
+        if cursor is not None:
+            top_level = top_level.where(Comment.path >= cursor)
+        next_root = top_level.order_by(Comment.path).offset(limit).limit(1).scalar_subquery()
+
+        # A thread is every path sharing the top-level comment's segment, the comment itself is row 1
+        position = func.row_number().over(
+            partition_by=func.substr(Comment.path, 1, comment_paths.SEGMENT), order_by=Comment.path)
+        threads = select(Comment, position.label('position')).where(
+            Comment.post_id == post_id, Comment.depth <= depth,
+            Comment.path <= func.coalesce(next_root, comment_paths.PATH_MAX))
+        if cursor is not None:
+            threads = threads.where(Comment.path >= cursor)
+        threads = threads.subquery()
+        thread = aliased(Comment, threads)
+        comments = db.session.scalars(
+            select(thread).where(threads.c.position <= replies + 2).order_by(threads.c.path)).all()
+
+        next_cursor = None
+        if comments and comments[-1].depth == 0 and sum(1 for c in comments if c.depth == 0) > limit:
+            next_cursor = encode_path(comments.pop().path)
+
+        schema = CommentSerializer()
+        data = []
+        last_path = None
         for c in comments:
-            replies = Comment.query.filter_by(parent_id=c.id).all()
+            if c.depth == 0:
+                data.append({"comment": schema.dump(c), "replies": [], "next_cursor": None})
+            elif not data:
+                continue
+            elif len(data[-1]["replies"]) < replies:
+                # Descendants follow their top-level comment in depth-first order
+                data[-1]["replies"].append(schema.dump(c))
+            else:
+                # The look-ahead reply: the rest of the thread continues after the last one shown
+                data[-1]["next_cursor"] = encode_path(last_path)
+            last_path = c.path
 
-            data.append({
-                "comment": comment_schema.dump(c),
-                "replies": reply_schema.dump(replies)
-            })
+        return data, next_cursor
+
+    @staticmethod
+    @read_replica
+    def get_comments_replies(post_id, comment_id, limit, depth, cursor=None):
+        """A page of the subtree under a comment in depth-first order, `depth` levels deep"""
+        anchor = db.session.execute(
+            select(Comment.path, Comment.depth).where(Comment.id == comment_id, Comment.post_id == post_id)).first()
+        if anchor is None or anchor.path is None:
+            raise ValueError('Comment not found')
 
-        return data
+        query = Comment.query.filter(Comment.post_id == post_id,
+                                     Comment.path > (cursor if cursor is not None and cursor > anchor.path else anchor.path),
+                                     Comment.path < comment_paths.subtree_end(anchor.path),
+                                     Comment.depth <= anchor.depth + depth)
+        replies = query.order_by(Comment.path).limit(limit + 1).all()
+        return split_page(replies, limit, key=lambda c: (c.path,), encode=encode_path)
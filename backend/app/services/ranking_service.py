@@ -0,0 +1,202 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models.models import Comment, Posts, User
+
+logger = logging.getLogger(__name__)
+
+LN2 = math.log(2)
+
+# Relative weight of each kind of activity
+COMMENT_WEIGHT = 2.0
+SYMBOL_POST_WEIGHT = 1.0
+SYMBOL_LIKE_WEIGHT = 0.25
+SYMBOL_COMMENT_WEIGHT = 0.5
+
+
+def _timestamp(moment):
+    return time.mktime(moment.timetuple()) + moment.microsecond / 1e6
+
+
+class HotPosts:
+    """Bounded top-K of posts by time-decayed engagement.
+
+    Scores are stored as log(weight) + created_at * ln2 / half_life, so a post's key only
+    changes when its engagement does and the ordering never has to be recomputed as time
+    passes. Holds at most 2 * k candidates; reads sort that bounded set.
+    """
+
+    def __init__(self, k, half_life):
+        self.k = k
+        self.half_life = half_life
+        self._entries = {}  # post_id -> [likes, comments, sentiment_score, reputation, created_ts, key]
+
+    def _key(self, likes, comments, sentiment_score, reputation, created_ts):
+        weight = (1 + likes + COMMENT_WEIGHT * comments) \
+            * (0.5 + (reputation or 0) / 100.0) \
+            * (1 + abs(sentiment_score or 0) / 10.0)
+        return math.log(weight) + created_ts * LN2 / self.half_life
+
+    def upsert(self, post_id, likes, comments, sentiment_score, reputation, created_ts):
+        key = self._key(likes, comments, sentiment_score, reputation, created_ts)
+        if post_id not in self._entries and len(self._entries) >= 2 * self.k:
+            weakest = min(self._entries, key=lambda pid: self._entries[pid][5])
+            if self._entries[weakest][5] >= key:
+                return
+            del self._entries[weakest]
+        self._entries[post_id] = [likes, comments, sentiment_score, reputation, created_ts, key]
+
+    def bump(self, post_id, likes=None, comments=0):
+        entry = self._entries.get(post_id)
+        if entry is None:
+            return False
+        if likes is not None:
+            entry[0] = likes
+        entry[1] += comments
+        entry[5] = self._key(*entry[:5])
+        return True
+
+    def top(self, limit, now_ts):
+        best = heapq.nlargest(limit, self._entries.items(), key=lambda item: item[1][5])
+        decay = now_ts * LN2 / self.half_life
+        return [(post_id, math.exp(entry[5] - decay)) for post_id, entry in best]
+
+
+class TrendingSymbols:
+    """Exponentially decayed activity score per symbol, decayed lazily on touch and read"""
+
+    def __init__(self, half_life):
+        self.half_life = half_life
+        self._scores = {}  # symbol_id -> (score, as_of_ts)
+
+    def _decayed(self, score, as_of, now_ts):
+        return score * math.exp(-(now_ts - as_of) * LN2 / self.half_life)
+
+    def add(self, symbol_id, weight, at_ts, now_ts):
+        score, as_of = self._scores.get(symbol_id, (0.0, now_ts))
+        self._scores[symbol_id] = (self._decayed(score, as_of, now_ts) + self._decayed(weight, at_ts, now_ts), now_ts)
+
+    def top(self, limit, now_ts):
+        scored = ((symbol_id, self._decayed(score, as_of, now_ts)) for symbol_id, (score, as_of) in self._scores.items())
+        return heapq.nlargest(limit, scored, key=lambda item: item[1])
+
+
+class RankingEngine:
+    """Hot posts and trending symbols leaderboards, updated on writes and rebuilt periodically.
+
+    Write hooks keep the leaderboards fresh between rebuilds; the periodic rebuild
+    (every RANKING_REFRESH_SECONDS, over the last RANKING_WINDOW_HOURS of posts)
+    reconciles with the database, including writes made by other processes.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.top_k = 100
+        self.half_life = 12 * 3600
+        self.window = timedelta(hours=72)
+        self.refresh_interval = 300
+        self.hot_posts = HotPosts(self.top_k, self.half_life)
+        self.symbols = TrendingSymbols(self.half_life)
+        self.built_at = None
+        self._lock = threading.RLock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.top_k = app.config.get('RANKING_TOP_K', self.top_k)
+        self.half_life = app.config.get('RANKING_HALF_LIFE_HOURS', 12) * 3600
+        self.window = timedelta(hours=app.config.get('RANKING_WINDOW_HOURS', 72))
+        self.refresh_interval = app.config.get('RANKING_REFRESH_SECONDS', self.refresh_interval)
+        self.hot_posts = HotPosts(self.top_k, self.half_life)
+        self.symbols = TrendingSymbols(self.half_life)
+
+    def _ensure_built(self):
+        if self.built_at is None:
+            self.rebuild()
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='ranking-refresher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                with self.app.app_context():
+                    self.rebuild()
+            except Exception:
+                logger.exception('Failed to rebuild leaderboards')
+
+    def rebuild(self):
+        """Recompute both leaderboards from the recent window of posts"""
+        now = datetime.now()
+        now_ts = _timestamp(now)
+        since = now - self.window
+
+        comment_counts = select(Comment.post_id, func.count(Comment.id).label('comments')) \
+            .where(Comment.created_at >= since).group_by(Comment.post_id).subquery()
+        rows = db.session.execute(
+            select(Posts.id, Posts.symbol_id, Posts.created_at, Posts.likes_count, Posts.sentiment_score,
+                   User.reputation_score, func.coalesce(comment_counts.c.comments, 0))
+            .join(User, User.id == Posts.user_id)
+            .outerjoin(comment_counts, comment_counts.c.post_id == Posts.id)
+            .where(Posts.created_at >= since)).all()
+
+        hot_posts = HotPosts(self.top_k, self.half_life)
+        symbols = TrendingSymbols(self.half_life)
+        for post_id, symbol_id, created_at, likes, sentiment_score, reputation, comments in rows:
+            created_ts = _timestamp(created_at)
+            hot_posts.upsert(post_id, likes or 0, comments, sentiment_score, reputation, created_ts)
+            weight = SYMBOL_POST_WEIGHT + SYMBOL_LIKE_WEIGHT * (likes or 0) + SYMBOL_COMMENT_WEIGHT * comments
+            symbols.add(symbol_id, weight, created_ts, now_ts)
+
+        with self._lock:
+            self.hot_posts, self.symbols, self.built_at = hot_posts, symbols, now
+        return len(rows)
+
+    def record_post(self, post, reputation):
+        if self.built_at is None:
+            return
+        now_ts = time.time()
+        with self._lock:
+            self.hot_posts.upsert(post.id, post.likes_count or 0, 0, post.sentiment_score, reputation,
+                                  _timestamp(post.created_at))
+            self.symbols.add(post.symbol_id, SYMBOL_POST_WEIGHT, now_ts, now_ts)
+
+    def record_like(self, post, reputation):
+        if self.built_at is None:
+            return
+        now_ts = time.time()
+        with self._lock:
+            if not self.hot_posts.bump(post.id, likes=post.likes_count or 0):
+                # Comment count is unknown here, the next rebuild corrects it
+                self.hot_posts.upsert(post.id, post.likes_count or 0, 0, post.sentiment_score, reputation,
+                                      _timestamp(post.created_at))
+            self.symbols.add(post.symbol_id, SYMBOL_LIKE_WEIGHT, now_ts, now_ts)
+
+    def record_comment(self, post_id, symbol_id):
+        if self.built_at is None:
+            return
+        now_ts = time.time()
+        with self._lock:
+            self.hot_posts.bump(post_id, comments=1)
+            if symbol_id is not None:
+                self.symbols.add(symbol_id, SYMBOL_COMMENT_WEIGHT, now_ts, now_ts)
+
+    def trending(self, limit):
+        """([(symbol_id, score)], [(post_id, score)]) best first, cost bounded by K and the symbol count"""
+        self._ensure_built()
+        now_ts = time.time()
+        with self._lock:
+            return self.symbols.top(limit, now_ts), self.hot_posts.top(limit, now_ts)
+
+
+ranking = RankingEngine()
@@ -0,0 +1,110 @@
+import threading
+import time
+
+from sqlalchemy import event
+
+from app.models.models import Sentiment, Symbol
+
+
+class Snapshot:
+    """Immutable view of the lookup tables, swapped wholesale on refresh"""
+
+    def __init__(self, version, symbols, sentiments):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.symbols_by_id = {s['id']: s for s in symbols}
+        self.symbols_by_code = {s['code']: s for s in symbols}
+        self.sentiments_by_id = {s['id']: s for s in sentiments}
+        self.sentiments_by_code = {s['code']: s for s in sentiments}
+
+
+class ReferenceData:
+    """Process-wide cache of the small Symbol and Sentiment tables with O(1) code<->id lookups.
+
+    The snapshot is loaded by create_app() and reloaded when it is older than
+    REFDATA_TTL seconds, when this process writes to either table, or on a lookup miss
+    (at most once per REFDATA_MISS_REFRESH seconds, to pick up rows other processes added).
+    """
+
+    def __init__(self):
+        self.ttl = 300
+        self.miss_refresh = 5
+        self._snapshot = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('REFDATA_TTL', self.ttl)
+        self.miss_refresh = app.config.get('REFDATA_MISS_REFRESH', self.miss_refresh)
+        with app.app_context():
+            self.refresh()
+
+    def refresh(self):
+        with self._lock:
+            version = self._snapshot.version + 1 if self._snapshot else 1
+            symbols = [s.to_dict() for s in Symbol.query.all()]
+            sentiments = [s.to_dict() for s in Sentiment.query.all()]
+            self._snapshot = Snapshot(version, symbols, sentiments)
+            self._stale = False
+        return self._snapshot
+
+    def invalidate(self):
+        self._stale = True
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None or self._stale or time.monotonic() - snapshot.loaded_at > self.ttl:
+            snapshot = self.refresh()
+        return snapshot
+
+    def _lookup(self, table, key):
+        value = getattr(self.snapshot(), table).get(key)
+        if value is None and time.monotonic() - self._snapshot.loaded_at > self.miss_refresh:
+            value = getattr(self.refresh(), table).get(key)
+        return value
+
+    def symbol(self, symbol_id):
+        """Symbol dict (same shape as SymbolSerializer) for an id, or None"""
+        return self._lookup('symbols_by_id', symbol_id)
+
+    def symbol_by_code(self, code):
+        return self._lookup('symbols_by_code', code)
+
+    def symbol_id(self, code):
+        symbol = self.symbol_by_code(code)
+        return symbol['id'] if symbol else None
+
+    def symbol_code(self, symbol_id):
+        symbol = self.symbol(symbol_id)
+        return symbol['code'] if symbol else None
+
+    def sentiment_id(self, code):
+        sentiment = self._lookup('sentiments_by_code', code)
+        return sentiment['id'] if sentiment else None
+
+    def sentiment_code(self, sentiment_id):
+        sentiment = self._lookup('sentiments_by_id', sentiment_id)
+        return sentiment['code'] if sentiment else None
+
+    def stats(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {'version': None}
+        return {
+            'version': snapshot.version,
+            'symbols': len(snapshot.symbols_by_id),
+            'sentiments': len(snapshot.sentiments_by_id),
+            'age_seconds': round(time.monotonic() - snapshot.loaded_at, 1),
+        }
+
+
+reference_data = ReferenceData()
+
+
+def _on_change(mapper, connection, target):
+    reference_data.invalidate()
+
+
+for _model in (Symbol, Sentiment):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _on_change)
@@ -0,0 +1,117 @@
+from sqlalchemy import bindparam, func, select, update
+
+from app import db
+from app.cache import cache, tags
+from app.models.models import Posts, User
+from app.services.post_archive import post_archive
+
+# Both components start from a neutral prior worth PRIOR_POSTS posts, so a user's first
+# posts and likes move the score gradually instead of swinging it to either end
+PRIOR_POSTS = 5
+PRIOR_QUALITY = 50.0
+# Likes per post an average author gets, the point where engagement scores 50
+LIKES_PER_POST = 5.0
+QUALITY_WEIGHT = 0.7
+ENGAGEMENT_WEIGHT = 0.3
+
+
+def reputation(quality_avg, post_count, likes_received):
+    """0-100 reputation from a user's running aggregates.
+
+    Works on plain numbers and on SQL expressions alike, so the same formula is used
+    inside the incremental UPDATEs and by the batch recompute.
+    """
+    quality = (quality_avg * post_count + PRIOR_QUALITY * PRIOR_POSTS) / (post_count + PRIOR_POSTS)
+    prior_likes = LIKES_PER_POST * PRIOR_POSTS
+    engagement = 100.0 * (likes_received + prior_likes) \
+        / (likes_received + prior_likes + LIKES_PER_POST * (post_count + PRIOR_POSTS))
+    return QUALITY_WEIGHT * quality + ENGAGEMENT_WEIGHT * engagement
+
+
+class ReputationService:
+    @staticmethod
+    def score_values(posts=None, score_sum=None, likes=None):
+        """SET clause for an UPDATE on cust that folds deltas into the running scores in O(1).
+
+        posts and likes are count deltas, score_sum the change in the sum of the user's
+        post sentiment scores. Deltas may be numbers, bind parameters or CASE expressions;
+        every right-hand side refers to the pre-update row.
+        """
+        count = func.coalesce(User.post_count, 0)
+        avg = func.coalesce(User.post_quality_avg, 0.0)
+        received = func.coalesce(User.likes_received, 0)
+        values = {}
+
+        if posts is not None:
+            count = values['post_count'] = count + posts
+        if posts is not None or score_sum is not None:
+            total = avg * func.coalesce(User.post_count, 0) + (0 if score_sum is None else score_sum)
+            avg = values['post_quality_avg'] = func.coalesce(total / func.nullif(count, 0), 0.0)
+        if likes is not None:
+            received = values['likes_received'] = received + likes
+
+        values['reputation_score'] = reputation(avg, count, received)
+        return values
+
+    @staticmethod
+    def _recompute(first_id, last_id, archived=None):
+        """Rebuild the aggregates of users first_id..last_id from their posts.
+
+        Two UPDATEs over the posts in the database, then one executemany folding in
+        `archived`, the user_totals() of the users in range.
+        """
+        in_range = User.id.between(first_id, last_id)
+        own_posts = Posts.user_id == User.id
+        archived_until = post_archive.archived_until('posts')
+        if archived_until is not None:
+            own_posts = own_posts & (Posts.created_at >= archived_until)
+        db.session.execute(
+            update(User).where(in_range).values(
+                post_count=select(func.count(Posts.id)).where(own_posts).scalar_subquery(),
+                post_quality_avg=select(func.coalesce(func.avg(Posts.sentiment_score), 0.0))
+                .where(own_posts).scalar_subquery(),
+                likes_received=select(func.coalesce(func.sum(Posts.likes_count), 0))
+                .where(own_posts).scalar_subquery()))
+        db.session.execute(
+            update(User).where(in_range).values(
+                reputation_score=reputation(User.post_quality_avg, User.post_count, User.likes_received)))
+        if archived:
+            table = User.__table__
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('archived_user')).values(
+                    ReputationService.score_values(posts=bindparam('archived_posts'),
+                                                   score_sum=bindparam('archived_score'),
+                                                   likes=bindparam('archived_likes'))),
+                [{'archived_user': user_id, 'archived_posts': posts, 'archived_score': score_sum,
+                  'archived_likes': likes} for user_id, (posts, score_sum, likes) in archived.items()])
+
+    @staticmethod
+    def recompute_user(user_id):
+        username = db.session.scalar(select(User.username).where(User.id == user_id))
+        if username is None:
+            raise ValueError('User not found')
+        ReputationService._recompute(user_id, user_id, post_archive.user_totals(user_id))
+        db.session.commit()
+        cache.invalidate(tags.user(username), tags.FEED)
+        return db.session.get(User, user_id, populate_existing=True)
+
+    @staticmethod
+    def recompute_all(chunk_size=1000):
+        """Recompute every user's scores, chunk_size users per transaction in id order"""
+        archived = post_archive.user_totals()
+        last_id = 0
+        users = 0
+        while True:
+            chunk = db.session.execute(
+                select(User.id, User.username).where(User.id > last_id)
+                .order_by(User.id).limit(chunk_size)).all()
+            if not chunk:
+                break
+            ReputationService._recompute(chunk[0].id, chunk[-1].id, {
+                row.id: archived[row.id] for row in chunk if row.id in archived})
+            db.session.commit()
+            cache.invalidate(*[tags.user(row.username) for row in chunk])
+            users += len(chunk)
+            last_id = chunk[-1].id
+        cache.invalidate(tags.FEED)
+        return users
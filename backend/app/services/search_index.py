@@ -0,0 +1,123 @@
+import math
+import re
+import threading
+from collections import Counter
+
+from sqlalchemy import select
+
+from app import db
+from app.models.models import Posts
+
+TOKEN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i in is it its of on or so that the
+this to was were will with
+""".split())
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall((text or '').lower()) if t not in STOPWORDS]
+
+
+class InvertedIndex:
+    """In-process full-text index over post content, ranked with BM25.
+
+    Used when the database has no native full-text search (SQLite, tests). It is built
+    lazily on the first search, takes new posts from create_post immediately and, before
+    each search, catches up on rows other processes inserted past its id watermark.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._postings = {}   # term -> {post_id: term frequency}
+        self._docs = {}       # post_id -> (length, symbol_id, sentiment, created_at)
+        self._total_length = 0
+        self._watermark = 0
+        self._built = False
+        self._lock = threading.RLock()
+
+    def _add(self, post_id, content, symbol_id, sentiment, created_at):
+        if post_id in self._docs:
+            return
+        terms = Counter(tokenize(content))
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[post_id] = tf
+        length = sum(terms.values())
+        self._docs[post_id] = (length, symbol_id, sentiment, created_at)
+        self._total_length += length
+
+    def add_post(self, post):
+        """Index a just-created post, a no-op until the index has been built"""
+        with self._lock:
+            if self._built:
+                self._add(post.id, post.content, post.symbol_id, post.sentiment, post.created_at)
+
+    def catch_up(self, batch_size=5000):
+        """Index every post with an id above the watermark, in id order"""
+        with self._lock:
+            while True:
+                rows = db.session.execute(
+                    select(Posts.id, Posts.content, Posts.symbol_id, Posts.sentiment, Posts.created_at)
+                    .where(Posts.id > self._watermark).order_by(Posts.id).limit(batch_size)).all()
+                for row in rows:
+                    self._add(*row)
+                if rows:
+                    self._watermark = rows[-1].id
+                if len(rows) < batch_size:
+                    break
+            self._built = True
+
+    def clear(self):
+        with self._lock:
+            self.__init__()
+
+    def _matches(self, post_id, symbol_id, sentiment, since, until):
+        _, doc_symbol, doc_sentiment, created_at = self._docs[post_id]
+        if symbol_id is not None and doc_symbol != symbol_id:
+            return False
+        if sentiment is not None and doc_sentiment != sentiment:
+            return False
+        if since is not None and (created_at is None or created_at < since):
+            return False
+        if until is not None and (created_at is None or created_at >= until):
+            return False
+        return True
+
+    def search(self, query, symbol_id=None, sentiment=None, since=None, until=None):
+        """Ranked (post_id, score) pairs for posts containing every query term"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            self.catch_up()
+            postings = [self._postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+
+            doc_count = len(self._docs)
+            avg_length = self._total_length / doc_count
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+
+            scores = []
+            for post_id in candidates:
+                if not self._matches(post_id, symbol_id, sentiment, since, until):
+                    continue
+                length = self._docs[post_id][0]
+                score = 0.0
+                for posting in postings:
+                    df = len(posting)
+                    tf = posting[post_id]
+                    idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                    score += idf * tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * length / avg_length))
+                scores.append((post_id, score))
+
+        scores.sort(key=lambda item: (-item[1], -item[0]))
+        return scores
+
+
+search_index = InvertedIndex()
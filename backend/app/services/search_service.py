@@ -0,0 +1,95 @@
+import re
+
+from flask import current_app
+from sqlalchemy import event, func, literal_column, select, text
+
+from app import db
+from app.models.fast_serializers import POST_DETAIL_COLUMNS, dump_post_detail_row
+from app.models.models import Posts
+from app.services.pagination import encode_offset
+from app.services.reference_data import reference_data
+from app.services.search_index import search_index
+
+
+def _language():
+    language = current_app.config['SEARCH_LANGUAGE']
+    if not re.fullmatch(r'[a-z_]+', language):
+        raise ValueError('Invalid SEARCH_LANGUAGE {}'.format(language))
+    return language
+
+
+def _regconfig():
+    # Inlined rather than bound so the planner can match the GIN expression index
+    return literal_column("'{}'::regconfig".format(_language()))
+
+
+def search_vector():
+    return func.to_tsvector(_regconfig(), Posts.content)
+
+
+def create_search_index(connection):
+    """GIN index over the same to_tsvector expression search queries use (Postgres only)"""
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_posts_content_fts ON posts "
+        "USING gin (to_tsvector('{}'::regconfig, content))".format(_language())))
+
+
+@event.listens_for(Posts.__table__, 'after_create')
+def _create_search_index_with_table(table, connection, **kw):
+    if connection.dialect.name == 'postgresql':
+        create_search_index(connection)
+
+
+class SearchService:
+    @staticmethod
+    def search(query, limit, offset=0, symbol_code=None, sentiment=None, since=None, until=None):
+        """Ranked page of posts matching every term of query, in the global feed shape plus 'rank'"""
+        if not query or not query.strip():
+            raise ValueError('q required')
+
+        symbol_id = None
+        if symbol_code:
+            symbol_id = reference_data.symbol_id(symbol_code)
+            if symbol_id is None:
+                return [], None
+
+        if db.session.get_bind().dialect.name == 'postgresql':
+            ranked = SearchService._search_postgres(query, limit, offset, symbol_id, sentiment, since, until)
+        else:
+            ranked = SearchService._search_index(query, limit, offset, symbol_id, sentiment, since, until)
+
+        next_cursor = encode_offset(offset + limit) if len(ranked) > limit else None
+        posts = []
+        for row, rank in ranked[:limit]:
+            post = dump_post_detail_row(row, reference_data.symbol)
+            post['rank'] = round(rank, 6)
+            posts.append(post)
+        return posts, next_cursor
+
+    @staticmethod
+    def _search_postgres(query, limit, offset, symbol_id, sentiment, since, until):
+        ts_query = func.websearch_to_tsquery(_regconfig(), query)
+        rank = func.ts_rank(search_vector(), ts_query).label('rank')
+        stmt = select(*POST_DETAIL_COLUMNS, rank).join(Posts.user) \
+            .where(search_vector().op('@@')(ts_query))
+        if symbol_id is not None:
+            stmt = stmt.where(Posts.symbol_id == symbol_id)
+        if sentiment:
+            stmt = stmt.where(Posts.sentiment == sentiment)
+        if since:
+            stmt = stmt.where(Posts.created_at >= since)
+        if until:
+            stmt = stmt.where(Posts.created_at < until)
+        stmt = stmt.order_by(rank.desc(), Posts.id.desc()).offset(offset).limit(limit + 1)
+        return [(tuple(row[:-1]), row[-1]) for row in db.session.execute(stmt)]
+
+    @staticmethod
+    def _search_index(query, limit, offset, symbol_id, sentiment, since, until):
+        ranked = search_index.search(query, symbol_id, sentiment or None, since, until)[offset:offset + limit + 1]
+        if not ranked:
+            return []
+        rows = db.session.execute(
+            select(*POST_DETAIL_COLUMNS).join(Posts.user)
+            .where(Posts.id.in_([post_id for post_id, _ in ranked]))).all()
+        by_id = {row.id: tuple(row) for row in rows}
+        return [(by_id[post_id], score) for post_id, score in ranked if post_id in by_id]
@@ -0,0 +1,84 @@
+"""Local sentiment scorers for the background processing pipeline.
+
+A scorer is any class with score_batch(texts) -> [(sentiment, score)], where sentiment is
+'Bullish', 'Bearish' or 'Neutral' and score a 0-100 confidence, the same contract the
+client-side analyzer follows. Scorers run inside worker processes, so this module
+keeps its own imports to the standard library and NumPy.
+"""
+import importlib
+import re
+
+try:
+    import numpy as np
+except ImportError:  # optional, scoring falls back to a per-text loop
+    np = None
+
+TOKEN = re.compile(r'[a-z]+')
+
+BULLISH = (
+    'buy', 'buying', 'bought', 'long', 'calls', 'bull', 'bullish', 'moon', 'rocket', 'rally',
+    'rallying', 'breakout', 'beat', 'beats', 'upgrade', 'upgraded', 'up', 'gain', 'gains',
+    'green', 'growth', 'strong', 'surge', 'soar', 'soaring', 'higher', 'undervalued', 'outperform',
+)
+BEARISH = (
+    'sell', 'selling', 'sold', 'short', 'puts', 'bear', 'bearish', 'crash', 'dump', 'dumping',
+    'drop', 'dropping', 'miss', 'missed', 'downgrade', 'downgraded', 'down', 'loss', 'losses',
+    'red', 'weak', 'plunge', 'tank', 'tanking', 'lower', 'overvalued', 'underperform', 'bankrupt',
+)
+
+
+class LexiconScorer:
+    """Counts bullish and bearish lexicon hits, vectorized over the batch with NumPy.
+
+    Polarity is (bullish - bearish) / (hits + 1); the label follows its sign and the
+    score is its magnitude scaled to 0-100. Texts without directional words are
+    Neutral with score 0.
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+        weights = []
+        for words, weight in ((BULLISH, 1.0), (BEARISH, -1.0)):
+            for word in words:
+                self.vocabulary[word] = len(weights)
+                weights.append(weight)
+        self.weights = np.array(weights) if np is not None else weights
+
+    def _label(self, net, hits):
+        polarity = net / (hits + 1.0)
+        if net > 0:
+            return 'Bullish', int(round(100 * polarity))
+        if net < 0:
+            return 'Bearish', int(round(-100 * polarity))
+        return 'Neutral', 0
+
+    def score_batch(self, texts):
+        term_ids = [[self.vocabulary[t] for t in TOKEN.findall((text or '').lower()) if t in self.vocabulary]
+                    for text in texts]
+        if np is None:
+            return [self._label(sum(self.weights[i] for i in ids), len(ids)) for ids in term_ids]
+
+        # Document-term count matrix for the whole batch, then one matrix-vector product
+        counts = np.zeros((len(texts), len(self.weights)))
+        rows = np.repeat(np.arange(len(texts)), [len(ids) for ids in term_ids])
+        cols = np.fromiter((i for ids in term_ids for i in ids), dtype=np.int64, count=len(rows))
+        np.add.at(counts, (rows, cols), 1.0)
+        net = counts @ self.weights
+        hits = counts.sum(axis=1)
+        return [self._label(float(n), float(h)) for n, h in zip(net, hits)]
+
+
+_scorers = {}
+
+
+def load_scorer(path):
+    """Instantiate a scorer from a 'package.module.ClassName' path, once per process"""
+    if path not in _scorers:
+        module, _, name = path.rpartition('.')
+        _scorers[path] = getattr(importlib.import_module(module), name)()
+    return _scorers[path]
+
+
+def score_texts(path, texts):
+    """Process pool entry point"""
+    return load_scorer(path).score_batch(texts)
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models.models import Posts, SentimentRollup
+from app.services.post_archive import post_archive
+from app.services.reference_data import reference_data
+
+BUCKET = timedelta(hours=1)
+
+# Supported windows, in whole buckets
+WINDOWS = {
+    '1h': 1,
+    '24h': 24,
+    '7d': 24 * 7,
+}
+
+COUNTERS = ('post_count', 'bullish_count', 'bearish_count', 'neutral_count',
+            'sentiment_score_sum', 'likes_count')
+
+
+def bucket_for(moment):
+    """Truncate a timestamp to the start of its rollup bucket"""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def sentiment_counter(sentiment):
+    if sentiment == 'Bullish':
+        return 'bullish_count'
+    if sentiment == 'Bearish':
+        return 'bearish_count'
+    return 'neutral_count'
+
+
+class SentimentService:
+    @staticmethod
+    def increment(symbol_id, bucket_start, **deltas):
+        """Add deltas to a bucket in one upsert, inside the caller's transaction"""
+        table = SentimentRollup.__table__
+        values = {name: deltas.get(name, 0) for name in COUNTERS}
+        dialect = db.session.get_bind().dialect.name
+
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = insert(table).values(symbol_id=symbol_id, bucket_start=bucket_start, **values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['symbol_id', 'bucket_start'],
+                set_={name: table.c[name] + stmt.excluded[name] for name in deltas})
+            db.session.execute(stmt)
+            return
+
+        updated = db.session.execute(
+            table.update()
+            .where(table.c.symbol_id == symbol_id, table.c.bucket_start == bucket_start)
+            .values({name: table.c[name] + delta for name, delta in deltas.items()}))
+        if updated.rowcount == 0:
+            db.session.execute(table.insert().values(symbol_id=symbol_id, bucket_start=bucket_start, **values))
+
+    @staticmethod
+    def record_post(post):
+        SentimentService.increment(post.symbol_id, bucket_for(post.created_at), **{
+            'post_count': 1,
+            sentiment_counter(post.sentiment): 1,
+            'sentiment_score_sum': post.sentiment_score or 0,
+        })
+
+    @staticmethod
+    def record_posts(rows):
+        """Fold many new post rows (dicts) into one upsert per touched bucket"""
+        buckets = {}
+        for row in rows:
+            deltas = buckets.setdefault((row['symbol_id'], bucket_for(row['created_at'])),
+                                        dict.fromkeys(COUNTERS[:-1], 0))
+            deltas['post_count'] += 1
+            deltas[sentiment_counter(row.get('sentiment'))] += 1
+            deltas['sentiment_score_sum'] += row.get('sentiment_score') or 0
+        for (symbol_id, bucket_start), deltas in buckets.items():
+            SentimentService.increment(symbol_id, bucket_start, **deltas)
+
+    @staticmethod
+    def record_like(post, count=1):
+        # Likes are attributed to the bucket the post was created in
+        SentimentService.increment(post.symbol_id, bucket_for(post.created_at), likes_count=count)
+
+    @staticmethod
+    def get_sentiment(symbol_code, window='24h'):
+        if window not in WINDOWS:
+            raise ValueError('window must be one of: {}'.format(', '.join(WINDOWS)))
+
+        symbol = reference_data.symbol_by_code(symbol_code)
+        if symbol is None:
+            raise ValueError('Unknown symbol {}'.format(symbol_code))
+
+        # Windows are aligned to buckets: '1h' is the current hour, '24h' it and the 23 before
+        since = bucket_for(datetime.now()) - BUCKET * WINDOWS[window]
+        buckets = SentimentRollup.query \
+            .filter(SentimentRollup.symbol_id == symbol['id'], SentimentRollup.bucket_start > since) \
+            .order_by(SentimentRollup.bucket_start).all()
+
+        totals = {name: sum(getattr(b, name) for b in buckets) for name in COUNTERS}
+        total = totals['post_count']
+        return {
+            'symbol': symbol['code'],
+            'window': window,
+            'summary': {
+                'total': total,
+                'bullish': totals['bullish_count'],
+                'bearish': totals['bearish_count'],
+                'neutral': totals['neutral_count'],
+                'likes_count': totals['likes_count'],
+                'avg_sentiment_score': totals['sentiment_score_sum'] / total if total else None,
+            },
+            'series': [b.to_dict() for b in buckets],
+        }
+
+    @staticmethod
+    def _bucket_expression(dialect):
+        if dialect == 'postgresql':
+            return func.date_trunc('hour', Posts.created_at)
+        return func.strftime('%Y-%m-%d %H:00:00', Posts.created_at)
+
+    @staticmethod
+    def backfill():
+        """Rebuild every rollup bucket from the posts table and the archive, returns the number of buckets"""
+        bucket = SentimentService._bucket_expression(db.session.get_bind().dialect.name).label('bucket')
+        # Archived months are read from the archive only, see app.services.post_archive
+        archived_until = post_archive.archived_until('posts')
+        hot = Posts.created_at >= archived_until if archived_until else Posts.created_at.isnot(None)
+        rows = db.session.query(
+            Posts.symbol_id,
+            bucket,
+            func.count(Posts.id),
+            func.sum(case((Posts.sentiment == 'Bullish', 1), else_=0)),
+            func.sum(case((Posts.sentiment == 'Bearish', 1), else_=0)),
+            func.sum(case((Posts.sentiment.in_(['Bullish', 'Bearish']), 0), else_=1)),
+            func.coalesce(func.sum(Posts.sentiment_score), 0),
+            func.coalesce(func.sum(Posts.likes_count), 0),
+        ).filter(hot).group_by(Posts.symbol_id, bucket).all()
+
+        buckets = []
+        for symbol_id, bucket_start, *counters in rows:
+            if isinstance(bucket_start, str):
+                bucket_start = datetime.fromisoformat(bucket_start)
+            values = dict(zip(COUNTERS, (int(v or 0) for v in counters)))
+            buckets.append(dict(values, symbol_id=symbol_id, bucket_start=bucket_start))
+        buckets.extend(dict(values, symbol_id=symbol_id, bucket_start=bucket_start)
+                       for (symbol_id, bucket_start), values in post_archive.sentiment_buckets().items())
+
+        db.session.query(SentimentRollup).delete()
+        if buckets:
+            db.session.execute(SentimentRollup.__table__.insert(), buckets)
+        db.session.commit()
+        return len(buckets)
@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import bindparam, case, select
+
+from app import db
+from app.cache import cache, tags
+from app.models.models import Posts, User
+from app.services.reference_data import reference_data
+from app.services.reputation_service import ReputationService
+from app.services.sentiment_scoring import score_texts
+from app.services.sentiment_service import SentimentService, bucket_for, sentiment_counter
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerMetrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.posts = 0
+        self.batches = 0
+        self.failures = 0
+        self.claim_seconds = 0.0
+        self.score_seconds = 0.0
+        self.write_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, posts, claim, score, write):
+        with self._lock:
+            self.posts += posts
+            self.batches += 1
+            self.claim_seconds += claim
+            self.score_seconds += score
+            self.write_seconds += write
+
+    def to_dict(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'posts': self.posts,
+            'batches': self.batches,
+            'failures': self.failures,
+            'elapsed_seconds': round(elapsed, 3),
+            'posts_per_second': round(self.posts / elapsed, 1) if elapsed else None,
+            'claim_seconds': round(self.claim_seconds, 3),
+            'score_seconds': round(self.score_seconds, 3),
+            'write_seconds': round(self.write_seconds, 3),
+        }
+
+
+class SentimentWorker:
+    """Scores unprocessed posts in batches off the request path.
+
+    Each of `concurrency` coordinator threads claims a batch, has it scored on a shared
+    process pool and writes the results back in bulk. On Postgres batches are claimed
+    with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers (threads or separate
+    processes) split the backlog without overlap. SQLite has no row locks: claims are
+    partitioned between threads in process, and writes are guarded by processed = false
+    so a row scored twice by two processes is only applied once, rollups and author
+    scores included.
+    """
+
+    def __init__(self, app, batch_size=None, concurrency=None, scorer=None):
+        self.app = app
+        self.batch_size = batch_size or app.config['SENTIMENT_BATCH_SIZE']
+        self.concurrency = app.config['SENTIMENT_CONCURRENCY'] if concurrency is None else concurrency
+        self.scorer = scorer or app.config['SENTIMENT_SCORER']
+        self.metrics = WorkerMetrics()
+        self._in_flight = set()
+        self._claim_lock = threading.Lock()
+        self._pool = None
+
+    def _claim(self):
+        query = select(Posts.id, Posts.content, Posts.user_id, Posts.symbol_id, Posts.created_at,
+                       Posts.sentiment, Posts.sentiment_score, User.username) \
+            .join(User, User.id == Posts.user_id) \
+            .where(Posts.processed == False).order_by(Posts.id).limit(self.batch_size)  # noqa: E712
+
+        if db.session.get_bind().dialect.name == 'postgresql':
+            # Rows stay locked until this batch's transaction commits
+            return db.session.execute(query.with_for_update(skip_locked=True, of=Posts)).all()
+
+        with self._claim_lock:
+            if self._in_flight:
+                query = query.where(Posts.id.notin_(self._in_flight))
+            rows = db.session.execute(query).all()
+            self._in_flight.update(row.id for row in rows)
+        return rows
+
+    def _score(self, texts):
+        if self._pool is None:
+            return score_texts(self.scorer, texts)
+        return self._pool.submit(score_texts, self.scorer, texts).result()
+
+    def _write(self, rows, results):
+        """Write back the scores of rows still unprocessed and move the rollups and author
+        scores by the change. Returns the posts written, fewer than claimed when another
+        process (SQLite) wrote some of them first.
+        """
+        posts = Posts.__table__
+        scored = {row.id: result for row, result in zip(rows, results)}
+        written = set(db.session.scalars(
+            posts.update()
+            .where(posts.c.id.in_(list(scored)), posts.c.processed == False)  # noqa: E712
+            .values(sentiment=case({post_id: sentiment for post_id, (sentiment, _) in scored.items()}, value=posts.c.id),
+                    sentiment_score=case({post_id: score for post_id, (_, score) in scored.items()}, value=posts.c.id),
+                    processed=True)
+            .returning(posts.c.id)))
+        rows = [row for row in rows if row.id in written]
+
+        # Move each post's rollup contribution from its client-supplied sentiment to the scored one
+        rollups = defaultdict(lambda: defaultdict(int))
+        for row in rows:
+            sentiment, score = scored[row.id]
+            deltas = rollups[(row.symbol_id, bucket_for(row.created_at))]
+            deltas[sentiment_counter(row.sentiment)] -= 1
+            deltas[sentiment_counter(sentiment)] += 1
+            deltas['sentiment_score_sum'] += score - (row.sentiment_score or 0)
+        for (symbol_id, bucket_start), deltas in rollups.items():
+            deltas = {name: delta for name, delta in deltas.items() if delta}
+            if deltas:
+                SentimentService.increment(symbol_id, bucket_start, **deltas)
+
+        # Fold the score changes into each author's running quality average and reputation
+        score_deltas = defaultdict(int)
+        for row in rows:
+            score_deltas[row.user_id] += scored[row.id][1] - (row.sentiment_score or 0)
+        changed = [{'author_id': user_id, 'score_delta': delta} for user_id, delta in score_deltas.items() if delta]
+        if changed:
+            db.session.execute(
+                User.__table__.update().where(User.id == bindparam('author_id'))
+                .values(**ReputationService.score_values(score_sum=bindparam('score_delta'))),
+                changed)
+        return len(rows)
+
+    def process_batch(self):
+        """Claim, score and write back one batch, returns the number of posts processed"""
+        start = time.monotonic()
+        rows = self._claim()
+        if not rows:
+            db.session.rollback()
+            return 0
+        claimed = time.monotonic()
+
+        try:
+            results = self._score([row.content for row in rows])
+            scored = time.monotonic()
+            self._write(rows, results)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self.metrics.failures += 1
+            raise
+        finally:
+            with self._claim_lock:
+                self._in_flight.difference_update(row.id for row in rows)
+
+        cache.invalidate(tags.FEED,
+                         *{tags.user_posts(row.user_id) for row in rows},
+                         *{tags.user(row.username) for row in rows},
+                         *{tags.symbol_posts(reference_data.symbol_code(row.symbol_id)) for row in rows})
+        self.metrics.record(len(rows), claimed - start, scored - claimed, time.monotonic() - scored)
+        return len(rows)
+
+    def _coordinate(self, stop, drain):
+        with self.app.app_context():
+            while not stop.is_set():
+                try:
+                    processed = self.process_batch()
+                except Exception:
+                    logger.exception('Sentiment batch failed')
+                    processed = 0
+                if not processed:
+                    if drain:
+                        return
+                    stop.wait(self.app.config['SENTIMENT_IDLE_SECONDS'])
+
+    def run(self, drain=False, stop=None):
+        """Process until stopped, or until the backlog is empty when drain=True"""
+        stop = stop or threading.Event()
+        threads = max(self.concurrency, 1)
+        if self.concurrency > 0:
+            self._pool = ProcessPoolExecutor(max_workers=self.concurrency)
+        try:
+            coordinators = [threading.Thread(target=self._coordinate, args=(stop, drain),
+                                             name='sentiment-worker-{}'.format(i), daemon=True)
+                            for i in range(threads)]
+            for thread in coordinators:
+                thread.start()
+            for thread in coordinators:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        return self.metrics.to_dict()
@@ -2,6 +2,7 @@ from datetime import datetime
 
 from app.models.models import User
 from app import db
+from app.utils.replicas import read_replica
 
 
 
@@ -13,13 +14,17 @@ class UserService:
         db.session.add(user)
         db.session.commit()
         return user
+
+    @staticmethod
+    @read_replica
     def getUser( username):
         user = User.query.filter_by(username=username).first_or_404()
         return user
 
-    def update_score(userId, data):
-        user = User.query.filter_by(id = userId).first_or_404()
-        user.post_quality_avg = data['postQualityAvg']
-        user.reputation_score = data['reputationScore']
-        db.session.commit()
-        return user
\ No newline at end of file
+    @staticmethod
+    def get_score(userId):
+        # Maintained incrementally as posts and likes come in, `flask recompute-reputation` rebuilds them
+        user = db.session.get(User, userId)
+        if user is None:
+            raise ValueError('User not found')
+        return user
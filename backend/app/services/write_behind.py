@@ -0,0 +1,444 @@
+"""Write-behind queue for new posts and comments.
+
+Enabled with WRITE_BEHIND_ENABLED. A validated write is appended to this process's
+write-ahead log under WRITE_BEHIND_WAL_DIR (fsynced unless WRITE_BEHIND_FSYNC is off),
+queued, and answered 202 with a provisional id ('tmp-...'). A flusher thread commits
+the queue every WRITE_BEHIND_FLUSH_INTERVAL seconds, WRITE_BEHIND_FLUSH_SIZE writes per
+transaction, with the multi-row inserts of the bulk import path; the log is truncated
+once everything in it is committed.
+
+Each transaction also records the provisional keys it committed (write_behind_key), so
+a log left behind by a process that died is replayed exactly once, by the next process
+to start. A write the database rejects at flush time (its user was deleted...) is
+recorded as rejected instead of blocking the queue.
+
+When WRITE_BEHIND_QUEUE_SIZE writes are waiting, new ones wait up to
+WRITE_BEHIND_ENQUEUE_TIMEOUT seconds for room and then fail with WriteQueueFull (503).
+Queued writes are merged into their author's reads until committed; like the other
+in-process buffers this only holds for reads served by the same worker.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models.models import WriteBehindKey
+
+try:
+    import fcntl
+except ImportError:  # Windows: logs are not locked, run a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'tmp-'
+WAL_PATTERN = 'wal-*.log'
+# Provisional key -> id of recently committed writes kept in memory
+RESOLVED_KEEP = 10000
+
+
+class WriteQueueFull(Exception):
+    """The queue stayed full for WRITE_BEHIND_ENQUEUE_TIMEOUT seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueuedWrite:
+    """A post or comment waiting for the flusher.
+
+    data holds the row to insert; a comment on a queued post or reply to a queued
+    comment has post_key/parent_key instead of post_id/parent_id. scope is the symbol
+    id of a post, the post id or key of a comment. view (and detail, for posts) is the
+    write as the API returns it, with the provisional key as its id.
+    """
+
+    __slots__ = ('key', 'kind', 'data', 'user_id', 'scope', 'view', 'detail')
+
+    def __init__(self, key, kind, data, user_id=None, scope=None, view=None, detail=None):
+        self.key = key
+        self.kind = kind
+        self.data = data
+        self.user_id = user_id
+        self.scope = scope
+        self.view = view
+        self.detail = detail
+
+    def log_line(self):
+        record = {'key': self.key, 'kind': self.kind, 'user_id': self.user_id, 'scope': self.scope,
+                  'data': dict(self.data, created_at=self.data['created_at'].isoformat())}
+        return json.dumps(record, separators=(',', ':')) + '\n'
+
+    @classmethod
+    def from_log_line(cls, line):
+        record = json.loads(line)
+        data = record['data']
+        data['created_at'] = datetime.fromisoformat(data['created_at'])
+        return cls(record['key'], record['kind'], data, record['user_id'], record['scope'])
+
+
+class WriteBehindQueue:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.max_size = 10000
+        self.flush_interval = 0.2
+        self.flush_size = 500
+        self.enqueue_timeout = 1.0
+        self.wal_dir = 'wal'
+        self.fsync = True
+        self.key_retention = timedelta(hours=168)
+        self.stats_counts = Counter()
+        self._queue = deque()
+        self._queued = {}
+        self._resolved = OrderedDict()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._wal = None
+        self._wal_pid = None
+        self._next_prune = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('WRITE_BEHIND_ENABLED', False)
+        self.max_size = app.config.get('WRITE_BEHIND_QUEUE_SIZE', self.max_size)
+        self.flush_interval = app.config.get('WRITE_BEHIND_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_size = app.config.get('WRITE_BEHIND_FLUSH_SIZE', self.flush_size)
+        self.enqueue_timeout = app.config.get('WRITE_BEHIND_ENQUEUE_TIMEOUT', self.enqueue_timeout)
+        self.wal_dir = app.config.get('WRITE_BEHIND_WAL_DIR', self.wal_dir)
+        self.fsync = app.config.get('WRITE_BEHIND_FSYNC', self.fsync)
+        self.key_retention = timedelta(hours=app.config.get('WRITE_BEHIND_KEY_RETENTION_HOURS', 168))
+        if self.enabled:
+            atexit.register(self.close)
+            # Starts the flusher, which first replays logs left by dead processes
+            self._ensure_flusher()
+
+    @staticmethod
+    def is_key(ref):
+        return isinstance(ref, str) and ref.startswith(KEY_PREFIX)
+
+    def submit(self, kind, data, user_id, scope, view, detail=None):
+        """Log a validated write and queue it; returns the QueuedWrite, its views carry the provisional id"""
+        entry = QueuedWrite(KEY_PREFIX + uuid.uuid4().hex, kind, data, user_id, scope, view, detail)
+        for shown in (view, detail):
+            if shown is not None:
+                shown.update(id=entry.key, pending=True)
+        line = entry.log_line()
+
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._not_full:
+            while len(self._queue) >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats_counts['throttled'] += 1
+                    raise WriteQueueFull('Write queue full, retry later', retry_after=max(1.0, self.flush_interval))
+                self._wake.set()
+                self._not_full.wait(remaining)
+            wal = self._open_wal()
+            wal.write(line)
+            wal.flush()
+            self._queue.append(entry)
+            self._queued[entry.key] = entry
+            self.stats_counts['queued'] += 1
+            backlog = len(self._queue)
+        if self.fsync:
+            # Outside the lock: one fsync makes every write logged before it durable
+            os.fsync(wal.fileno())
+
+        self._ensure_flusher()
+        if backlog >= self.flush_size:
+            self._wake.set()
+        return entry
+
+    def _open_wal(self):
+        """This process's log, opened on first use after a fork; call with the lock held"""
+        if self._wal is None or self._wal_pid != os.getpid():
+            os.makedirs(self.wal_dir, exist_ok=True)
+            name = 'wal-{}-{}.log'.format(os.getpid(), uuid.uuid4().hex[:8])
+            self._wal = open(os.path.join(self.wal_dir, name), 'a', encoding='utf-8')
+            if fcntl is not None:
+                # Held for the life of the process, a log nobody holds belongs to a dead one
+                fcntl.flock(self._wal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self._wal_pid = os.getpid()
+        return self._wal
+
+    def queued(self, key):
+        """The QueuedWrite for a provisional key, None once committed or if unknown"""
+        with self._lock:
+            return self._queued.get(key)
+
+    def resolve(self, ref):
+        """The id a provisional key was committed as (a string), or ref itself"""
+        if not self.is_key(ref):
+            return ref
+        with self._lock:
+            if ref in self._queued:
+                return ref
+            target_id = self._resolved.get(ref)
+        if target_id is None:
+            target_id = db.session.scalar(select(WriteBehindKey.target_id).where(WriteBehindKey.key == ref))
+        return ref if target_id is None else str(target_id)
+
+    def status(self, key):
+        """('pending' | 'committed' | 'rejected', id or None), None for an unknown key"""
+        with self._lock:
+            if key in self._queued:
+                return 'pending', None
+            if key in self._resolved:
+                return 'committed', self._resolved[key]
+        row = db.session.execute(select(WriteBehindKey.target_id).where(WriteBehindKey.key == key)).first()
+        if row is None:
+            return None
+        return ('rejected', None) if row.target_id is None else ('committed', row.target_id)
+
+    def pending(self, kind, user_id, scope=None):
+        """Queued writes of one author, newest first, optionally only those for one symbol or post"""
+        if user_id is None:
+            return []
+        with self._lock:
+            entries = [entry for entry in self._queued.values() if entry.kind == kind and entry.user_id == user_id]
+        if scope is not None:
+            scope = self._canonical(scope)
+            entries = [entry for entry in entries if self._canonical(entry.scope) == scope]
+        return entries[::-1]
+
+    def _canonical(self, ref):
+        return str(self._resolved.get(ref, ref))
+
+    def _ensure_flusher(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='write-behind-flusher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        try:
+            self.recover()
+        except Exception:
+            logger.exception('Failed to replay write-behind logs')
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.monotonic() >= self._next_prune:
+                    self.prune()
+                    self._next_prune = time.monotonic() + 3600
+            except Exception:
+                logger.exception('Failed to flush queued writes')
+
+    def flush(self):
+        """Commit everything queued, WRITE_BEHIND_FLUSH_SIZE writes per transaction.
+
+        Returns the number of writes committed. On a database outage the batch stays
+        queued and the error is raised, the next flush retries it.
+        """
+        committed = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = list(islice(self._queue, self.flush_size))
+                if not batch:
+                    break
+                with self.app.app_context():
+                    committed += len(self._commit(batch))
+                with self._not_full:
+                    for entry in batch:
+                        self._queue.popleft()
+                        del self._queued[entry.key]
+                    self._not_full.notify_all()
+
+            with self._lock:
+                # Everything logged so far is committed
+                if not self._queue and self._wal is not None and self._wal_pid == os.getpid() and self._wal.tell():
+                    self._wal.truncate(0)
+        return committed
+
+    def close(self):
+        """Flush at exit and remove the log if it is empty, else the next process replays it"""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Queued writes left in %s', self.wal_dir)
+            return
+        with self._lock:
+            if not self._queue and self._wal is not None and self._wal_pid == os.getpid():
+                self._wal.close()
+                os.remove(self._wal.name)
+                self._wal = None
+
+    def recover(self):
+        """Replay the logs of processes that died with writes queued.
+
+        Returns the number of logged writes found, those committed before the crash included.
+        """
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.wal_dir, WAL_PATTERN))):
+            with self._lock:
+                if self._wal is not None and os.path.abspath(self._wal.name) == os.path.abspath(path):
+                    continue
+            try:
+                wal = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with wal:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(wal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # owned by a live process
+                    if not os.path.exists(path) or not os.path.samefile(path, wal.fileno()):
+                        continue  # replayed and removed by another process meanwhile
+
+                entries = []
+                for line in wal:
+                    try:
+                        entries.append(QueuedWrite.from_log_line(line))
+                    except ValueError:
+                        break  # torn last line, the process died before acknowledging it
+                for start in range(0, len(entries), self.flush_size):
+                    with self.app.app_context():
+                        replayed += len(self._commit(entries[start:start + self.flush_size]))
+                os.remove(path)
+            if entries:
+                logger.info('Replayed %s queued writes from %s', len(entries), path)
+        self.stats_counts['replayed'] += replayed
+        return replayed
+
+    def prune(self):
+        """Forget the keys of writes committed more than WRITE_BEHIND_KEY_RETENTION_HOURS ago"""
+        with self.app.app_context():
+            result = db.session.execute(
+                delete(WriteBehindKey).where(WriteBehindKey.created_at < datetime.utcnow() - self.key_retention))
+            db.session.commit()
+        return result.rowcount
+
+    def _commit(self, entries):
+        """Commit a batch, one write per transaction if it fails; returns {key: id} of committed writes"""
+        try:
+            ids = self._apply(entries)
+        except OperationalError:
+            db.session.rollback()
+            raise
+        except Exception:
+            db.session.rollback()
+            logger.warning('Batch of %s queued writes failed, committing them one by one', len(entries),
+                           exc_info=True)
+            ids = {}
+            for entry in entries:
+                try:
+                    ids.update(self._apply([entry]))
+                except OperationalError:
+                    db.session.rollback()
+                    raise
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Rejected queued %s %s', entry.kind, entry.key)
+                    self._reject(entry)
+
+        self._after_commit(entries, ids)
+        return ids
+
+    def _lookup(self, keys):
+        """{key: id or None} for provisional keys already committed or rejected"""
+        found = {key: self._resolved[key] for key in keys if key in self._resolved}
+        missing = [key for key in keys if key not in found]
+        if missing:
+            found.update(db.session.execute(
+                select(WriteBehindKey.key, WriteBehindKey.target_id).where(WriteBehindKey.key.in_(missing))).all())
+        return found
+
+    def _apply(self, entries):
+        from app.services.post_service import PostService
+
+        known = self._lookup([entry.key for entry in entries])
+        ids = {key: target_id for key, target_id in known.items() if target_id is not None}
+        todo = [entry for entry in entries if entry.key not in known]
+
+        posts = [entry for entry in todo if entry.kind == 'post']
+        if posts:
+            ids.update(zip([entry.key for entry in posts], PostService._insert_posts([entry.data for entry in posts])))
+
+        comments = [entry for entry in todo if entry.kind == 'comment']
+        if comments:
+            refs = {entry.data.get(name) for entry in comments for name in ('post_key', 'parent_key')} - {None}
+            refs = self._lookup([ref for ref in refs if ref not in ids])
+            refs.update(ids)
+            rows, parents, index = [], {}, {}
+            for entry in comments:
+                data = entry.data
+                row = {name: data[name] for name in ('content', 'post_id', 'user_id', 'parent_id', 'created_at')}
+                if data.get('post_key'):
+                    row['post_id'] = refs.get(data['post_key'])
+                    if row['post_id'] is None:
+                        raise ValueError('Post {} was not written'.format(data['post_key']))
+                if data.get('parent_key') in index:
+                    parents[len(rows)] = index[data['parent_key']]
+                elif data.get('parent_key'):
+                    row['parent_id'] = refs.get(data['parent_key'])
+                    if row['parent_id'] is None:
+                        raise ValueError('Parent comment {} was not written'.format(data['parent_key']))
+                index[entry.key] = len(rows)
+                rows.append(row)
+            ids.update(zip([entry.key for entry in comments], PostService._insert_comments(rows, parents)))
+
+        if todo:
+            now = datetime.utcnow()
+            db.session.execute(insert(WriteBehindKey), [
+                {'key': entry.key, 'kind': entry.kind, 'target_id': ids[entry.key], 'created_at': now}
+                for entry in todo])
+        db.session.commit()
+        self.stats_counts['committed'] += len(todo)
+        self._remember(ids)
+        return ids
+
+    def _reject(self, entry):
+        db.session.execute(insert(WriteBehindKey), [
+            {'key': entry.key, 'kind': entry.kind, 'target_id': None, 'created_at': datetime.utcnow()}])
+        db.session.commit()
+        self.stats_counts['rejected'] += 1
+
+    def _remember(self, ids):
+        with self._lock:
+            for key, target_id in ids.items():
+                self._resolved[key] = target_id
+                self._resolved.move_to_end(key)
+            while len(self._resolved) > RESOLVED_KEEP:
+                self._resolved.popitem(last=False)
+
+    def _after_commit(self, entries, ids):
+        """Cache invalidation, search, ranking and stream events of a committed batch"""
+        from app.services.post_service import PostService
+
+        post_ids = [ids[entry.key] for entry in entries if entry.kind == 'post' and entry.key in ids]
+        comment_ids = [ids[entry.key] for entry in entries if entry.kind == 'comment' and entry.key in ids]
+        if post_ids:
+            PostService._after_posts_created(post_ids)
+        if comment_ids:
+            PostService._after_comments_added(comment_ids)
+
+    def stats(self):
+        with self._lock:
+            queued = len(self._queue)
+        return dict(self.stats_counts, enabled=self.enabled, backlog=queued, capacity=self.max_size)
+
+
+write_behind = WriteBehindQueue()
@@ -0,0 +1,20 @@
+import json
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+
+def dumps(payload):
+    """Encode a payload of plain JSON types to bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Like jsonify, without key sorting or pretty printing and with the faster encoder"""
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
@@ -0,0 +1,300 @@
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, Prometheus-style cumulative buckets plus +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        # Request threads of a gthread worker observe concurrently
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def lines(self, name, labels):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            yield '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative)
+        yield '{}_sum{{{}}} {}'.format(name, labels, total)
+        yield '{}_count{{{}}} {}'.format(name, labels, count)
+
+
+class RequestMetrics:
+    """Per-endpoint latency, SQL and serialization metrics for every request.
+
+    Installed by create_app(). Each request gets a Server-Timing header (total, db,
+    serialization) and is recorded into histograms exposed in Prometheus text format
+    by /metrics. Metrics are per process; scrape each worker.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.latency = {}     # (endpoint, method, status) -> Histogram of seconds
+        self.statements = {}  # endpoint -> Histogram of SQL statements per request
+        self.db_seconds = Counter()
+        self.serialize_seconds = Counter()
+        self.profiles_written = 0
+        self.pool_connects = 0
+        self.pool_checkouts = 0
+        self.profiler = None
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()  # pool events fire on whichever thread opens or checks out
+
+    def init_app(self, app):
+        self.app = app
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+
+        with app.app_context():
+            for engine in db.engines.values():  # the primary and any read replicas
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+                event.listen(engine, 'connect', self._on_connect)
+                event.listen(engine, 'checkout', self._on_checkout)
+
+        if app.config.get('PROFILE_SLOW_REQUESTS'):
+            self.profiler = SamplingProfiler(app.config['PROFILE_INTERVAL_MS'] / 1000.0)
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        if self.profiler is not None:
+            # Requests that raise skip after_request, stop sampling their thread regardless
+            app.teardown_request(lambda exc: self.profiler.stop(threading.get_ident()))
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._pool_lock:
+            self.pool_connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._pool_lock:
+            self.pool_checkouts += 1
+
+    def _pool_lines(self):
+        pool = db.engine.pool
+        with self._pool_lock:
+            connects, checkouts = self.pool_connects, self.pool_checkouts
+        lines = [
+            '# HELP db_pool_connections_opened_total New database connections opened',
+            '# TYPE db_pool_connections_opened_total counter',
+            'db_pool_connections_opened_total {}'.format(connects),
+            '# HELP db_pool_checkouts_total Connections handed out by the pool',
+            '# TYPE db_pool_checkouts_total counter',
+            'db_pool_checkouts_total {}'.format(checkouts),
+        ]
+        # QueuePool only, NullPool (PgBouncer mode) and SQLite's pools keep no such state
+        for name, method, help_text in (('db_pool_size', 'size', 'Configured pool size'),
+                                        ('db_pool_checked_out', 'checkedout', 'Connections in use'),
+                                        ('db_pool_checked_in', 'checkedin', 'Idle pooled connections'),
+                                        ('db_pool_overflow', 'overflow', 'Connections opened beyond pool_size')):
+            if hasattr(pool, method):
+                lines += ['# HELP {} {}'.format(name, help_text), '# TYPE {} gauge'.format(name),
+                          '{} {}'.format(name, getattr(pool, method)())]
+        return lines
+
+    def _start(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_sql = [0, 0.0]
+        g.metrics_serialize = [0, 0.0]  # nesting depth, seconds
+        if self.profiler is not None:
+            self.profiler.start(threading.get_ident())
+
+    def _finish(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        statements, db_seconds = g.pop('metrics_sql')
+        serialize_seconds = g.pop('metrics_serialize')[1]
+        endpoint = request.endpoint or 'unmatched'
+
+        with self._lock:
+            key = (endpoint, request.method, response.status_code)
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.statements.setdefault(endpoint, Histogram(STATEMENT_BUCKETS)).observe(statements)
+            self.db_seconds[endpoint] += db_seconds
+            self.serialize_seconds[endpoint] += serialize_seconds
+
+        if self.app.config.get('SERVER_TIMING_ENABLED', True):
+            response.headers.add('Server-Timing', 'app;dur={:.2f}, db;dur={:.2f};desc="{} queries", ser;dur={:.2f}'.format(
+                elapsed * 1000, db_seconds * 1000, statements, serialize_seconds * 1000))
+
+        if self.profiler is not None:
+            stacks = self.profiler.stop(threading.get_ident())
+            if elapsed * 1000 >= self.app.config['PROFILE_SLOW_MS'] and stacks:
+                self._dump_profile(endpoint, elapsed, stacks)
+        return response
+
+    def _dump_profile(self, endpoint, elapsed, stacks):
+        """Write folded stacks (flamegraph.pl / speedscope input) for one slow request"""
+        directory = self.app.config['PROFILE_DIR']
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, '{}-{}-{}ms.folded'.format(
+                time.strftime('%Y%m%dT%H%M%S'), endpoint, int(elapsed * 1000)))
+            with open(path, 'w') as out:
+                for stack, samples in stacks.most_common():
+                    out.write('{} {}\n'.format(stack, samples))
+            with self._lock:
+                self.profiles_written += 1
+        except OSError:
+            logger.exception('Could not write request profile')
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append('# HELP http_request_duration_seconds Request latency by endpoint')
+            lines.append('# TYPE http_request_duration_seconds histogram')
+            for (endpoint, method, status), histogram in sorted(self.latency.items()):
+                labels = 'endpoint="{}",method="{}",status="{}"'.format(endpoint, method, status)
+                lines.extend(histogram.lines('http_request_duration_seconds', labels))
+
+            lines.append('# HELP http_request_sql_statements SQL statements executed per request')
+            lines.append('# TYPE http_request_sql_statements histogram')
+            for endpoint, histogram in sorted(self.statements.items()):
+                lines.extend(histogram.lines('http_request_sql_statements', 'endpoint="{}"'.format(endpoint)))
+
+            lines.append('# HELP http_request_db_seconds_total Time spent executing SQL')
+            lines.append('# TYPE http_request_db_seconds_total counter')
+            for endpoint, seconds in sorted(self.db_seconds.items()):
+                lines.append('http_request_db_seconds_total{{endpoint="{}"}} {}'.format(endpoint, seconds))
+
+            lines.append('# HELP http_request_serialize_seconds_total Time spent in marshmallow dumps')
+            lines.append('# TYPE http_request_serialize_seconds_total counter')
+            for endpoint, seconds in sorted(self.serialize_seconds.items()):
+                lines.append('http_request_serialize_seconds_total{{endpoint="{}"}} {}'.format(endpoint, seconds))
+
+            lines.append('# HELP request_profiles_written_total Slow request profiles dumped')
+            lines.append('# TYPE request_profiles_written_total counter')
+            lines.append('request_profiles_written_total {}'.format(self.profiles_written))
+        lines.extend(self._pool_lines())
+        lines.extend(_replica_lines())
+        return '\n'.join(lines) + '\n'
+
+
+def _replica_lines():
+    from app.utils.replicas import replica_router
+
+    if not replica_router.enabled:
+        return []
+    stats = replica_router.stats()
+    lines = ['# HELP db_replica_healthy Replica serving reads (reachable and within REPLICA_MAX_LAG_SECONDS)',
+             '# TYPE db_replica_healthy gauge']
+    lines += ['db_replica_healthy{{replica="{}"}} {}'.format(name, int(state['healthy']))
+              for name, state in stats['replicas'].items()]
+    lines += ['# HELP db_replica_lag_seconds Age of the primary heartbeat as seen on the replica',
+              '# TYPE db_replica_lag_seconds gauge']
+    lines += ['db_replica_lag_seconds{{replica="{}"}} {}'.format(name, state['lag_seconds'])
+              for name, state in stats['replicas'].items() if state['lag_seconds'] is not None]
+    lines += ['# HELP db_routed_reads_total Statements from read-only service calls by the database that served them',
+              '# TYPE db_routed_reads_total counter',
+              'db_routed_reads_total{{target="primary"}} {}'.format(stats['primary_reads'])]
+    lines += ['db_routed_reads_total{{target="{}"}} {}'.format(name, state['reads'])
+              for name, state in stats['replicas'].items()]
+    return lines
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_sql' in g:
+        conn.info['metrics_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('metrics_started', None)
+    if started is not None and has_request_context() and 'metrics_sql' in g:
+        g.metrics_sql[0] += 1
+        g.metrics_sql[1] += time.perf_counter() - started
+
+
+@contextmanager
+def serialization_timer():
+    """Attribute the wrapped block to the request's serialization time, outermost block only"""
+    timer = g.get('metrics_serialize') if has_request_context() else None
+    if timer is None:
+        yield
+        return
+
+    timer[0] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer[0] -= 1
+        if not timer[0]:
+            timer[1] += time.perf_counter() - start
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads serving requests every `interval` seconds.
+
+    One daemon thread samples all registered request threads through
+    sys._current_frames(), so unprofiled code pays nothing per call; stacks are
+    aggregated as folded 'outer;inner' frame strings with sample counts.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}  # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._active[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_fold(frame)] += 1
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+metrics = RequestMetrics()
@@ -0,0 +1,90 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block or request runs more SQL statements than it is allowed"""
+
+    def __init__(self, label, budget, statements):
+        self.label = label
+        self.budget = budget
+        self.statements = statements
+        super().__init__('{} ran {} SQL statements (budget {}):\n{}'.format(
+            label, len(statements), budget, '\n'.join(statements)))
+
+
+class QueryCounter:
+    """Records the SQL statements issued on the current thread while active"""
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.statements = []
+        self._thread = None
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.statements.append(statement)
+
+    def __enter__(self):
+        self.engine = self.engine or db.engine
+        self._thread = threading.get_ident()
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        return False
+
+
+@contextmanager
+def query_budget(budget, label='block', engine=None):
+    """Fail with QueryBudgetExceeded if the wrapped block issues more than `budget` statements"""
+    with QueryCounter(engine) as counter:
+        yield counter
+    if counter.count > budget:
+        raise QueryBudgetExceeded(label, budget, counter.statements)
+
+
+def _count_request_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements.append(statement)
+
+
+def init_query_budgets(app):
+    """Track statements per request and check them against QUERY_BUDGETS[endpoint]"""
+    budgets = app.config.get('QUERY_BUDGETS') or {}
+    if not budgets:
+        return
+
+    with app.app_context():
+        # Completed statements on the primary and any read replicas, so a replica read that
+        # fails and is retried on the primary counts once
+        for engine in db.engines.values():
+            event.listen(engine, 'after_cursor_execute', _count_request_statement)
+
+    @app.before_request
+    def _start_query_count():
+        g.sql_statements = []
+
+    @app.after_request
+    def _check_query_budget(response):
+        budget = budgets.get(request.endpoint)
+        statements = g.pop('sql_statements', [])
+        if budget is not None and len(statements) > budget:
+            error = QueryBudgetExceeded(request.endpoint, budget, statements)
+            if app.config.get('QUERY_BUDGET_ENFORCE') or app.testing:
+                raise error
+            logger.warning(str(error))
+        return response
@@ -0,0 +1,204 @@
+import contextlib
+import contextvars
+import functools
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+_reading = contextvars.ContextVar('read_replica', default=False)
+_primary = contextvars.ContextVar('primary_reads', default=False)
+
+
+class ReplicaState:
+    def __init__(self, name):
+        self.name = name
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+        self.error = None
+        self.reads = 0
+
+    def to_dict(self):
+        return {'healthy': self.healthy, 'lag_seconds': self.lag, 'error': self.error, 'reads': self.reads}
+
+
+class ReplicaRouter:
+    """Routes read-only service calls to healthy, caught-up replicas, everything else to the primary.
+
+    Replicas are the SQLALCHEMY_BINDS named replica_*, built from DATABASE_REPLICA_URLS.
+    Every REPLICA_CHECK_INTERVAL seconds a daemon thread, started by the first routed
+    read, writes a heartbeat row on the primary and reads it back from each replica: a
+    replica serves reads only while it answers and its heartbeat is at most
+    REPLICA_MAX_LAG_SECONDS old. Reads fall back to the primary until the first check,
+    when no replica qualifies, once the request has written anything (read-your-writes),
+    inside primary_reads(), and after a replica fails mid-query. A REPLICA_CHECK_INTERVAL
+    of 0 starts no thread, check() is then left to the caller.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.replicas = {}
+        self.max_lag = 5.0
+        self.check_interval = 2.0
+        self.primary_reads = 0
+        self._cycle = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.replicas = {name: ReplicaState(name) for name in sorted(app.config.get('SQLALCHEMY_BINDS') or {})
+                         if name.startswith('replica')}
+        self.max_lag = app.config.get('REPLICA_MAX_LAG_SECONDS', self.max_lag)
+        self.check_interval = app.config.get('REPLICA_CHECK_INTERVAL', self.check_interval)
+        if self.replicas:
+            from app import db
+            event.listen(db.session, 'after_flush', _mark_written)
+            # Core INSERT/UPDATE/DELETE through the session never flush
+            event.listen(db.session, 'do_orm_execute', _mark_executed)
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def _ensure_checking(self):
+        if self.check_interval <= 0:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='replica-health', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.check()
+            except Exception:
+                logger.exception('Replica health check failed')
+            time.sleep(self.check_interval)
+
+    def check(self):
+        """Write the primary heartbeat, then measure each replica's reachability and lag"""
+        from app import db
+        from app.models.models import ReplicationHeartbeat
+
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as connection:
+                beat = connection.execute(update(ReplicationHeartbeat).where(ReplicationHeartbeat.id == 1)
+                                          .values(beat_at=now))
+                if not beat.rowcount:
+                    connection.execute(ReplicationHeartbeat.__table__.insert().values(id=1, beat_at=now))
+        except IntegrityError:
+            pass  # another worker inserted the row first
+
+        for name, state in self.replicas.items():
+            try:
+                with db.engines[name].connect() as connection:
+                    beat_at = connection.scalar(select(ReplicationHeartbeat.beat_at)
+                                                .where(ReplicationHeartbeat.id == 1))
+                state.lag = None if beat_at is None else max(0.0, (datetime.utcnow() - beat_at).total_seconds())
+                state.error = None if beat_at is not None else 'no heartbeat'
+            except DBAPIError as e:
+                state.lag, state.error = None, str(e.orig)
+            state.healthy = state.lag is not None and state.lag <= self.max_lag
+            state.checked_at = time.monotonic()
+
+    def engine_for_read(self):
+        """A healthy replica engine, round robin, or None to use the primary"""
+        from app import db
+
+        self._ensure_checking()
+        candidates = [state for state in self.replicas.values() if state.healthy]
+        if not candidates or _primary.get() or (has_request_context() and g.get('db_wrote')):
+            self.primary_reads += 1
+            return None
+        state = candidates[next(self._cycle) % len(candidates)]
+        state.reads += 1
+        return db.engines[state.name]
+
+    def mark_failed(self, engine, error):
+        from app import db
+        for name, state in self.replicas.items():
+            if db.engines[name] is engine:
+                state.healthy, state.error = False, str(error)
+                logger.warning('Replica %s failed, routing reads to the primary until it recovers', name)
+
+    def stats(self):
+        return {'primary_reads': self.primary_reads, 'max_lag_seconds': self.max_lag,
+                'replicas': {name: state.to_dict() for name, state in self.replicas.items()}}
+
+
+def _mark_written(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def _mark_executed(orm_execute_state):
+    if not orm_execute_state.is_select and has_request_context():
+        g.db_wrote = True
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Send @read_replica calls made inside the block to the primary"""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+class RoutingSession(Session):
+    """Session that sends statements issued under @read_replica to a replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _reading.get() and not self._flushing:
+            engine = replica_router.engine_for_read()
+            if engine is not None:
+                self.info['replica_engine'] = engine
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(method):
+    """Run a read-only service method against a replica when one is healthy.
+
+    If the replica fails mid-query the session is rolled back, the replica is taken
+    out of rotation and the method is retried once on the primary.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not replica_router.enabled or _reading.get():
+            return method(*args, **kwargs)
+
+        from app import db
+        token = _reading.set(True)
+        db.session.info.pop('replica_engine', None)
+        try:
+            return method(*args, **kwargs)
+        except OperationalError as e:
+            engine = db.session.info.pop('replica_engine', None)
+            if engine is None:
+                raise
+            db.session.rollback()
+            replica_router.mark_failed(engine, e.orig)
+        finally:
+            _reading.reset(token)
+        return method(*args, **kwargs)
+
+    return wrapper
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,465 @@
+"""Seeded, concurrent load test of the post and user API with a baseline regression gate.
+
+Run from backend/:
+
+    python -m benchmarks.load_test --users 100000 --posts 1000000 --duration 60 --concurrency 16 \\
+        --output report.json --baseline benchmarks/baseline.json
+
+The database (SQLite file by default, any DATABASE_URL-style URL with --database-url,
+e.g. a local Postgres) is seeded deterministically from --seed and reused by later
+runs with the same volumes. The app is served by an in-process threaded WSGI server
+unless --url points at a running one. The report gives p50/p95/p99 latency and
+throughput per operation plus peak RSS as JSON. With --baseline the run is compared
+to a stored report and the exit status is 1 on a regression: overall throughput or
+the median latency of a hot path (feed, symbol_feed, comments, like) off by more than
+--tolerance, or a hot path's p95 off by more than --p95-tolerance. A few dozen samples
+say little about a tail, so p95 is only compared when both runs have --min-samples of
+the operation; raise --duration to get there. Latencies depend on the machine: refresh
+benchmarks/baseline.json with --output on the host that runs the gate.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, delete, func, or_, select, text
+
+from app import create_app, db
+from app.config import Config
+from app.models.models import Comment, Posts, Symbol, User
+from app.services import comment_paths
+from app.services.pagination import encode_cursor
+from app.services.reference_data import reference_data
+from app.services.reputation_service import ReputationService
+
+HOT_PATHS = ('feed', 'symbol_feed', 'comments', 'like')
+
+DEFAULT_MIX = {
+    'feed': 25,
+    'symbol_feed': 15,
+    'user_posts': 10,
+    'comments': 10,
+    'replies': 4,
+    'like': 10,
+    'get_user': 8,
+    'search': 4,
+    'create_post': 6,
+    'add_comment': 5,
+    'create_user': 1,
+    'get_score': 1,
+    'bulk': 1,
+}
+
+WORDS = ('market', 'earnings', 'guidance', 'revenue', 'chart', 'support', 'resistance', 'volume',
+         'calls', 'puts', 'long', 'short', 'buy', 'sell', 'breakout', 'dip', 'rally', 'crash',
+         'upgrade', 'downgrade', 'dividend', 'options', 'squeeze', 'fed', 'rates', 'inflation')
+SENTIMENTS = ('Bullish', 'Bearish', 'Neutral')
+BATCH = 10000
+
+
+def make_config(database_url, cache_backend):
+    engine_options = {} if database_url.startswith('sqlite') else Config.SQLALCHEMY_ENGINE_OPTIONS
+    return type('LoadTestConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options,
+        'QUERY_BUDGETS': {},
+        'CACHE_BACKEND': cache_backend,
+    })
+
+
+def _sentence(rng, code, words=12):
+    return '${} {}'.format(code, ' '.join(rng.choice(WORDS) for _ in range(words)))
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(model.__table__.insert(), rows[start:start + BATCH])
+
+
+def seed(users, posts, comments, symbols, reply_ratio, rng_seed):
+    """Insert users, symbols, posts and threaded comments in id order, deterministically"""
+    rng = random.Random(rng_seed)
+    now = datetime.utcnow()
+    codes = ['SYM{}'.format(i) for i in range(symbols)]
+
+    _insert(Symbol, [{'id': i + 1, 'name': code, 'code': code, 'is_active': True}
+                     for i, code in enumerate(codes)])
+    _insert(User, [{'id': i + 1, 'username': 'user{}'.format(i), 'first_name': 'First{}'.format(i),
+                    'last_name': 'Last{}'.format(i), 'password': 'x', 'is_active': True,
+                    'created_at': now, 'updated_at': now}
+                   for i in range(users)])
+    db.session.commit()
+
+    # Skewed toward a few popular symbols and active users, like real traffic
+    for start in range(0, posts, BATCH):
+        rows = []
+        for i in range(start, min(start + BATCH, posts)):
+            symbol = min(int(rng.paretovariate(1.2)), symbols)
+            rows.append({
+                'id': i + 1,
+                'content': _sentence(rng, codes[symbol - 1]),
+                'created_at': now - timedelta(seconds=(posts - i) * 30 * 86400 // posts),
+                'processed': False,
+                'sentiment': rng.choice(SENTIMENTS),
+                'sentiment_score': rng.randint(0, 100),
+                'user_id': min(int(rng.paretovariate(1.1)), users),
+                'symbol_id': symbol,
+                'likes_count': int(rng.expovariate(0.2)),
+            })
+        db.session.execute(Posts.__table__.insert(), rows)
+        db.session.commit()
+
+    # Comments cluster on recent posts; replies attach to a recent comment on the same post
+    recent = []
+    reply_counts, descendant_counts = Counter(), Counter()
+    for start in range(0, comments, BATCH):
+        rows = []
+        for i in range(start, min(start + BATCH, comments)):
+            comment_id = i + 1
+            if recent and rng.random() < reply_ratio:
+                parent_id, post_id, parent_path = rng.choice(recent)
+                reply_counts[parent_id] += 1
+                descendant_counts.update(comment_paths.ancestor_ids(parent_path))
+            else:
+                parent_id, post_id, parent_path = None, posts - min(int(rng.expovariate(1.0 / 500)), posts - 1), ''
+            path = parent_path + comment_paths.segment(comment_id)
+            rows.append({'id': comment_id, 'content': rng.choice(WORDS)[:10], 'parent_id': parent_id,
+                         'post_id': post_id, 'is_active': True, 'created_at': now, 'user_id': rng.randint(1, users),
+                         'path': path, 'depth': comment_paths.depth_of(path),
+                         'reply_count': 0, 'descendant_count': 0})
+            recent.append((comment_id, post_id, path))
+            if len(recent) > 200:
+                recent.pop(0)
+        db.session.execute(Comment.__table__.insert(), rows)
+        db.session.commit()
+
+    table = Comment.__table__
+    counted = [{'comment_id': comment_id, 'replies': reply_counts[comment_id], 'descendants': descendants}
+               for comment_id, descendants in descendant_counts.items()]
+    for start in range(0, len(counted), BATCH):
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('comment_id'))
+            .values(reply_count=bindparam('replies'), descendant_count=bindparam('descendants')),
+            counted[start:start + BATCH])
+    db.session.commit()
+
+    if db.engine.dialect.name == 'postgresql':
+        # Explicit ids leave the serial sequences behind
+        for table in ('symbol', 'cust', 'posts', 'comment'):
+            db.session.execute(text("SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                                    "(SELECT COALESCE(MAX(id), 1) FROM {0}))".format(table)))
+        db.session.commit()
+
+    ReputationService.recompute_all(chunk_size=5000)
+
+
+def prepare(args):
+    app = create_app(make_config(args.database_url, args.cache_backend))
+    with app.app_context():
+        seeded = (db.session.scalar(select(func.count(User.id)).where(User.id <= args.users)),
+                  db.session.scalar(select(func.count(Posts.id)).where(Posts.id <= args.posts)))
+        if args.reseed or seeded != (args.users, args.posts):
+            if any(seeded):
+                db.drop_all()
+                db.create_all()
+            started = time.perf_counter()
+            seed(args.users, args.posts, args.comments, args.symbols, args.reply_ratio, args.seed)
+            print('Seeded {} users, {} posts, {} comments in {:.0f}s'.format(
+                args.users, args.posts, args.comments, time.perf_counter() - started), file=sys.stderr)
+        else:
+            # Drop what earlier runs created so every run starts from the same volumes;
+            # like counts on seeded posts still drift, --reseed resets them too
+            late_posts = select(Posts.id).where(Posts.id > args.posts)
+            db.session.execute(delete(Comment).where(or_(Comment.id > args.comments, Comment.post_id.in_(late_posts))))
+            db.session.execute(delete(Posts).where(Posts.id > args.posts))
+            db.session.execute(delete(User).where(User.id > args.users))
+            db.session.commit()
+        reference_data.refresh()
+
+        # Ids the workload picks from, so most requests hit existing rows
+        threads = db.session.execute(
+            select(Comment.post_id, Comment.id).where(Comment.parent_id.is_(None))
+            .order_by(Comment.id.desc()).limit(5000)).all()
+        oldest, newest = db.session.execute(select(func.min(Posts.created_at), func.max(Posts.created_at))).one()
+        state = {
+            'users': db.session.scalar(select(func.max(User.id))),
+            'posts': db.session.scalar(select(func.max(Posts.id))),
+            'codes': list(reference_data.snapshot().symbols_by_code),
+            'threads': [tuple(row) for row in threads] or [(1, 1)],
+            'oldest': oldest,
+            'newest': newest,
+        }
+    return app, state
+
+
+class Workload:
+    """Builds (method, path, body) requests for each operation in the mix"""
+
+    def __init__(self, state, mix, rng_seed):
+        self.state = state
+        self.operations = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.operations]
+        self.rng_seed = rng_seed
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def rng(self):
+        with self._lock:
+            self._counter += 1
+            return random.Random('{}-{}'.format(self.rng_seed, self._counter))
+
+    def _cursor(self, rng):
+        # Half the reads go past page one, seeking from a random point in history
+        if rng.random() < 0.5:
+            return ''
+        span = (self.state['newest'] - self.state['oldest']).total_seconds()
+        moment = self.state['oldest'] + timedelta(seconds=rng.random() * span)
+        return '&cursor=' + encode_cursor(moment, self.state['posts'])
+
+    def _post(self, rng):
+        return {'userId': rng.randint(1, self.state['users']), 'symbol': rng.choice(self.state['codes']),
+                'content': _sentence(rng, 'LOAD'), 'sentiment': rng.choice(SENTIMENTS),
+                'sentimentScore': rng.randint(0, 100)}
+
+    def request(self, name, rng):
+        state = self.state
+        if name == 'feed':
+            return 'GET', '/api/posts?limit=50' + self._cursor(rng), None
+        if name == 'symbol_feed':
+            return 'GET', '/api/posts/symbol/{}?limit=50{}'.format(rng.choice(state['codes']), self._cursor(rng)), None
+        if name == 'user_posts':
+            return 'GET', '/api/posts/{}?limit=50'.format(rng.randint(1, state['users'])), None
+        if name == 'comments':
+            return 'GET', '/api/posts/{}/comments'.format(rng.choice(state['threads'])[0]), None
+        if name == 'replies':
+            return 'GET', '/api/posts/{}/comments/{}/replies'.format(*rng.choice(state['threads'])), None
+        if name == 'like':
+            return 'POST', '/api/posts/{}/like'.format(rng.randint(1, state['posts'])), None
+        if name == 'get_user':
+            return 'GET', '/api/users/user{}'.format(rng.randint(0, state['users'] - 1)), None
+        if name == 'search':
+            return 'GET', '/api/posts/search?q={}+{}&limit=20'.format(rng.choice(WORDS), rng.choice(WORDS)), None
+        if name == 'create_post':
+            return 'POST', '/api/posts', self._post(rng)
+        if name == 'add_comment':
+            post_id, parent_id = rng.choice(state['threads'])
+            body = {'content': rng.choice(WORDS)[:10], 'userId': rng.randint(1, state['users'])}
+            if rng.random() < 0.5:
+                body['parentId'] = parent_id
+            return 'POST', '/api/posts/{}/comments'.format(post_id), body
+        if name == 'create_user':
+            username = 'load{}'.format(rng.getrandbits(48))
+            return 'POST', '/api/users', {'username': username, 'password': 'x', 'firstName': 'Load',
+                                          'lastName': 'Test', 'profilePicture': None}
+        if name == 'get_score':
+            return 'GET', '/api/users/{}/score'.format(rng.randint(1, state['users'])), None
+        if name == 'bulk':
+            return 'POST', '/api/posts/bulk', {'posts': [self._post(rng) for _ in range(100)]}
+        raise ValueError('Unknown operation {}'.format(name))
+
+
+def run_load(base_url, workload, concurrency, duration, warmup, timeout):
+    samples = {name: [] for name in workload.operations}
+    errors = {name: 0 for name in workload.operations}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    def worker():
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                return
+            rng = workload.rng()
+            name = rng.choices(workload.operations, workload.weights)[0]
+            method, path, body = workload.request(name, rng)
+            data = json.dumps(body).encode('utf-8') if body is not None else None
+            req = urllib.request.Request(base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+            begin = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as response:
+                    response.read()
+                failed = False
+            except urllib.error.HTTPError as e:
+                e.read()
+                failed = e.code >= 500
+            except (urllib.error.URLError, OSError):
+                failed = True
+            end = time.perf_counter()
+            if begin >= measure_from and end <= deadline:
+                with lock:
+                    samples[name].append(end - begin)
+                    errors[name] += failed
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies, errors, duration):
+    ordered = sorted(latencies)
+    ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'rps': round(len(ordered) / duration, 2),
+        'mean_ms': ms(statistics.fmean(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+        'max_ms': ms(ordered[-1]) if ordered else None,
+    }
+
+
+def peak_rss_mb(pid=None):
+    """High-water RSS of a server process (Linux), or of this process"""
+    if pid:
+        with open('/proc/{}/status'.format(pid)) as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0), 1)
+
+
+def compare(report, baseline, tolerance, p95_tolerance, min_samples):
+    """Regressions against the baseline: overall throughput, hot path medians, and hot path
+    p95 where both runs have min_samples of the operation
+    """
+    regressions = []
+    current, previous = report['overall'], baseline['overall']
+    # Per operation rates are the overall rate times the mix, with a fraction of the samples
+    if current['rps'] < previous['rps'] * (1 - tolerance):
+        regressions.append('overall: {} req/s vs baseline {} req/s'.format(current['rps'], previous['rps']))
+    for name in HOT_PATHS:
+        current, previous = report['operations'].get(name), baseline['operations'].get(name)
+        if not current or not previous or not current['requests'] or not previous['requests']:
+            continue
+        if current['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+            regressions.append('{}: p50 {}ms vs baseline {}ms'.format(name, current['p50_ms'], previous['p50_ms']))
+        if min(current['requests'], previous['requests']) >= min_samples and \
+                current['p95_ms'] > previous['p95_ms'] * (1 + p95_tolerance):
+            regressions.append('{}: p95 {}ms vs baseline {}ms'.format(name, current['p95_ms'], previous['p95_ms']))
+    return regressions
+
+
+def parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    if value:
+        mix = {name: 0 for name in DEFAULT_MIX}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            if name not in DEFAULT_MIX:
+                raise argparse.ArgumentTypeError('Unknown operation {}'.format(name))
+            mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default='sqlite:///' + os.path.abspath('loadtest.db'))
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--reply-ratio', type=float, default=0.4)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reseed', action='store_true', help='Drop and reseed even if volumes match')
+    parser.add_argument('--cache-backend', default='none', help='CACHE_BACKEND for the in-process server')
+    parser.add_argument('--url', help='Drive a running server instead of an in-process one')
+    parser.add_argument('--server-pid', type=int, help='Report the peak RSS of this server process')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Operation weights, e.g. feed=5,like=2 (default: built-in mix)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds before measuring')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout')
+    parser.add_argument('--baseline', help='Compare hot paths to this report, exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='For throughput and medians')
+    parser.add_argument('--p95-tolerance', type=float, default=0.5)
+    parser.add_argument('--min-samples', type=int, default=400,
+                        help='Compare p95 only with this many samples of the operation in both runs')
+    args = parser.parse_args()
+
+    app, state = prepare(args)
+    server = None
+    base_url = args.url
+    if base_url is None:
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = 'http://127.0.0.1:{}'.format(server.server_port)
+
+    workload = Workload(state, args.mix, args.seed)
+    # Build lazily initialized structures (search index, leaderboards) before measuring
+    prime = random.Random(args.seed)
+    for name in workload.operations:
+        method, path, _ = workload.request(name, prime)
+        if method == 'GET':
+            try:
+                urllib.request.urlopen(base_url.rstrip('/') + path, timeout=None).read()
+            except urllib.error.URLError:
+                pass
+    samples, errors = run_load(base_url.rstrip('/'), workload, args.concurrency,
+                               args.duration, args.warmup, args.timeout)
+    if server is not None:
+        server.shutdown()
+
+    every = [latency for latencies in samples.values() for latency in latencies]
+    report = {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'database': args.database_url.split(':', 1)[0], 'cache_backend': args.cache_backend,
+                        'server': args.url or 'in-process werkzeug'},
+        'dataset': {'users': args.users, 'posts': args.posts, 'comments': args.comments,
+                    'symbols': args.symbols, 'seed': args.seed},
+        'load': {'concurrency': args.concurrency, 'duration_s': args.duration, 'warmup_s': args.warmup,
+                 'mix': {name: weight for name, weight in args.mix.items() if weight}},
+        'overall': summarize(every, sum(errors.values()), args.duration),
+        'operations': {name: summarize(samples[name], errors[name], args.duration) for name in workload.operations},
+        # In-process runs include the load generator's own memory
+        'peak_rss_mb': peak_rss_mb(args.server_pid),
+    }
+
+    body = json.dumps(report, indent=2)
+    print(body)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(body + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(report, json.load(baseline), args.tolerance, args.p95_tolerance, args.min_samples)
+        for regression in regressions:
+            print('REGRESSION ' + regression, file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Upstream cost of the market data gateway against a local fake Massive API.
+
+Run from backend/:
+
+    python -m benchmarks.market_data_bench --clients 200 --symbols 20 --duration 10
+
+Each simulated client loads the dashboard (one batched ticker lookup) and then polls
+the events of one symbol, like open Dashboard/SymbolDetails tabs. The fake upstream
+counts the requests it serves. Prints a JSON report of client vs upstream requests;
+the exit status is 1 if any upstream URL was fetched more than once within its TTL or
+the upstream saw more requests per second than the configured rate limit allows.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from app import create_app
+from app.config import Config
+from app.services.market_data import market_data
+
+DASHBOARD_SYMBOLS = ['AAPL', 'GOOGL', 'MSFT', 'AMZN', 'TSLA', 'NVDA', 'META']
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    """Answers the Massive ticker endpoints after `latency` seconds and logs every hit.
+
+    Tickers in `missing` answer 404. While `retry_after` is set every request answers
+    429 with that Retry-After. Also used by tests/test_market_data.py.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), FakeUpstreamHandler)
+        self.latency = latency
+        self.missing = set()
+        self.retry_after = None
+        self.hits = Counter()
+        self.times = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        with self.server.lock:
+            self.server.hits[self.path] += 1
+            self.server.times.append(time.monotonic())
+        time.sleep(self.server.latency)
+
+        if self.server.retry_after is not None:
+            self.send_response(429)
+            self.send_header('Retry-After', str(self.server.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if url.path == '/v3/reference/tickers':
+            ticker = parse_qs(url.query).get('ticker', [''])[0]
+            if ticker in self.server.missing:
+                self.send_error(404)
+                return
+            body = {'results': [{'ticker': ticker, 'name': '{} Inc.'.format(ticker), 'market': 'stocks'}]}
+        elif url.path.startswith('/v3/reference/tickers/') and url.path.endswith('/events'):
+            ticker = url.path.split('/')[4]
+            body = {'results': {'name': '{} Inc.'.format(ticker), 'events': [{'type': 'ticker_change'}]}}
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_config(upstream_url, rate_limit, burst):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        SQLALCHEMY_BINDS = {}
+        CACHE_BACKEND = 'none'
+        METRICS_ENABLED = False
+        WEB_CONCURRENCY = 1
+        MASSIVE_API_KEY = 'bench'
+        MARKET_DATA_URL = upstream_url
+        MARKET_DATA_RATE_LIMIT = rate_limit
+        MARKET_DATA_BURST = burst
+    return BenchConfig
+
+
+def client(app, symbols, deadline, poll_interval, rng_seed, statuses):
+    rng = random.Random(rng_seed)
+    http = app.test_client()
+    symbol = rng.choice(symbols)
+    response = http.get('/api/market/tickers?symbols=' + ','.join(DASHBOARD_SYMBOLS + [symbol]))
+    statuses[response.status_code] += 1
+    while time.monotonic() < deadline:
+        response = http.get('/api/market/tickers/{}/events'.format(symbol))
+        statuses[response.status_code] += 1
+        time.sleep(poll_interval * rng.uniform(0.5, 1.5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--symbols', type=int, default=20, help='Distinct symbols the clients open')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='Seconds between event polls')
+    parser.add_argument('--upstream-latency', type=float, default=0.05)
+    parser.add_argument('--rate-limit', type=float, default=5, help='MARKET_DATA_RATE_LIMIT')
+    parser.add_argument('--burst', type=int, default=10, help='MARKET_DATA_BURST')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(args.upstream_latency)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    app = create_app(make_config(upstream.url, args.rate_limit, args.burst))
+
+    symbols = ['SYM{}'.format(i) for i in range(args.symbols)]
+    statuses = Counter()
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=client, args=(app, symbols, deadline, args.poll_interval,
+                                                     args.seed + i, statuses))
+               for i in range(args.clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    upstream.shutdown()
+
+    # Every URL is fetched once per TTL, and no one-second window exceeds rate + burst
+    duplicates = {path: count for path, count in upstream.hits.items() if count > 1}
+    busiest = max((sum(1 for t in upstream.times if start <= t < start + 1) for start in upstream.times), default=0)
+    report = {
+        'clients': args.clients,
+        'client_requests': sum(statuses.values()),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'distinct_upstream_urls': len(upstream.hits),
+        'upstream_requests': sum(upstream.hits.values()),
+        'upstream_busiest_second': busiest,
+        'elapsed_seconds': round(elapsed, 2),
+        'gateway': market_data.stats(),
+    }
+    print(json.dumps(report, indent=2))
+    if duplicates or busiest > args.rate_limit + args.burst:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
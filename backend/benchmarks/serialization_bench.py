@@ -0,0 +1,124 @@
+"""Per-1k-post cost of serializing the global feed: marshmallow schemas vs row dumpers.
+
+Run from backend/:
+
+    python -m benchmarks.serialization_bench --posts 5000 --repeat 7
+
+Prints a JSON report with the median milliseconds per 1k posts for the serialize
+step alone and for query + serialize + encode end to end.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app import create_app, db
+from app.config import Config
+from app.models.fast_serializers import POST_DETAIL_COLUMNS, dump_post_detail_row
+from app.models.models import Posts, Symbol, User
+from app.models.serializers import PostDetailSerializer
+from app.services.reference_data import reference_data
+from app.utils import fast_json
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    QUERY_BUDGETS = {}
+    CACHE_BACKEND = 'none'
+
+
+def seed(posts, users=100, symbols=10):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    db.session.execute(Symbol.__table__.insert(), [
+        {'id': i + 1, 'name': 'SYM{}'.format(i), 'code': 'SYM{}'.format(i), 'is_active': True}
+        for i in range(symbols)])
+    db.session.execute(User.__table__.insert(), [
+        {'id': i + 1, 'username': 'user{}'.format(i), 'first_name': 'First{}'.format(i),
+         'last_name': 'Last{}'.format(i), 'password': 'x', 'reputation_score': 50.0,
+         'post_quality_avg': 0.0, 'post_count': 0, 'is_active': True}
+        for i in range(users)])
+    db.session.execute(Posts.__table__.insert(), [
+        {'content': 'Post {} about the market '.format(i) * 4,
+         'created_at': now - timedelta(seconds=i),
+         'processed': False,
+         'sentiment': rng.choice(['Bullish', 'Bearish', 'Neutral']),
+         'sentiment_score': rng.randint(-10, 10),
+         'user_id': rng.randint(1, users),
+         'symbol_id': rng.randint(1, symbols),
+         'likes_count': rng.randint(0, 100)}
+        for i in range(posts)])
+    db.session.commit()
+
+
+def marshmallow_path(limit):
+    db.session.expunge_all()
+    posts = Posts.query.order_by(Posts.created_at.desc(), Posts.id.desc()).limit(limit).all()
+    start = time.perf_counter()
+    payload = PostDetailSerializer(many=True).dump(posts)
+    serialize = time.perf_counter() - start
+    body = json.dumps({'posts': payload}).encode('utf-8')
+    return payload, body, serialize
+
+
+def row_path(limit):
+    rows = db.session.execute(
+        select(*POST_DETAIL_COLUMNS).join(Posts.user)
+        .order_by(Posts.created_at.desc(), Posts.id.desc()).limit(limit)).all()
+    start = time.perf_counter()
+    payload = [dump_post_detail_row(row, reference_data.symbol) for row in rows]
+    serialize = time.perf_counter() - start
+    body = fast_json.dumps({'posts': payload})
+    return payload, body, serialize
+
+
+def measure(path, limit, repeat):
+    serialize, total = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload, _, ser = path(limit)
+        total.append(time.perf_counter() - start)
+        serialize.append(ser)
+    per_1k = 1000.0 / len(payload) * 1000.0
+    return {
+        'serialize_ms_per_1k': round(statistics.median(serialize) * per_1k, 3),
+        'end_to_end_ms_per_1k': round(statistics.median(total) * per_1k, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        seed(args.posts)
+        reference_data.refresh()
+
+        expected, _, _ = marshmallow_path(args.posts)
+        actual, _, _ = row_path(args.posts)
+        if expected != actual:
+            raise SystemExit('Row dumpers do not match PostDetailSerializer output')
+
+        before = measure(marshmallow_path, args.posts, args.repeat)
+        after = measure(row_path, args.posts, args.repeat)
+
+    print(json.dumps({
+        'posts': args.posts,
+        'encoder': 'orjson' if fast_json.orjson else 'json',
+        'marshmallow': before,
+        'rows': after,
+        'serialize_speedup': round(before['serialize_ms_per_1k'] / after['serialize_ms_per_1k'], 1),
+        'end_to_end_speedup': round(before['end_to_end_ms_per_1k'] / after['end_to_end_ms_per_1k'], 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
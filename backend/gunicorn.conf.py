@@ -0,0 +1,29 @@
+"""gunicorn settings for wsgi:app, every value can be overridden from the environment.
+
+WEB_CONCURRENCY and WEB_THREADS are exported before the workers start so that
+app.config.engine_options() sizes each worker's pool from the same numbers.
+"""
+import multiprocessing
+import os
+
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', 5000))
+
+workers = int(os.environ.setdefault('WEB_CONCURRENCY', str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.environ.setdefault('WEB_THREADS', '8'))
+# Threaded workers, so slow clients do not each hold a whole process
+worker_class = 'gthread'
+# SSE streams would each pin one of those threads, gunicorn_stream.conf.py serves them
+os.environ.setdefault('SSE_STREAMS', 'false')
+
+# Each worker builds its own app: engine pool, caches and background threads are per
+# process and must not be inherited across fork
+preload_app = False
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth from per-process caches
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
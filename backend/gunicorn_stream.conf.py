@@ -0,0 +1,27 @@
+"""gunicorn settings for the SSE stream server: gunicorn -c gunicorn_stream.conf.py wsgi:app
+
+A stream spends its life waiting for the next event, so streams run here on gevent
+workers, one greenlet each, instead of holding a thread of the gthread workers in
+gunicorn.conf.py. Route /api/stream to this server and run both with SSE_BUS=redis so
+events published by the API workers reach it.
+"""
+import os
+
+bind = '0.0.0.0:{}'.format(os.environ.get('STREAM_PORT', 5001))
+
+workers = int(os.environ.setdefault('WEB_CONCURRENCY', os.environ.get('STREAM_WORKERS', '2')))
+# Streams barely touch the database, keep each worker's pool small
+os.environ.setdefault('WEB_THREADS', '1')
+os.environ['SSE_STREAMS'] = 'true'
+worker_class = 'gevent'
+# Open streams per worker
+worker_connections = int(os.environ.get('STREAM_CONNECTIONS', 1000))
+
+preload_app = False
+
+# Streams are long-lived by design, heartbeats (SSE_HEARTBEAT_SECONDS) keep them open
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
@@ -1,6 +1,6 @@
 from app import create_app
-import psycopg2
 app = create_app()
 
 if __name__ == '__main__':
+    # Development server, production runs wsgi.py under gunicorn (see gunicorn.conf.py)
     app.run(debug=False)
\ No newline at end of file
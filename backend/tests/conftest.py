@@ -0,0 +1,93 @@
+"""Shared fixtures: an app on a fresh SQLite file per test, with TESTING on so query
+budgets are enforced, and a seeded set of users, posts and a multi-level comment thread.
+"""
+import pytest
+
+from app import create_app, db
+from app.config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
+    # Every request reaches the database, so budgets see the real statement counts
+    CACHE_BACKEND = 'none'
+    METRICS_ENABLED = False
+    PARTITION_MAINTENANCE_SECONDS = 0
+    WRITE_BEHIND_ENABLED = False
+    REPLICA_CHECK_INTERVAL = 0
+
+
+def make_config(tmp_path, **overrides):
+    overrides.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///{}'.format(tmp_path / 'test.db'))
+    overrides.setdefault('ARCHIVE_DIR', str(tmp_path / 'archive'))
+    overrides.setdefault('WRITE_BEHIND_WAL_DIR', str(tmp_path / 'wal'))
+    overrides.setdefault('QUERY_BUDGETS', dict(Config.QUERY_BUDGETS))
+    return type('TestConfig', (TestConfig,), overrides)
+
+
+@pytest.fixture
+def config_overrides():
+    """Override in a test module to change the app config"""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, config_overrides):
+    app = create_app(make_config(tmp_path, **config_overrides))
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # init_app keeps a MetaData per bind on the shared db, later apps may not have the bind
+    for key in [key for key in db.metadatas if key is not None]:
+        del db.metadatas[key]
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed(app):
+    """Two users and symbols, a few posts each, and on the first post a thread three levels
+    deep under two top-level comments. Returns the ids by name.
+    """
+    from app.models.models import Symbol, User
+    from app.services.post_service import PostService
+    from app.services.reference_data import reference_data
+
+    with app.app_context():
+        for code in ('AAPL', 'TSLA'):
+            db.session.add(Symbol(name=code, code=code))
+        alice = User(username='alice', first_name='Alice', last_name='A', password='x')
+        bob = User(username='bob', first_name='Bob', last_name='B', password='x')
+        db.session.add_all([alice, bob])
+        db.session.commit()
+        reference_data.refresh()
+
+        posts = []
+        for i in range(6):
+            author = alice if i % 2 == 0 else bob
+            post = PostService.create_post({'userId': author.id, 'content': 'post {}'.format(i),
+                                            'symbol': 'AAPL' if i % 3 else 'TSLA',
+                                            'sentiment': ('Bullish', 'Bearish', 'Neutral')[i % 3],
+                                            'sentimentScore': 10 * i})
+            posts.append(post.id)
+
+        def comment(user, content, parent=None):
+            data = {'userId': user.id, 'content': content, 'parentId': parent}
+            return PostService.add_comment(data, posts[0]).id
+
+        first = comment(alice, 'first')
+        reply = comment(bob, 'reply', first)
+        nested = comment(alice, 'nested', reply)
+        deepest = comment(bob, 'deepest', nested)
+        second = comment(bob, 'second')
+        comment(alice, 'answer', second)
+        ids = {'alice': alice.id, 'bob': bob.id, 'posts': posts, 'first': first, 'reply': reply,
+               'nested': nested, 'deepest': deepest, 'second': second}
+    return ids
@@ -0,0 +1,124 @@
+"""Tag-versioned cache on the Redis backend, with an in-memory stand-in for the server"""
+import fnmatch
+from collections import OrderedDict
+
+import pytest
+
+from app.cache import Cache, RedisCache
+
+
+class FakeRedis:
+    """The slice of the redis-py client RedisCache uses. Keys expire on a manual clock and
+    the oldest key is evicted past max_keys, like maxmemory with allkeys-lru.
+    """
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys
+        self.now = 0
+        self.evicted = 0
+        self._data = OrderedDict()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self.now:
+            del self._data[key]
+            return None
+        return entry
+
+    def mget(self, keys):
+        values = []
+        for key in keys:
+            entry = self._live(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            values.append(None if entry is None else entry[0])
+        return values
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self._live(key) is not None:
+            return None
+        self._data[key] = (value.encode('utf-8'), self.now + ex if ex else None)
+        self._data.move_to_end(key)
+        while self.max_keys is not None and len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+            self.evicted += 1
+        return True
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def dbsize(self):
+        return len(self._data)
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self._data) if fnmatch.fnmatchcase(key, pattern)]
+
+    def info(self, section):
+        return {'evicted_keys': self.evicted}
+
+
+def redis_cache(client, ttl=30):
+    cache = Cache()
+    cache.backend = RedisCache(client, default_ttl=ttl)
+    return cache
+
+
+@pytest.fixture
+def server():
+    return FakeRedis()
+
+
+def test_get_or_set_reads_through(server):
+    cache = redis_cache(server)
+    calls = []
+
+    def load():
+        calls.append(1)
+        return {'posts': [1, 2]}
+
+    assert cache.get_or_set('feed:50:', ['feed'], load) == {'posts': [1, 2]}
+    assert cache.get_or_set('feed:50:', ['feed'], load) == {'posts': [1, 2]}
+    assert len(calls) == 1
+    assert cache.get_or_set('feed:20:', ['feed'], load) == {'posts': [1, 2]}
+    assert len(calls) == 2
+
+
+def test_invalidation_reaches_every_worker(server):
+    # Two workers, two Cache instances, one Redis
+    first, second = redis_cache(server), redis_cache(server)
+    first.get_or_set('user:1', ['user:1', 'feed'], lambda: 'v1')
+    assert second.get_or_set('user:1', ['user:1', 'feed'], lambda: 'unused') == 'v1'
+
+    second.invalidate('feed')
+    assert first.get_or_set('user:1', ['user:1', 'feed'], lambda: 'v2') == 'v2'
+    assert second.get_or_set('user:1', ['user:1', 'feed'], lambda: 'unused') == 'v2'
+    # Other tags keep their entries
+    first.get_or_set('user:2', ['user:2'], lambda: 'u2')
+    second.invalidate('user:1')
+    assert first.get_or_set('user:2', ['user:2'], lambda: 'unused') == 'u2'
+
+
+def test_entries_expire_with_their_ttl(server):
+    cache = redis_cache(server, ttl=30)
+    cache.get_or_set('a', ['t'], lambda: 1)
+    server.now = 29
+    assert cache.get_or_set('a', ['t'], lambda: 2) == 1
+    server.now = 31
+    assert cache.get_or_set('a', ['t'], lambda: 2) == 2
+
+
+def test_stats_count_hits_misses_and_evictions():
+    server = FakeRedis(max_keys=3)
+    cache = redis_cache(server)
+    cache.get_or_set('a', ['t'], lambda: 1)
+    cache.get_or_set('a', ['t'], lambda: 1)
+    cache.get_or_set('b', ['t'], lambda: 2)
+    cache.get_or_set('c', ['t'], lambda: 3)
+    cache.invalidate('t')
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['sets'], stats['invalidations']) == (1, 3, 3, 1)
+    assert stats['hit_ratio'] == 0.25
+    assert stats['backend'] == 'RedisCache'
+    # The tag token and three entries in a three key server: the least recent entry went
+    assert (stats['evictions'], stats['size']) == (1, 3)
@@ -0,0 +1,77 @@
+"""Comment threads: per-thread reply caps and migrating comment tables from before paths"""
+import pytest
+from sqlalchemy import text
+
+from app import db
+
+
+class TestReplyCap:
+    @pytest.fixture
+    def config_overrides(self):
+        return {'COMMENTS_REPLIES_PER_COMMENT': 1}
+
+    def test_threads_are_capped_and_page_through_replies(self, client, seed):
+        response = client.get('/api/posts/{}/comments'.format(seed['posts'][0]))
+        assert response.status_code == 200
+        first, second = response.get_json()['comments']
+
+        assert first['comment']['id'] == seed['first']
+        assert (first['comment']['reply_count'], first['comment']['descendant_count']) == (1, 3)
+        assert [r['id'] for r in first['replies']] == [seed['reply']]
+        assert first['next_cursor'] is not None
+        assert len(second['replies']) == 1
+        assert second['next_cursor'] is None
+
+        # The rest of the thread, same depth limit, after the reply already shown
+        response = client.get('/api/posts/{}/comments/{}/replies?depth=2&cursor={}'.format(
+            seed['posts'][0], seed['first'], first['next_cursor']))
+        assert response.status_code == 200
+        page = response.get_json()
+        assert [(c['id'], c['depth']) for c in page['comments']] == [(seed['nested'], 2)]
+        assert page['next_cursor'] is None
+
+
+def test_migrates_comment_table_from_before_paths(app, seed):
+    runner = app.test_cli_runner()
+    with app.app_context():
+        db.session.execute(text('DROP TABLE comment'))
+        db.session.execute(text(
+            'CREATE TABLE comment (id INTEGER PRIMARY KEY, content VARCHAR(10), parent_id INTEGER, '
+            'post_id INTEGER NOT NULL, is_active BOOLEAN, user_id INTEGER NOT NULL, created_at DATETIME)'))
+        db.session.execute(text(
+            "INSERT INTO comment (id, content, parent_id, post_id, is_active, user_id, created_at) VALUES "
+            "(1, 'old', NULL, :post, 1, :user, '2024-01-01'), (2, 'older', 1, :post, 1, :user, '2024-01-01'), "
+            "(3, 'oldest', 2, :post, 1, :user, '2024-01-01')"),
+            {'post': seed['posts'][1], 'user': seed['alice']})
+        db.session.commit()
+
+    result = runner.invoke(args=['add-comment-paths'])
+    assert result.exit_code == 0, result.output
+    assert 'path, depth, reply_count, descendant_count' in result.output
+    assert 'already present' in runner.invoke(args=['add-comment-paths']).output
+    result = runner.invoke(args=['backfill-comment-paths'])
+    assert result.exit_code == 0, result.output
+
+    with app.app_context():
+        indexes = db.session.execute(text("PRAGMA index_list('comment')")).all()
+        assert 'ix_comment_post_path' in {row[1] for row in indexes}
+
+    response = app.test_client().get('/api/posts/{}/comments'.format(seed['posts'][1]))
+    assert response.status_code == 200
+    [thread] = response.get_json()['comments']
+    assert (thread['comment']['id'], thread['comment']['descendant_count']) == (1, 2)
+    assert [(r['id'], r['depth']) for r in thread['replies']] == [(2, 1), (3, 2)]
+
+
+def test_comments_need_an_existing_post_and_parent(app, client, seed):
+    response = client.post('/api/posts/99999/comments', json={'content': 'orphan', 'userId': seed['alice']})
+    assert response.status_code == 404
+    # A parent from another post's thread
+    response = client.post('/api/posts/{}/comments'.format(seed['posts'][1]),
+                           json={'content': 'stray', 'userId': seed['alice'], 'parentId': seed['first']})
+    assert response.status_code == 404
+
+    with app.app_context():
+        assert db.session.scalar(text("SELECT count(*) FROM comment WHERE content IN ('orphan', 'stray')")) == 0
+        foreign_keys = db.session.execute(text("PRAGMA foreign_key_list('comment')")).all()
+        assert {(row[2], row[3]) for row in foreign_keys} >= {('posts', 'post_id'), ('comment', 'parent_id')}
@@ -0,0 +1,105 @@
+"""Market data gateway against the benchmark's fake upstream on a local port"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.market_data import market_data
+from benchmarks.market_data_bench import FakeUpstream
+
+
+@pytest.fixture(scope='module')
+def upstream():
+    server = FakeUpstream(latency=0.2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def config_overrides(upstream):
+    upstream.hits.clear()
+    upstream.missing.clear()
+    upstream.retry_after = None
+    return {'MARKET_DATA_URL': upstream.url, 'MASSIVE_API_KEY': 'test', 'MARKET_DATA_TIMEOUT': 1.0,
+            'MARKET_DATA_RATE_LIMIT': 100.0, 'MARKET_DATA_BURST': 100, 'WEB_CONCURRENCY': 1}
+
+
+def _ticker_hits(upstream, symbol):
+    return upstream.hits['/v3/reference/tickers?ticker={}'.format(symbol)]
+
+
+def test_concurrent_misses_share_one_upstream_call(app, upstream):
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(lambda _: market_data.ticker('AAPL'), range(20)))
+
+    assert _ticker_hits(upstream, 'AAPL') == 1
+    assert all(result == {'ticker': 'AAPL', 'name': 'AAPL Inc.', 'market': 'stocks'} for result in results)
+    assert market_data.flight.shared > 0
+
+
+class TestShortTTL:
+    @pytest.fixture
+    def config_overrides(self, config_overrides):
+        return dict(config_overrides, MARKET_DATA_TTL=0.3)
+
+    def test_entries_expire_after_ttl(self, app, upstream):
+        market_data.ticker('MSFT')
+        market_data.ticker('MSFT')
+        assert _ticker_hits(upstream, 'MSFT') == 1
+
+        time.sleep(0.4)
+        market_data.ticker('MSFT')
+        assert _ticker_hits(upstream, 'MSFT') == 2
+
+
+def test_unknown_tickers_are_cached_as_not_found(app, client, upstream):
+    upstream.missing.add('NOPE')
+    assert market_data.ticker('NOPE') is None
+    assert market_data.ticker('NOPE') is None
+    assert _ticker_hits(upstream, 'NOPE') == 1
+
+    response = client.get('/api/market/tickers?symbols=NOPE,AAPL')
+    assert response.status_code == 200
+    assert [t['ticker'] for t in response.get_json()['results']] == ['AAPL']
+    assert _ticker_hits(upstream, 'NOPE') == 1
+
+
+def test_batch_fetches_only_the_misses(app, client, upstream):
+    assert client.get('/api/market/tickers?symbols=AAPL,TSLA').status_code == 200
+    response = client.get('/api/market/tickers?symbols=aapl,TSLA,GOOGL,MSFT,GOOGL')
+
+    assert response.status_code == 200
+    assert [t['ticker'] for t in response.get_json()['results']] == ['AAPL', 'TSLA', 'GOOGL', 'MSFT']
+    assert {symbol: _ticker_hits(upstream, symbol) for symbol in ('AAPL', 'TSLA', 'GOOGL', 'MSFT')} == \
+        {'AAPL': 1, 'TSLA': 1, 'GOOGL': 1, 'MSFT': 1}
+
+
+class TestRateLimit:
+    @pytest.fixture
+    def config_overrides(self, config_overrides):
+        return dict(config_overrides, MARKET_DATA_RATE_LIMIT=0.5, MARKET_DATA_BURST=2, MARKET_DATA_TIMEOUT=0.5)
+
+    def test_empty_bucket_answers_503_with_retry_after(self, app, client, upstream):
+        for symbol in ('AAPL', 'TSLA'):
+            assert client.get('/api/market/tickers/{}/events'.format(symbol)).status_code == 200
+
+        response = client.get('/api/market/tickers/MSFT/events')
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+        assert sum(upstream.hits.values()) == 2
+        assert market_data.bucket.throttled == 1
+
+    def test_upstream_429_answers_503_and_pauses_requests(self, app, client, upstream):
+        upstream.retry_after = 7
+        response = client.get('/api/market/tickers/AAPL/events')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '7'
+
+        # The bucket is drained for Retry-After, the next miss does not reach upstream
+        upstream.retry_after = None
+        response = client.get('/api/market/tickers/TSLA/events')
+        assert response.status_code == 503
+        assert sum(upstream.hits.values()) == 1
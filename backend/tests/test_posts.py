@@ -0,0 +1,59 @@
+"""Post and comment write paths"""
+import json
+
+import pytest
+
+from app.services.event_broadcaster import GLOBAL, broadcaster
+from app.services.ranking_service import ranking
+
+
+def _events(sub):
+    events = []
+    while not sub.frames.empty():
+        lines = sub.frames.get_nowait().decode('utf-8').splitlines()
+        events.append((lines[1][len('event: '):], json.loads(lines[2][len('data: '):])))
+    return events
+
+
+def test_bulk_import_reaches_hot_posts_and_stream(app, client, seed):
+    with app.app_context():
+        ranking.rebuild()
+    sub = broadcaster.subscribe(GLOBAL)
+    try:
+        response = client.post('/api/posts/bulk', json={'posts': [
+            {'userId': seed['alice'], 'content': 'imported {}'.format(i), 'symbol': 'TSLA',
+             'sentiment': 'Bullish', 'sentimentScore': 90} for i in range(3)]})
+        assert response.status_code == 201
+        events = _events(sub)
+    finally:
+        broadcaster.unsubscribe(sub)
+
+    assert [name for name, _ in events] == ['post_created'] * 3
+    assert {data['content'] for _, data in events} == {'imported 0', 'imported 1', 'imported 2'}
+    imported = {data['id'] for _, data in events}
+    with app.app_context():
+        _, hot_posts = ranking.trending(100)
+    assert imported <= {post_id for post_id, _ in hot_posts}
+
+
+def test_user_score_is_read_only(client, seed):
+    url = '/api/users/{}/score'.format(seed['alice'])
+    assert client.post(url, json={'reputationScore': 100, 'postQualityAvg': 100}).status_code == 405
+    response = client.get(url)
+    assert response.status_code == 200
+    user = response.get_json()['user']
+    # Three posts scored 0, 20 and 40, kept on the user as they were created
+    assert (user['post_count'], user['post_quality_avg']) == (3, 20.0)
+    assert client.get('/api/users/99999/score').status_code == 404
+
+
+class TestWithCache:
+    @pytest.fixture
+    def config_overrides(self):
+        return {'CACHE_BACKEND': 'memory'}
+
+    def test_bulk_import_invalidates_feeds(self, app, client, seed):
+        assert len(client.get('/api/posts').get_json()['posts']) == 6
+        client.post('/api/posts/bulk', json={'posts': [{'userId': seed['bob'], 'content': 'x', 'symbol': 'AAPL'}]})
+        assert len(client.get('/api/posts').get_json()['posts']) == 7
+        assert len(client.get('/api/posts/{}'.format(seed['bob'])).get_json()['posts']) == 4
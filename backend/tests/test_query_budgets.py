@@ -0,0 +1,85 @@
+"""Each budgeted endpoint stays within QUERY_BUDGETS on seeded data that would expose an
+N+1 (several authors, posts and a multi-level comment thread). Under TESTING the request
+hook raises QueryBudgetExceeded; the counter here also reports the exact statements.
+"""
+import pytest
+
+from app import db
+from app.utils.query_budget import QueryCounter
+
+
+def get_within_budget(app, client, url, endpoint):
+    budget = app.config['QUERY_BUDGETS'][endpoint]
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_json()
+    assert 0 < counter.count <= budget, '\n'.join(counter.statements)
+    return response.get_json()
+
+
+def test_budgets_cover_every_tested_endpoint(app):
+    assert set(app.config['QUERY_BUDGETS']) == {
+        'get_all_posts', 'get_posts', 'get_posts_by_symbol', 'get_comments',
+        'get_comments_replies', 'get_user', 'get_symbol_sentiment'}
+
+
+def test_get_all_posts(app, client, seed):
+    data = get_within_budget(app, client, '/api/posts', 'get_all_posts')
+    assert len(data['posts']) == 6
+    assert {post['user']['username'] for post in data['posts']} == {'alice', 'bob'}
+
+
+def test_get_all_posts_next_page(app, client, seed):
+    first = get_within_budget(app, client, '/api/posts?limit=2', 'get_all_posts')
+    data = get_within_budget(app, client, '/api/posts?limit=2&cursor=' + first['next_cursor'], 'get_all_posts')
+    assert len(data['posts']) == 2
+
+
+def test_get_posts(app, client, seed):
+    data = get_within_budget(app, client, '/api/posts/{}'.format(seed['alice']), 'get_posts')
+    assert len(data['posts']) == 3
+
+
+def test_get_posts_by_symbol(app, client, seed):
+    data = get_within_budget(app, client, '/api/posts/symbol/AAPL', 'get_posts_by_symbol')
+    assert len(data['posts']) == 4
+
+
+def test_get_comments(app, client, seed):
+    data = get_within_budget(app, client, '/api/posts/{}/comments?depth=3'.format(seed['posts'][0]),
+                             'get_comments')
+    assert [thread['comment']['content'] for thread in data['comments']] == ['first', 'second']
+    assert [reply['content'] for reply in data['comments'][0]['replies']] == ['reply', 'nested', 'deepest']
+
+
+def test_get_comments_replies(app, client, seed):
+    url = '/api/posts/{}/comments/{}/replies?depth=3'.format(seed['posts'][0], seed['first'])
+    data = get_within_budget(app, client, url, 'get_comments_replies')
+    assert [reply['content'] for reply in data['comments']] == ['reply', 'nested', 'deepest']
+
+
+def test_get_user(app, client, seed):
+    data = get_within_budget(app, client, '/api/users/alice', 'get_user')
+    assert data['user']['username'] == 'alice'
+
+
+@pytest.mark.parametrize('window', ['24h', '7d'])
+def test_get_symbol_sentiment(app, client, seed, window):
+    data = get_within_budget(app, client, '/api/symbols/AAPL/sentiment?window=' + window, 'get_symbol_sentiment')
+    assert data['summary']['total'] == 4
+    assert (data['summary']['bullish'], data['summary']['bearish'], data['summary']['neutral']) == (0, 2, 2)
+
+
+def test_get_symbol_sentiment_errors(client, seed):
+    assert client.get('/api/symbols/AAPL/sentiment?window=bad').status_code == 400
+    assert client.get('/api/symbols/NOPE/sentiment').status_code == 404
+
+
+def test_budget_exceeded_fails_the_request(app, client, seed):
+    from app.utils.query_budget import QueryBudgetExceeded
+
+    app.config['QUERY_BUDGETS']['get_user'] = 0
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/api/users/alice')
@@ -0,0 +1,137 @@
+"""Read replica routing, with a second SQLite file standing in for the replica.
+
+Nothing replicates between the files on its own: the `replicate` fixture copies the
+primary over the replica and sets the replica's heartbeat, which is what decides its lag.
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text, update
+
+from app import db
+from app.cache import cache
+from app.models.models import Posts
+from app.services.post_service import PostService
+from app.utils.replicas import replica_router
+
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    return {'SQLALCHEMY_BINDS': {'replica_0': 'sqlite:///{}'.format(tmp_path / 'replica.db')},
+            'REPLICA_MAX_LAG_SECONDS': 5}
+
+
+@pytest.fixture
+def replicate(app, seed, tmp_path):
+    """replicate(lag) copies the primary to the replica, then ages the replica heartbeat
+    by `lag` seconds and runs a health check. copy=False only moves the heartbeat.
+    """
+    def replicate(lag=0, copy=True):
+        with app.app_context():
+            if copy:
+                db.engines['replica_0'].dispose()
+                primary = sqlite3.connect(str(tmp_path / 'test.db'))
+                replica = sqlite3.connect(str(tmp_path / 'replica.db'))
+                with replica:
+                    primary.backup(replica)
+                primary.close()
+                replica.close()
+            with db.engines['replica_0'].begin() as connection:
+                connection.execute(text('INSERT OR REPLACE INTO replication_heartbeat (id, beat_at) VALUES (1, :at)'),
+                                   {'at': datetime.utcnow() - timedelta(seconds=lag)})
+            replica_router.check()
+        return replica_router.replicas['replica_0']
+
+    return replicate
+
+
+def _post(client, seed, content):
+    response = client.post('/api/posts', json={'userId': seed['alice'], 'content': content, 'symbol': 'AAPL',
+                                               'sentiment': 'Bullish', 'sentimentScore': 50})
+    assert response.status_code in (200, 201), response.get_json()
+
+
+def _feed(client):
+    response = client.get('/api/posts')
+    assert response.status_code == 200
+    return [post['content'] for post in response.get_json()['posts']]
+
+
+def test_reads_go_to_a_caught_up_replica(client, seed, replicate):
+    state = replicate()
+    assert state.healthy and state.lag < 5
+    _post(client, seed, 'not replicated')
+
+    # The replica has not seen the new post, so the feed served from it lacks it
+    reads = state.reads
+    assert 'not replicated' not in _feed(client)
+    assert state.reads == reads + 1
+
+
+def test_lagging_replica_falls_back_to_primary(client, seed, replicate):
+    replicate()
+    _post(client, seed, 'not replicated')
+    state = replicate(lag=30, copy=False)
+    assert not state.healthy
+
+    primary_reads = replica_router.primary_reads
+    assert 'not replicated' in _feed(client)
+    assert replica_router.primary_reads == primary_reads + 1
+
+    state = replicate()
+    assert state.healthy and 'not replicated' in _feed(client)
+
+
+def test_replica_failing_mid_query_is_retried_once_on_primary(app, client, seed, replicate):
+    state = replicate()
+    _post(client, seed, 'not replicated')
+    with app.app_context():
+        with db.engines['replica_0'].begin() as connection:
+            connection.execute(text('DROP TABLE posts'))
+
+    assert 'not replicated' in _feed(client)
+    assert not state.healthy and 'no such table' in state.error
+    # Out of rotation until a health check sees it again
+    primary_reads = replica_router.primary_reads
+    _feed(client)
+    assert replica_router.primary_reads == primary_reads + 1
+
+
+def test_reads_after_a_core_write_stay_on_primary(app, seed, replicate):
+    replicate()
+    post_id = seed['posts'][0]
+    with app.test_request_context():
+        # A Core UPDATE through the session, which never flushes
+        db.session.execute(update(Posts).where(Posts.id == post_id).values(content='edited'))
+        db.session.commit()
+        posts, _ = PostService.get_posts(seed['alice'], 50)
+    assert 'edited' in {row.content for row in posts}
+
+    with app.test_request_context():
+        posts, _ = PostService.get_posts(seed['alice'], 50)
+    assert 'edited' not in {row.content for row in posts}
+
+
+class TestWithCache:
+    @pytest.fixture
+    def config_overrides(self, tmp_path):
+        return {'SQLALCHEMY_BINDS': {'replica_0': 'sqlite:///{}'.format(tmp_path / 'replica.db')},
+                'REPLICA_MAX_LAG_SECONDS': 5, 'CACHE_BACKEND': 'memory'}
+
+    def test_refill_after_invalidation_reads_primary(self, app, client, seed, replicate):
+        state = replicate()
+        _feed(client)
+        _post(client, seed, 'not replicated')
+
+        # The write invalidated the feed, its refill must not cache the replica's stale page
+        reads = state.reads
+        assert 'not replicated' in _feed(client)
+        assert 'not replicated' in _feed(client)
+        assert state.reads == reads
+
+        # Past the lag bound refills go back to the replica
+        cache.primary_refill_seconds = 0
+        _post(client, seed, 'also not replicated')
+        assert 'also not replicated' not in _feed(client)
+        assert state.reads == reads + 1
@@ -0,0 +1,32 @@
+"""Background sentiment scoring: batches claimed twice are only applied once"""
+from sqlalchemy import func, select
+
+from app import db
+from app.models.models import Posts, SentimentRollup, User
+from app.services.sentiment_worker import SentimentWorker
+
+
+def _totals():
+    rollups = db.session.execute(select(
+        func.sum(SentimentRollup.bullish_count), func.sum(SentimentRollup.bearish_count),
+        func.sum(SentimentRollup.neutral_count), func.sum(SentimentRollup.sentiment_score_sum))).one()
+    return tuple(rollups), dict(db.session.execute(select(User.id, User.post_quality_avg)).all())
+
+
+def test_batch_claimed_by_two_processes_is_applied_once(app, seed):
+    with app.app_context():
+        # Two processes on SQLite: no row locks, both claim the same batch
+        first, second = SentimentWorker(app, concurrency=0), SentimentWorker(app, concurrency=0)
+        rows = first._claim()
+        assert [row.id for row in second._claim()] == [row.id for row in rows]
+        results = [('Bearish', -80)] * len(rows)
+
+        assert first._write(rows, results) == len(rows)
+        db.session.commit()
+        applied = _totals()
+        assert applied[0] == (0, len(rows), 0, -80 * len(rows))
+
+        assert second._write(rows, results) == 0
+        db.session.commit()
+        assert _totals() == applied
+        assert db.session.scalar(select(func.count()).where(Posts.processed == False)) == 0  # noqa: E712
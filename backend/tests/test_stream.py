@@ -0,0 +1,128 @@
+"""Event fan-out across processes through the Redis relay, with an in-memory pub/sub stand-in"""
+import json
+import queue
+import threading
+from collections import Counter
+
+import pytest
+
+from app.services.event_broadcaster import GLOBAL, EventBroadcaster, RedisBus, symbol_channel
+
+
+class FakePubSub:
+    def __init__(self):
+        self.topics = set()
+        self.messages = queue.Queue()
+
+    def subscribe(self, topic):
+        self.topics.add(topic)
+
+    def listen(self):
+        while True:
+            yield {'type': 'message', 'data': self.messages.get()}
+
+
+class FakeRedis:
+    """incr, publish and pubsub from the redis-py client, as RedisBus uses them"""
+
+    def __init__(self):
+        self.counters = Counter()
+        self.subscribers = []
+        self._lock = threading.Lock()
+
+    def incr(self, key):
+        with self._lock:
+            self.counters[key] += 1
+            return self.counters[key]
+
+    def publish(self, topic, message):
+        receivers = [p for p in self.subscribers if topic in p.topics]
+        for pubsub in receivers:
+            pubsub.messages.put(message.encode('utf-8'))
+        return len(receivers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub()
+        self.subscribers.append(pubsub)
+        return pubsub
+
+
+def relayed(server):
+    """A broadcaster as init_app builds it for SSE_BUS=redis, one per process"""
+    broadcaster = EventBroadcaster(max_queued=8)
+    broadcaster.bus = RedisBus(server, broadcaster._deliver, broadcaster._resync_all)
+    return broadcaster
+
+
+def _event(sub):
+    lines = sub.frames.get(timeout=2).decode('utf-8').splitlines()
+    return int(lines[0][len('id: '):]), lines[1][len('event: '):], json.loads(lines[2][len('data: '):])
+
+
+def test_events_reach_subscribers_in_other_processes():
+    server = FakeRedis()
+    api_worker, other_worker, stream_server = relayed(server), relayed(server), relayed(server)
+    everything = stream_server.subscribe(GLOBAL)
+    tsla = stream_server.subscribe(symbol_channel('TSLA'))
+    # Publishers know nothing about the listeners, which live in the stream server
+    assert api_worker.has_subscribers()
+
+    api_worker.publish('post_created', {'id': 1}, symbol_code='AAPL')
+    other_worker.publish('post_liked', {'post_id': 2, 'likes_count': 3}, symbol_code='TSLA')
+
+    assert _event(everything) == (1, 'post_created', {'id': 1})
+    assert _event(everything) == (2, 'post_liked', {'post_id': 2, 'likes_count': 3})
+    assert _event(tsla) == (2, 'post_liked', {'post_id': 2, 'likes_count': 3})
+    assert tsla.frames.empty()
+
+
+def test_relay_reconnect_asks_clients_to_resync():
+    stream_server = relayed(FakeRedis())
+    sub = stream_server.subscribe(GLOBAL)
+    stream_server._resync_all()
+    assert sub.overflowed
+    assert sub.frames.get_nowait() == b': relay reconnected\n\n'
+
+
+def test_local_bus_publishes_nothing_without_subscribers():
+    broadcaster = EventBroadcaster()
+    assert not broadcaster.has_subscribers()
+    assert broadcaster.publish('post_created', {'id': 1}) == 0
+    sub = broadcaster.subscribe(GLOBAL)
+    assert broadcaster.publish('post_created', {'id': 1}) == 1
+    assert _event(sub) == (1, 'post_created', {'id': 1})
+
+
+class TestStreamsElsewhere:
+    @pytest.fixture
+    def config_overrides(self):
+        return {'SSE_STREAMS': False}
+
+    def test_stream_routes_are_left_to_the_stream_server(self, client):
+        assert client.get('/api/stream').status_code == 404
+        assert client.get('/api/stream/symbol/AAPL').status_code == 404
+
+
+class DownRedis(FakeRedis):
+    def incr(self, key):
+        raise ConnectionError('Redis is down')
+
+    def publish(self, topic, message):
+        raise ConnectionError('Redis is down')
+
+
+def test_bus_outage_does_not_fail_committed_writes(client, seed):
+    from app.services.event_broadcaster import broadcaster
+
+    broadcaster.bus = RedisBus(DownRedis(), broadcaster._deliver, broadcaster._resync_all)
+    try:
+        assert broadcaster.publish('post_created', {'id': 1}) == 0
+        response = client.post('/api/posts', json={'userId': seed['alice'], 'content': 'saved', 'symbol': 'AAPL',
+                                                   'sentiment': 'Bullish', 'sentimentScore': 50})
+        assert response.status_code == 201
+        assert client.post('/api/posts/{}/like'.format(seed['posts'][0])).status_code == 200
+        response = client.post('/api/posts/{}/comments'.format(seed['posts'][0]),
+                               json={'content': 'saved', 'userId': seed['bob']})
+        assert response.status_code == 200
+    finally:
+        broadcaster.bus = None
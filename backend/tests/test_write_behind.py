@@ -0,0 +1,126 @@
+"""Write-behind queue: 202 with a provisional id, flushes, rejected writes, backpressure and
+replaying the log of a process that died with writes queued.
+
+The flusher thread runs on a long interval here, tests flush by calling write_behind.flush().
+"""
+import os
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app import db
+from app.models.models import Comment, Posts
+from app.services.write_behind import KEY_PREFIX, QueuedWrite, write_behind
+
+
+@pytest.fixture
+def config_overrides():
+    return {'WRITE_BEHIND_ENABLED': True, 'WRITE_BEHIND_FLUSH_INTERVAL': 3600}
+
+
+@pytest.fixture(autouse=True)
+def queue(app):
+    yield write_behind
+    # Commits what is left and drops this app's log, the next app logs under its own WAL dir
+    write_behind.close()
+
+
+def _post(client, seed, content):
+    return client.post('/api/posts', json={'userId': seed['alice'], 'content': content, 'symbol': 'AAPL',
+                                           'sentiment': 'Bullish', 'sentimentScore': 50})
+
+
+def _feed(client, seed):
+    response = client.get('/api/posts', headers={'X-User-Id': str(seed['alice'])})
+    assert response.status_code == 200
+    return [post['id'] for post in response.get_json()['posts']]
+
+
+def test_queued_post_is_answered_202_and_committed_by_flush(client, seed):
+    response = _post(client, seed, 'queued')
+    assert response.status_code == 202
+    view = response.get_json()['post']
+    key = view['id']
+    assert write_behind.is_key(key) and view['pending']
+
+    # Only its author reads it before the flush
+    assert _feed(client, seed)[0] == key
+    assert key not in [post['id'] for post in client.get('/api/posts').get_json()['posts']]
+    assert client.get('/api/writes/' + key).get_json()['status'] == 'pending'
+    response = client.post('/api/posts/{}/like'.format(key))
+    assert response.status_code == 409
+    assert int(response.headers['Retry-After']) >= 1
+
+    assert write_behind.flush() == 1
+    status = client.get('/api/writes/' + key).get_json()
+    assert status['status'] == 'committed'
+    assert _feed(client, seed)[0] == status['id']
+
+    # The provisional id keeps working once committed
+    response = client.post('/api/posts/{}/like'.format(key))
+    assert response.status_code == 200
+    assert (response.get_json()['post']['id'], response.get_json()['post']['likes_count']) == (status['id'], 1)
+    assert client.post('/api/posts/{}unknown/like'.format(KEY_PREFIX)).status_code == 404
+
+
+def test_write_rejected_at_flush_does_not_block_the_queue(app, client, seed):
+    url = '/api/posts/{}/comments'.format(seed['posts'][0])
+    response = client.post(url, json={'content': 'late', 'userId': seed['bob'], 'parentId': seed['deepest']})
+    assert response.status_code == 202
+    reply_key = response.get_json()['comment']['id']
+    post_key = _post(client, seed, 'fine').get_json()['post']['id']
+    pending = client.get(url, headers={'X-User-Id': str(seed['bob'])}).get_json()['pending']
+    assert [comment['id'] for comment in pending] == [reply_key]
+
+    with app.app_context():
+        # The parent is gone by the time the flusher gets to the reply
+        db.session.execute(delete(Comment).where(Comment.id == seed['deepest']))
+        db.session.commit()
+    assert write_behind.flush() == 1
+
+    assert client.get('/api/writes/' + reply_key).get_json()['status'] == 'rejected'
+    assert client.get('/api/writes/' + post_key).get_json()['status'] == 'committed'
+    assert 'pending' not in client.get(url, headers={'X-User-Id': str(seed['bob'])}).get_json()
+
+
+def test_dead_process_log_is_replayed_exactly_once(app, client, seed):
+    key = _post(client, seed, 'committed')
+    logged = write_behind.queued(key.get_json()['post']['id'])
+    assert write_behind.flush() == 1
+
+    # The log of a process that died after committing one write but not the next, mid-line
+    lost = QueuedWrite(KEY_PREFIX + 'lost', 'post', dict(logged.data, content='lost'), logged.user_id, logged.scope)
+    path = os.path.join(write_behind.wal_dir, 'wal-1-dead.log')
+    os.makedirs(write_behind.wal_dir, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as wal:
+        wal.write(logged.log_line() + lost.log_line() + '{"key":"tmp-torn","ki')
+
+    write_behind.recover()
+    write_behind.recover()
+    assert not os.path.exists(path)
+    with app.app_context():
+        counts = dict(db.session.execute(
+            select(Posts.content, func.count()).where(Posts.content.in_(['committed', 'lost'])).group_by(Posts.content)).all())
+        assert counts == {'committed': 1, 'lost': 1}
+        state, post_id = write_behind.status(lost.key)
+        assert state == 'committed' and db.session.get(Posts, post_id).content == 'lost'
+
+
+class TestBackpressure:
+    @pytest.fixture
+    def config_overrides(self):
+        return {'WRITE_BEHIND_ENABLED': True, 'WRITE_BEHIND_FLUSH_INTERVAL': 3600,
+                'WRITE_BEHIND_QUEUE_SIZE': 1, 'WRITE_BEHIND_ENQUEUE_TIMEOUT': 0.05}
+
+    def test_full_queue_answers_503_with_retry_after(self, client, seed):
+        throttled = write_behind.stats_counts['throttled']
+        # A stalled database: the flusher cannot make room
+        with write_behind._flush_lock:
+            assert _post(client, seed, 'fits').status_code == 202
+            response = _post(client, seed, 'waits')
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+        assert write_behind.stats_counts['throttled'] == throttled + 1
+
+        write_behind.flush()
+        assert _post(client, seed, 'room again').status_code == 202
@@ -0,0 +1,15 @@
+"""Production entry point, serve with: gunicorn -c gunicorn.conf.py wsgi:app
+
+Boots with ProductionConfig, which skips db.create_all() (run `flask create-tables`
+after schema changes instead).
+"""
+import os
+
+from app import create_app
+
+app = create_app('app.config.ProductionConfig')
+
+if __name__ == '__main__':
+    # gunicorn does not run on Windows, waitress is a multi-threaded pure-Python fallback
+    from waitress import serve
+    serve(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), threads=app.config['WEB_THREADS'])
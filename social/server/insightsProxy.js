@@ -2,15 +2,13 @@ const express = require('express');
 const fetch = require('node-fetch'); // npm i node-fetch@2
 const app = express();
 
-const MASSIVE_API_URL = 'https://api.massive.example/insights'; // replace with real endpoint
-const API_KEY = process.env.MASSIVE_API_KEY;
-if (!API_KEY) console.warn('MASSIVE_API_KEY not set in env');
+// The backend market data gateway caches insights for every client and holds the
+// Massive API key (MASSIVE_API_KEY / MARKET_DATA_INSIGHTS_URL in the backend config)
+const INSIGHTS_URL = process.env.INSIGHTS_URL || 'http://localhost:5000/api/market/insights';
 
 app.get('/api/insights', async (req, res) => {
   try {
-    const r = await fetch(MASSIVE_API_URL, {
-      headers: { Authorization: `Bearer ${API_KEY}`, 'Content-Type': 'application/json' }
-    });
+    const r = await fetch(INSIGHTS_URL);
     const body = await r.text();
     if (!r.ok) return res.status(r.status).send(body);
     res.type('json').send(body);
@@ -33,9 +31,7 @@ app.get('/api/insights/stream', (req, res) => {
   const send = async () => {
     if (stopped) return;
     try {
-      const r = await fetch(MASSIVE_API_URL, {
-        headers: { Authorization: `Bearer ${API_KEY}`, 'Content-Type': 'application/json' }
-      });
+      const r = await fetch(INSIGHTS_URL);
       if (!r.ok) {
         res.write(`event: error\ndata: ${JSON.stringify({ status: r.status })}\n\n`);
         return;
@@ -30,8 +30,7 @@ class Cerebras {
     }
 }
 
-// accept posts from parent
-const CreatePost = ({ onSuccess, onCancel, posts }) => {
+const CreatePost = ({ onSuccess, onCancel }) => {
     const  user  = JSON.parse(localStorage.getItem('user'));
     const [content, setContent] = useState('');
     const [symbol, setSymbol] = useState('');
@@ -55,72 +54,18 @@ const CreatePost = ({ onSuccess, onCancel, posts }) => {
         });
     };
 
-    const scorePrediction = async () => {
-
-        const userId = user?.id;
-        if (!userId) return;
-        const userPosts = posts.filter(p => (p.user_id === userId) || (p.user && p.user.id === userId));
-        if (userPosts.length === 0) return;
-
-        // compose a single text payload for the model
-        const combined = userPosts.map(p => (p.content || '')).join('\n---\n');
-        await predictScore(combined, userId);
-    };
-
-    const predictScore = async (text, userId) => {
+    // Reputation and post quality are kept current on the server, pick up the new values
+    const refreshUser = async () => {
+        if (!user?.id) return;
         try {
-            setAnalyzing(true);
-            const client = new Cerebras({ api_key: process.env.REACT_APP_CEREBRAS_API_KEY });
-
-            const resp = await client.chat.completions.create({
-                model: "qwen-3-235b-a22b-instruct-2507",
-                messages: [
-                    {
-                        role: "system",
-                        content: "You are a social reputation score analyzer. Given the user's posts, return a JSON object with fields: reputation_score (0-100) and post_quality_avg (numeric). Respond with JSON only."
-                    },
-                    { role: "user", content: text }
-                ],
-                temperature: 0.1,
-                max_tokens: 200,
-                response_format: { type: "json_object" }
-            });
-
-            if (resp && resp.choices && resp.choices[0] && resp.choices[0].message) {
-                let parsed = null;
-                try {
-                    parsed = JSON.parse(resp.choices[0].message.content);
-                } catch (e) {
-                    // some providers return the object directly or under different fields
-                    parsed = resp.choices[0].message.content;
-                }
-                if (parsed && (parsed.reputation_score || parsed.score || parsed.post_quality_avg)) {
-                    const score = parsed.reputation_score ?? parsed.score;
-                    const postQuality = parsed.post_quality_avg ?? parsed.postQualityAvg ?? parsed.post_quality;
-                    // send to backend
-                    const res = await fetch(`http://localhost:5000/api/users/${userId}/score`, {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({
-                            reputationScore: Number(score),
-                            postQualityAvg: Number(postQuality ?? score)
-                        })
-                    }
-                );
-                const user = await res.json();
-                localStorage.setItem('user', JSON.stringify(user.user));
-                } else {
-                    console.warn('LLM did not return expected score fields', parsed);
-                }
-            } else {
-                console.warn('No choices returned from LLM', resp);
-                }
-            } catch (error) {
-                console.error('Error analyzing sentiment:', error);
-            } finally {
-                setAnalyzing(false);
-            }
-        }; // <- ADD THIS CLOSING BRACE for predictScore function
+            const res = await fetch(`http://localhost:5000/api/users/${user.id}/score`);
+            if (!res.ok) return;
+            const data = await res.json();
+            localStorage.setItem('user', JSON.stringify({ ...user, ...data.user }));
+        } catch (error) {
+            console.error('Error refreshing user:', error);
+        }
+    };
 
     const analyzeSentiment = async (text) => {
             if (!text || text.length < 10) return null;
@@ -234,11 +179,11 @@ const CreatePost = ({ onSuccess, onCancel, posts }) => {
                 const result = await response.json();
 
                 setMessage('Post created successfully!');
-                scorePrediction()
-                // Call onSuccess prop if provided
+                refreshUser();
+                // Call onSuccess prop if provided, with the post as created (or queued)
                 if (onSuccess) {
                     setTimeout(() => {
-                        onSuccess();
+                        onSuccess(result.post);
                     }, 1500);
                 }
 
@@ -3,6 +3,11 @@ import { SignedIn, SignedOut, useUser, useClerk } from '@clerk/clerk-react';
 import { useNavigate, Link } from 'react-router-dom';
 import CreatePost from './CreatePost';
 import './Dashboard.css';
+
+const STREAM_URL = process.env.REACT_APP_STREAM_URL || 'http://localhost:5000/api/stream';
+// Shown when the trending leaderboard cannot be loaded
+const FALLBACK_TICKERS = ['AAPL', 'GOOGL', 'MSFT', 'AMZN', 'TSLA', 'NVDA', 'META'];
+
 const Dashboard = () => {
   const { signOut } = useClerk();
   const navigate = useNavigate();
@@ -10,6 +15,8 @@ const Dashboard = () => {
   const user = JSON.parse(localStorage.getItem('user'));
   const [posts, setPosts] = useState([]);
   const [loadingPosts, setLoadingPosts] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [showModal, setShowModal] = useState(false);
   const [expandedPosts, setExpandedPosts] = useState([]); // ids of expanded posts
   // comments state: map postId -> comments array
@@ -23,37 +30,47 @@ const Dashboard = () => {
   const [openReplies, setOpenReplies] = useState({}); // map commentId -> isOpen
   const [repliesMap, setRepliesMap] = useState({}); // map commentId -> replies array
   const [loadingReplies, setLoadingReplies] = useState({});
+  const [commentsCursor, setCommentsCursor] = useState({}); // map postId -> next page of threads
+  const [repliesCursor, setRepliesCursor] = useState({}); // map commentId -> next page of replies
   const [tickers, setTickers] = useState([]);
   const [tickersLoading, setTickersLoading] = useState(false);
   const [tickersError, setTickersError] = useState(null);
-  const MASSIVE_KEY = process.env.REACT_APP_MASSIVE_API_KEY;
 
   const tickersFetchedRef = useRef(false);
   const currentUserId =  user?.id;
   const reputationScore = user?.reputation_score || 0;
   const postQuality = user?.post_quality_avg || 0;
-  const fetchTickers = async (symbols = ['AAPL', 'GOOGL', 'MSFT', 'AMZN', 'TSLA', 'NVDA', 'META']) => {
+  // The symbols trending on the site, from the backend's leaderboard
+  const fetchTrendingSymbols = async () => {
+    try {
+      const res = await fetch(`http://localhost:5000/api/trending?limit=${FALLBACK_TICKERS.length}`);
+      if (!res.ok) throw new Error(`status ${res.status}`);
+      const json = await res.json();
+      return (json.symbols || []).map(symbol => symbol.code).filter(Boolean);
+    } catch (err) {
+      console.error('Trending fetch error, showing the default tickers', err);
+      return FALLBACK_TICKERS;
+    }
+  };
+
+  const fetchTickers = async () => {
     if (tickersFetchedRef.current) return; // already fetched
     tickersFetchedRef.current = true;
 
-    if (!MASSIVE_KEY) {
-      setTickersError('MASSIVE_API_KEY not set');
-      return;
-    }
-
     setTickersLoading(true);
     try {
-      const calls = symbols.map(s =>
-        fetch(`https://api.massive.com/v3/reference/tickers?ticker=${encodeURIComponent(s)}&apikey=${encodeURIComponent(MASSIVE_KEY)}`)
-          .then(r => r.ok ? r.json().catch(() => null) : null)
-          .catch(() => null)
-      );
-
-      const responses = await Promise.all(calls);
-      const results = [];
-      for (const r of responses) {
-        if (r && Array.isArray(r.results) && r.results[0]) results.push(r.results[0]);
+      const symbols = await fetchTrendingSymbols();
+      if (!symbols.length) {
+        setTickers([]);
+        setTickersError(null);
+        return;
       }
+      // One batched lookup through the backend market data gateway, which caches and
+      // rate-limits upstream calls and keeps the API key server-side
+      const res = await fetch(`http://localhost:5000/api/market/tickers?symbols=${symbols.map(encodeURIComponent).join(',')}`);
+      const json = await res.json().catch(() => null);
+      if (!res.ok) throw new Error(json?.error || `status ${res.status}`);
+      const results = Array.isArray(json?.results) ? json.results : [];
       setTickers(results);
       setTickersError(null);
     } catch (err) {
@@ -72,6 +89,51 @@ const Dashboard = () => {
     fetchPosts();
   }, []);
 
+  // Live deltas from /api/stream instead of refetching the feed after every change
+  useEffect(() => {
+    const source = new EventSource(STREAM_URL);
+
+    source.addEventListener('post_created', (e) => {
+      const post = JSON.parse(e.data);
+      setPosts(prev => [
+        post,
+        // Our own queued copy of the post is replaced by the committed one
+        ...(prev || []).filter(p => p.id !== post.id &&
+          !(p.pending && p.content === post.content && (p.user?.id ?? p.user_id) === post.user?.id))
+      ]);
+    });
+
+    source.addEventListener('post_liked', (e) => {
+      const { post_id, likes_count } = JSON.parse(e.data);
+      setPosts(prev => (prev || []).map(p => p.id === post_id ? { ...p, likes_count } : p));
+    });
+
+    source.addEventListener('comment_added', (e) => {
+      const comment = JSON.parse(e.data);
+      setPosts(prev => (prev || []).map(p => (p.id === comment.post_id && p.comments_count != null)
+        ? { ...p, comments_count: p.comments_count + 1 } : p));
+      // The committed copy of one of our queued comments takes its place
+      const committed = c => !(c.pending && c.user_id === comment.user_id && c.content === comment.content);
+      if (!comment.parent_id) {
+        setCommentsMap(prev => (!prev[comment.post_id] || prev[comment.post_id].some(c => c.id === comment.id))
+          ? prev : { ...prev, [comment.post_id]: [...prev[comment.post_id].filter(committed), comment] });
+        return;
+      }
+      // A reply joins the loaded thread holding its parent, threads are keyed by top-level comment
+      setRepliesMap(prev => {
+        const root = Object.keys(prev).find(id => Number(id) === comment.parent_id ||
+          prev[id].some(r => r.id === comment.parent_id));
+        if (root === undefined || prev[root].some(r => r.id === comment.id)) return prev;
+        return { ...prev, [root]: [...prev[root].filter(committed), comment] };
+      });
+    });
+
+    // The server dropped events for us, start over from the feed
+    source.addEventListener('resync', () => fetchPosts());
+
+    return () => source.close();
+  }, []);
+
 
 
   const toggleExpand = (postId) => {
@@ -90,22 +152,39 @@ const Dashboard = () => {
     }
   };
 
-  const fetchComments = async (postId) => {
+  // Queued comments come back without a user, they are all ours
+  const author = { id: currentUserId, username: user?.username, first_name: user?.firstName, profile_picture: user?.imageUrl };
+
+  const fetchComments = async (postId, cursor = null) => {
     try {
-      setLoadingComments(prev => ({ ...prev, [postId]: true }));
-      const res = await fetch(`http://localhost:5000/api/posts/${postId}/comments`);
+      if (!cursor) setLoadingComments(prev => ({ ...prev, [postId]: true }));
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const res = await fetch(`http://localhost:5000/api/posts/${postId}/comments${query}`, {
+        headers: currentUserId ? { 'X-User-Id': String(currentUserId) } : {}
+      });
       if (res.ok) {
         const data = await res.json();
-        const formattedComments = data.comments.map(item => item.comment);
-        setCommentsMap(prev => ({ ...prev, [postId]: formattedComments }));
+        // { comments: [ { comment, replies, next_cursor }, ... ], next_cursor }, replies depth first
+        // Our comments the server queued but has not written yet (first page only), shown as 'Sending…'
+        const pending = (cursor ? [] : data.pending || []).map(c => ({ ...c, user: c.user || author }));
+        const page = [...data.comments.map(item => item.comment), ...pending.filter(c => !c.parent_id)];
+        setCommentsMap(prev => ({ ...prev, [postId]: cursor ? [...(prev[postId] || []), ...page] : page }));
+        setCommentsCursor(prev => ({ ...prev, [postId]: data.next_cursor || null }));
 
         const newReplies = {};
+        const newCursors = {};
         data.comments.forEach(item => {
-          if (item.replies && item.replies.length > 0) {
-            newReplies[item.comment.id] = item.replies;
-          }
+          newReplies[item.comment.id] = item.replies || [];
+          newCursors[item.comment.id] = item.next_cursor || null;
+        });
+        pending.filter(c => !c.parent_id).forEach(c => { newReplies[c.id] = []; });
+        pending.filter(c => c.parent_id).forEach(c => {
+          const root = Object.keys(newReplies).find(id => String(id) === String(c.parent_id) ||
+            newReplies[id].some(r => String(r.id) === String(c.parent_id)));
+          if (root !== undefined) newReplies[root] = [...newReplies[root], c];
         });
         setRepliesMap(prev => ({ ...prev, ...newReplies }));
+        setRepliesCursor(prev => ({ ...prev, ...newCursors }));
       } else {
         console.error('Failed to load comments', res.status);
       }
@@ -116,6 +195,27 @@ const Dashboard = () => {
     }
   };
 
+  // Threads only inline their first replies, the rest come a page at a time
+  const fetchMoreReplies = async (postId, commentId) => {
+    const cursor = repliesCursor[commentId];
+    if (!cursor) return;
+    try {
+      setLoadingReplies(prev => ({ ...prev, [commentId]: true }));
+      const res = await fetch(`http://localhost:5000/api/posts/${postId}/comments/${commentId}/replies?cursor=${encodeURIComponent(cursor)}`);
+      if (res.ok) {
+        const data = await res.json();
+        setRepliesMap(prev => ({ ...prev, [commentId]: [...(prev[commentId] || []), ...data.comments] }));
+        setRepliesCursor(prev => ({ ...prev, [commentId]: data.next_cursor || null }));
+      } else {
+        console.error('Failed to load replies', res.status);
+      }
+    } catch (err) {
+      console.error('Replies fetch error', err);
+    } finally {
+      setLoadingReplies(prev => ({ ...prev, [commentId]: false }));
+    }
+  };
+
   const handleAddComment = async (postId) => {
     const text = (commentInput[postId] || '').trim();
     if (!text) return;
@@ -136,11 +236,11 @@ const Dashboard = () => {
         body: JSON.stringify({ content: text, userId: currentUserId })
       });
       if (res.ok) {
-        const saved = await res.json();
-        // replace temp comment with saved
+        const { comment: saved } = await res.json();
+        // replace temp comment with saved, unless the stream delivered it first
         setCommentsMap(prev => ({
           ...prev,
-          [postId]: (prev[postId] || []).map(c => c.id === newComment.id ? saved : c)
+          [postId]: (prev[postId] || []).filter(c => c.id !== saved.id).map(c => c.id === newComment.id ? { ...saved, user: saved.user || newComment.user } : c)
         }));
       } else {
         console.error('Failed to save comment', res.status);
@@ -166,7 +266,7 @@ const Dashboard = () => {
     if (!window.confirm('Delete this post?')) return;
     try {
       const res = await fetch(`http://localhost:5000/api/posts/${postId}`, { method: 'DELETE' });
-      if (res.ok) fetchPosts();
+      if (res.ok) setPosts(prev => (prev || []).filter(p => p.id !== postId));
       else console.error('Failed to delete post');
     } catch (err) { console.error('Delete error', err); }
   };
@@ -179,11 +279,15 @@ const Dashboard = () => {
     if (!user) navigate('/signin');
   }, [user, navigate]);
 
-  // Fetch posts
-  const fetchPosts = async () => {
-    setLoadingPosts(true);
+  // Fetch the feed, newest first, one keyset page at a time
+  const fetchPosts = async (cursor = null) => {
+    cursor ? setLoadingMore(true) : setLoadingPosts(true);
     try {
-      const res = await fetch('http://localhost:5000/api/posts');
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const res = await fetch(`http://localhost:5000/api/posts${query}`, {
+        // Lets the backend include our posts still queued for writing
+        headers: currentUserId ? { 'X-User-Id': String(currentUserId) } : {}
+      });
       const text = await res.text();
       let data = null;
       if (text) {
@@ -191,11 +295,14 @@ const Dashboard = () => {
       }
       if (!res.ok) throw new Error((data && (data.message || data.error)) || `HTTP ${res.status}`);
       const fetched = data.results || data || [];
-      setPosts(fetched.posts);
+      const page = fetched.posts || [];
+      setPosts(prev => (cursor ? [...prev, ...page] : page));
+      setNextCursor(fetched.next_cursor || null);
     } catch (err) {
       console.error('Fetch posts error', err);
     } finally {
       setLoadingPosts(false);
+      setLoadingMore(false);
     }
   };
 
@@ -204,25 +311,25 @@ const Dashboard = () => {
     navigate('/signin');
   };
 
-  const handlePostCreated = () => {
-    fetchPosts();
+  // The stream brings the committed post to everyone, ours shows up right away
+  const handlePostCreated = (post) => {
+    if (post) {
+      setPosts(prev => (prev || []).some(p => p.id === post.id)
+        ? prev : [{ ...post, user: post.user || user }, ...(prev || [])]);
+    }
     setShowModal(false);
   };
 
   const handleLike = async (postId, isLiked) => {
+    // Optimistic, the post_liked event then carries the committed count
+    const toggle = (liked) => setPosts(prev => (prev || []).map(post => post.id === postId ? {
+      ...post,
+      user_has_liked: !liked,
+      likes_count: liked ? (post.likes_count || 1) - 1 : (post.likes_count || 0) + 1
+    } : post));
+
+    toggle(isLiked);
     try {
-
-      setPosts(posts.map(post => {
-        if (post.id === postId) {
-          return {
-            ...post,
-            user_has_liked: !isLiked,
-            likes_count: isLiked ? (post.likes_count || 1) - 1 : (post.likes_count || 0) + 1
-          };
-        }
-        return post;
-      }));
-
       const response = await fetch(`http://localhost:5000/api/posts/${postId}/like`, {
         method: 'POST',
         headers: {
@@ -232,12 +339,12 @@ const Dashboard = () => {
       });
 
       if (!response.ok) {
-        fetchPosts();
+        toggle(!isLiked);
         console.error('Failed to toggle like');
       }
     } catch (error) {
       console.error('Error toggling like:', error);
-      fetchPosts();
+      toggle(!isLiked);
     }
   };
 
@@ -286,10 +393,10 @@ const Dashboard = () => {
         body: JSON.stringify({ content: text, userId: currentUserId, parentId: commentId })
       });
       if (res.ok) {
-        const saved = await res.json();
+        const { comment: saved } = await res.json();
         setRepliesMap(prev => ({
           ...prev,
-          [commentId]: (prev[commentId] || []).map(r => r.id === newReply.id ? saved : r)
+          [commentId]: (prev[commentId] || []).filter(r => r.id !== saved.id).map(r => r.id === newReply.id ? { ...saved, user: saved.user || newReply.user } : r)
         }));
       }
     } catch (err) { console.error('Add reply error', err); }
@@ -502,7 +609,8 @@ const Dashboard = () => {
                   <div className="spinner"></div>
                 </div>
               ) : posts.length > 0 ? (
-                posts.map((post) => (
+                <>
+                {posts.map((post) => (
                   // highlight own posts visually
                   <div key={post.id} className={`post-card ${post.user?.id === currentUserId ? 'own-post' : ''}`}>
                     <div className="post-header">
@@ -568,6 +676,7 @@ const Dashboard = () => {
                         <button
                           className={`like-button ${post.user_has_liked ? 'liked' : ''}`}
                           onClick={() => handleLike(post.id, post.user_has_liked)}
+                          disabled={post.pending}
                           aria-pressed={post.user_has_liked}
                         >
                           <span className="like-icon">👍</span>
@@ -603,14 +712,14 @@ const Dashboard = () => {
                                 <div className="comment-body">
                                   <div className="comment-meta">
                                     <span className="comment-author">{c.user?.first_name || c.user?.username}</span>
-                                    <span className="comment-time">{formatTimeAgo(c.created_at)}</span>
-                                    {c.user?.id === currentUserId && (
+                                    <span className="comment-time">{c.pending ? 'Sending…' : formatTimeAgo(c.created_at)}</span>
+                                    {c.user?.id === currentUserId && !c.pending && (
                                       <button className="comment-delete" onClick={() => handleDeleteComment(post.id, c.id, c.user?.id)}>Delete</button>
                                     )}
                                   </div>
                                   <div className="comment-content">{c.content}</div>
                                   <button className="reply-toggle" onClick={() => toggleReplies(c.id)}>
-                                    ↳ Reply {repliesMap[c.id]?.length ? `(${repliesMap[c.id].length})` : ''}
+                                    ↳ Reply {(c.descendant_count || repliesMap[c.id]?.length) ? `(${c.descendant_count || repliesMap[c.id].length})` : ''}
                                   </button>
                                   {openReplies[c.id] && (
                                     <div className="replies-section">
@@ -619,13 +728,13 @@ const Dashboard = () => {
                                       ) : (
                                         <>
                                           {(repliesMap[c.id] || []).map((r) => (
-                                            <div key={r.id} className="reply-item">
+                                            <div key={r.id} className="reply-item" style={{ marginLeft: `${Math.max(0, (r.depth || 1) - 1) * 24}px` }}>
                                               <img className="reply-avatar" src={r.user?.profile_picture || r.user?.imageUrl || 'https://via.placeholder.com/28'} onError={(e) => { e.target.onerror = null; e.target.src = 'https://via.placeholder.com/28' }} />
                                               <div className="reply-body">
                                                 <div className="reply-meta">
                                                   <span className="reply-author">{r.user?.first_name || r.user?.username}</span>
-                                                  <span className="reply-time">{formatTimeAgo(r.created_at)}</span>
-                                                  {r.user?.id === currentUserId && (
+                                                  <span className="reply-time">{r.pending ? 'Sending…' : formatTimeAgo(r.created_at)}</span>
+                                                  {r.user?.id === currentUserId && !r.pending && (
                                                     <button className="reply-delete" onClick={() => handleDeleteReply(c.id, r.id, r.user?.id)}>Delete</button>
                                                   )}
                                                 </div>
@@ -633,6 +742,9 @@ const Dashboard = () => {
                                               </div>
                                             </div>
                                           ))}
+                                          {repliesCursor[c.id] && (
+                                            <button className="reply-toggle" onClick={() => fetchMoreReplies(post.id, c.id)}>More replies</button>
+                                          )}
                                           <div className="reply-form">
                                             <textarea
                                               value={replyInput[c.id] || ''}
@@ -649,6 +761,9 @@ const Dashboard = () => {
                               </div>
                             ))}
 
+                            {commentsCursor[post.id] && (
+                              <button className="comments-toggle" onClick={() => fetchComments(post.id, commentsCursor[post.id])}>Load more comments</button>
+                            )}
                             <div className="comment-form">
                               <textarea
                                 value={commentInput[post.id] || ''}
@@ -664,7 +779,13 @@ const Dashboard = () => {
                       </div>
                     )}
                   </div>
-                ))
+                ))}
+                {nextCursor && (
+                  <button className="load-more-btn" onClick={() => fetchPosts(nextCursor)} disabled={loadingMore}>
+                    {loadingMore ? 'Loading...' : 'Load more'}
+                  </button>
+                )}
+                </>
               ) : (
                 <div className="empty-state">
                   <div className="empty-state-icon">📝</div>
@@ -689,7 +810,6 @@ const Dashboard = () => {
               </div>
 
               <CreatePost
-                posts={Array.isArray(posts) ? posts : [posts]}
                 onSuccess={handlePostCreated}
                 onCancel={() => setShowModal(false)}
               />
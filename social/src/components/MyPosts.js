@@ -13,29 +13,40 @@ const MyPosts = () => {
     const postQuality = user?.post_quality_avg || 0;
     const [posts, setPosts] = useState([]);
     const [loadingPosts, setLoadingPosts] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [showModal, setShowModal] = useState(false);
 
     useEffect(() => {
         fetchPosts();
     }, []);
 
-    const fetchPosts = async () => {
+    // The user's own feed, newest first, one keyset page at a time
+    const fetchPosts = async (cursor = null) => {
+        if (!currentUserId) {
+            setLoadingPosts(false);
+            return;
+        }
         try {
-            setLoadingPosts(true);
-            // Fetch ALL posts and filter client-side
-            const response = await fetch('http://localhost:5000/api/posts');
+            cursor ? setLoadingMore(true) : setLoadingPosts(true);
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const response = await fetch(`http://localhost:5000/api/posts/${currentUserId}${query}`, {
+                // Lets the backend include our posts still queued for writing
+                headers: { 'X-User-Id': String(currentUserId) }
+            });
 
             if (response.ok) {
                 const data = await response.json();
-                const allPosts = data.posts || [];
-                // Filter for current user
-                const myPosts = allPosts.filter(post => post.user?.username === user?.username);
-                setPosts(myPosts);
+                // Rows of this feed carry user_id only, they are all ours
+                const page = (data.posts || []).map(post => ({ ...post, user: post.user || user }));
+                setPosts(prev => (cursor ? [...prev, ...page] : page));
+                setNextCursor(data.next_cursor || null);
             }
         } catch (error) {
             console.error('Error fetching posts:', error);
         } finally {
             setLoadingPosts(false);
+            setLoadingMore(false);
         }
     };
 
@@ -92,6 +103,8 @@ const MyPosts = () => {
     const [openReplies, setOpenReplies] = useState({});
     const [repliesMap, setRepliesMap] = useState({});
     const [loadingReplies, setLoadingReplies] = useState({});
+    const [commentsCursor, setCommentsCursor] = useState({}); // map postId -> next page of threads
+    const [repliesCursor, setRepliesCursor] = useState({}); // map commentId -> next page of replies
 
     const toggleExpand = (postId) => {
         setExpandedPosts(prev => prev.includes(postId) ? prev.filter(id => id !== postId) : [...prev, postId]);
@@ -109,24 +122,41 @@ const MyPosts = () => {
         }
     };
 
-    const fetchComments = async (postId) => {
+    // Queued comments come back without a user, they are all ours
+    const author = { id: currentUserId, username: user?.username, first_name: user?.firstName, profile_picture: user?.imageUrl };
+
+    const fetchComments = async (postId, cursor = null) => {
         try {
-            setLoadingComments(prev => ({ ...prev, [postId]: true }));
-            const res = await fetch(`http://localhost:5000/api/posts/${postId}/comments`);
+            if (!cursor) setLoadingComments(prev => ({ ...prev, [postId]: true }));
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const res = await fetch(`http://localhost:5000/api/posts/${postId}/comments${query}`, {
+                headers: currentUserId ? { 'X-User-Id': String(currentUserId) } : {}
+            });
             if (res.ok) {
                 const data = await res.json();
-                // The backend returns { comments: [ { comment: {...}, replies: [...] }, ... ] }
-                const formattedComments = data.comments.map(item => item.comment);
-                setCommentsMap(prev => ({ ...prev, [postId]: formattedComments }));
+                // { comments: [ { comment, replies, next_cursor }, ... ], next_cursor }, replies depth first
+                // Our comments the server queued but has not written yet (first page only), shown as 'Sending…'
+                const pending = (cursor ? [] : data.pending || []).map(c => ({ ...c, user: c.user || author }));
+                const page = [...data.comments.map(item => item.comment), ...pending.filter(c => !c.parent_id)];
+                setCommentsMap(prev => ({ ...prev, [postId]: cursor ? [...(prev[postId] || []), ...page] : page }));
+                setCommentsCursor(prev => ({ ...prev, [postId]: data.next_cursor || null }));
 
-                // Pre-populate replies map
                 const newReplies = {};
+                const newCursors = {};
                 data.comments.forEach(item => {
-                    if (item.replies && item.replies.length > 0) {
-                        newReplies[item.comment.id] = item.replies;
-                    }
+                    newReplies[item.comment.id] = item.replies || [];
+                    newCursors[item.comment.id] = item.next_cursor || null;
+                });
+                pending.filter(c => !c.parent_id).forEach(c => { newReplies[c.id] = []; });
+                pending.filter(c => c.parent_id).forEach(c => {
+                    const root = Object.keys(newReplies).find(id => String(id) === String(c.parent_id) ||
+                        newReplies[id].some(r => String(r.id) === String(c.parent_id)));
+                    if (root !== undefined) newReplies[root] = [...newReplies[root], c];
                 });
                 setRepliesMap(prev => ({ ...prev, ...newReplies }));
+                setRepliesCursor(prev => ({ ...prev, ...newCursors }));
+            } else {
+                console.error('Failed to load comments', res.status);
             }
         } catch (err) {
             console.error('Comments fetch error', err);
@@ -135,6 +165,27 @@ const MyPosts = () => {
         }
     };
 
+    // Threads only inline their first replies, the rest come a page at a time
+    const fetchMoreReplies = async (postId, commentId) => {
+        const cursor = repliesCursor[commentId];
+        if (!cursor) return;
+        try {
+            setLoadingReplies(prev => ({ ...prev, [commentId]: true }));
+            const res = await fetch(`http://localhost:5000/api/posts/${postId}/comments/${commentId}/replies?cursor=${encodeURIComponent(cursor)}`);
+            if (res.ok) {
+                const data = await res.json();
+                setRepliesMap(prev => ({ ...prev, [commentId]: [...(prev[commentId] || []), ...data.comments] }));
+                setRepliesCursor(prev => ({ ...prev, [commentId]: data.next_cursor || null }));
+            } else {
+                console.error('Failed to load replies', res.status);
+            }
+        } catch (err) {
+            console.error('Replies fetch error', err);
+        } finally {
+            setLoadingReplies(prev => ({ ...prev, [commentId]: false }));
+        }
+    };
+
     const handleAddComment = async (postId) => {
         const text = (commentInput[postId] || '').trim();
         if (!text) return;
@@ -154,10 +205,10 @@ const MyPosts = () => {
                 body: JSON.stringify({ content: text, userId: currentUserId })
             });
             if (res.ok) {
-                const saved = await res.json();
+                const { comment: saved } = await res.json();
                 setCommentsMap(prev => ({
                     ...prev,
-                    [postId]: (prev[postId] || []).map(c => c.id === newComment.id ? saved : c)
+                    [postId]: (prev[postId] || []).map(c => c.id === newComment.id ? { ...saved, user: saved.user || newComment.user } : c)
                 }));
             }
         } catch (err) {
@@ -203,10 +254,10 @@ const MyPosts = () => {
                 body: JSON.stringify({ content: text, userId: currentUserId, parentId: commentId })
             });
             if (res.ok) {
-                const saved = await res.json();
+                const { comment: saved } = await res.json();
                 setRepliesMap(prev => ({
                     ...prev,
-                    [commentId]: (prev[commentId] || []).map(r => r.id === newReply.id ? saved : r)
+                    [commentId]: (prev[commentId] || []).map(r => r.id === newReply.id ? { ...saved, user: saved.user || newReply.user } : r)
                 }));
             }
         } catch (err) { console.error('Add reply error', err); }
@@ -424,7 +475,8 @@ const MyPosts = () => {
                                     <div className="spinner"></div>
                                 </div>
                             ) : posts.length > 0 ? (
-                                posts.map((post) => (
+                                <>
+                                {posts.map((post) => (
                                     <div key={post.id} className="post-card">
                                         <div className="post-header">
                                             <div className="author-info">
@@ -446,9 +498,9 @@ const MyPosts = () => {
                                             </div>
                                             <div className="post-meta">
                                                 <div className="post-badges">
-                                                    {post.symbol_id && (
-                                                        <Link to={`/symbol/${post.symbol_id}`} className="post-symbol" onClick={(e) => e.stopPropagation()}>
-                                                            ${post.symbol_id}
+                                                    {post.symbol?.code && (
+                                                        <Link to={`/symbol/${post.symbol.code}`} className="post-symbol" onClick={(e) => e.stopPropagation()}>
+                                                            ${post.symbol.code}
                                                         </Link>
                                                     )}
                                                     {post.sentiment && post.sentiment !== 'Neutral' && (
@@ -475,6 +527,7 @@ const MyPosts = () => {
                                                 <button
                                                     className={`like-button ${post.user_has_liked ? 'liked' : ''}`}
                                                     onClick={() => handleLike(post.id, post.user_has_liked)}
+                                                    disabled={post.pending}
                                                 >
                                                     <span className="like-icon">👍</span>
                                                     <span className="like-count">{post.likes_count || 0}</span>
@@ -506,14 +559,14 @@ const MyPosts = () => {
                                                                 <div className="comment-body">
                                                                     <div className="comment-meta">
                                                                         <span className="comment-author">{c.user?.first_name || c.user?.username}</span>
-                                                                        <span className="comment-time">{formatTimeAgo(c.created_at)}</span>
-                                                                        {c.user?.id === currentUserId && (
+                                                                        <span className="comment-time">{c.pending ? 'Sending…' : formatTimeAgo(c.created_at)}</span>
+                                                                        {c.user?.id === currentUserId && !c.pending && (
                                                                             <button className="comment-delete" onClick={() => handleDeleteComment(post.id, c.id, c.user?.id)}>Delete</button>
                                                                         )}
                                                                     </div>
                                                                     <div className="comment-content">{c.content}</div>
                                                                     <button className="reply-toggle" onClick={() => toggleReplies(c.id)}>
-                                                                        ↳ Reply {repliesMap[c.id]?.length ? `(${repliesMap[c.id].length})` : ''}
+                                                                        ↳ Reply {(c.descendant_count || repliesMap[c.id]?.length) ? `(${c.descendant_count || repliesMap[c.id].length})` : ''}
                                                                     </button>
                                                                     {openReplies[c.id] && (
                                                                         <div className="replies-section">
@@ -522,13 +575,13 @@ const MyPosts = () => {
                                                                             ) : (
                                                                                 <>
                                                                                     {(repliesMap[c.id] || []).map((r) => (
-                                                                                        <div key={r.id} className="reply-item">
+                                                                                        <div key={r.id} className="reply-item" style={{ marginLeft: `${Math.max(0, (r.depth || 1) - 1) * 24}px` }}>
                                                                                             <img className="reply-avatar" src={r.user?.profile_picture || r.user?.imageUrl || 'https://via.placeholder.com/28'} onError={(e) => { e.target.onerror = null; e.target.src = 'https://via.placeholder.com/28' }} />
                                                                                             <div className="reply-body">
                                                                                                 <div className="reply-meta">
                                                                                                     <span className="reply-author">{r.user?.first_name || r.user?.username}</span>
-                                                                                                    <span className="reply-time">{formatTimeAgo(r.created_at)}</span>
-                                                                                                    {r.user?.id === currentUserId && (
+                                                                                                    <span className="reply-time">{r.pending ? 'Sending…' : formatTimeAgo(r.created_at)}</span>
+                                                                                                    {r.user?.id === currentUserId && !r.pending && (
                                                                                                         <button className="reply-delete" onClick={() => handleDeleteReply(c.id, r.id, r.user?.id)}>Delete</button>
                                                                                                     )}
                                                                                                 </div>
@@ -536,6 +589,9 @@ const MyPosts = () => {
                                                                                             </div>
                                                                                         </div>
                                                                                     ))}
+                                                                                    {repliesCursor[c.id] && (
+                                                                                        <button className="reply-toggle" onClick={() => fetchMoreReplies(post.id, c.id)}>More replies</button>
+                                                                                    )}
                                                                                     <div className="reply-form">
                                                                                         <textarea
                                                                                             value={replyInput[c.id] || ''}
@@ -551,6 +607,9 @@ const MyPosts = () => {
                                                                 </div>
                                                             </div>
                                                         ))}
+                                                        {commentsCursor[post.id] && (
+                                                            <button className="comments-toggle" onClick={() => fetchComments(post.id, commentsCursor[post.id])}>Load more comments</button>
+                                                        )}
                                                         <div className="comment-form">
                                                             <textarea
                                                                 value={commentInput[post.id] || ''}
@@ -566,7 +625,13 @@ const MyPosts = () => {
                                             </div>
                                         )}
                                     </div>
-                                ))
+                                ))}
+                                {nextCursor && (
+                                    <button className="load-more-btn" onClick={() => fetchPosts(nextCursor)} disabled={loadingMore}>
+                                        {loadingMore ? 'Loading...' : 'Load more'}
+                                    </button>
+                                )}
+                                </>
                             ) : (
                                 <div className="empty-state">
                                     <div className="empty-state-icon">📝</div>
@@ -4,6 +4,12 @@ import { SignedIn, SignedOut, useUser, useClerk } from '@clerk/clerk-react';
 import './Dashboard.css';
 import './SentimentChart.css';
 
+const SENTIMENT_WINDOWS = {
+  '1h': 'hour',
+  '24h': '24 hours',
+  '7d': '7 days'
+};
+
 const SymbolDetails = ({ symbol }) => {
   const { symbolId } = useParams();
   const navigate = useNavigate();
@@ -24,20 +30,21 @@ const SymbolDetails = ({ symbol }) => {
     neutral: 0,
     total: 0
   });
+  const [sentimentWindow, setSentimentWindow] = useState('24h');
+  const [sentimentSeries, setSentimentSeries] = useState([]);
   const [insights, setInsights] = useState(null);
   const [insightsLoading, setInsightsLoading] = useState(false);
   const [insightsError, setInsightsError] = useState(null);
 
   const pollRef = useRef(null);
 
-  const MASSIVE_KEY = process.env.REACT_APP_MASSIVE_API_KEY;
   const handleSignOut = async () => {
     await signOut();
     navigate('/signin');
   };
   useEffect(() => {
-    if (!symbol || !MASSIVE_KEY) {
-      setInsightsError('Missing symbol or API key');
+    if (!symbol) {
+      setInsightsError('Missing symbol');
       return;
     }
 
@@ -46,8 +53,8 @@ const SymbolDetails = ({ symbol }) => {
     const fetchTickerEvents = async () => {
       try {
         setInsightsLoading(true);
-        // Call Massive ticker events endpoint
-        const url = `https://api.massive.com/v3/reference/tickers/${encodeURIComponent(symbol)}/events?apikey=${encodeURIComponent(MASSIVE_KEY)}`;
+        // Ticker events through the backend market data gateway (cached server-side)
+        const url = `http://localhost:5000/api/market/tickers/${encodeURIComponent(symbol)}/events`;
         const res = await fetch(url);
         if (!res.ok) throw new Error(`status ${res.status}`);
         const json = await res.json();
@@ -69,42 +76,69 @@ const SymbolDetails = ({ symbol }) => {
       mounted = false;
       if (pollRef.current) clearInterval(pollRef.current);
     };
-  }, [symbol, MASSIVE_KEY]);
+  }, [symbol]);
+
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // One keyset page of the symbol feed; a cursor appends to what is loaded
+  const fetchSymbolPosts = async (cursor = null) => {
+    cursor ? setLoadingMore(true) : setLoading(true);
+    setError(null);
+    try {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`http://localhost:5000/api/posts/symbol/${symbolId}${query}`, {
+        // Lets the backend include our posts still queued for writing
+        headers: user?.id ? { 'X-User-Id': String(user.id) } : {}
+      });
+      if (!response.ok) {
+        throw new Error('Failed to fetch posts');
+      }
+      const data = await response.json();
+      const page = data.posts || [];
+
+      setPosts(prev => (cursor ? [...prev, ...page] : page));
+      setNextCursor(data.next_cursor || null);
+    } catch (err) {
+      console.error('Error fetching posts:', err);
+      setError(err.message);
+    } finally {
+      setLoading(false);
+      setLoadingMore(false);
+    }
+  };
+
+  useEffect(() => {
+    if (symbolId) {
+      fetchSymbolPosts();
+    }
+  }, [symbolId]);
 
+  // Counts come from the server-side rollup, not from the pages loaded here
   useEffect(() => {
-    const fetchSymbolPosts = async () => {
-      setLoading(true);
-      setError(null);
+    const fetchSentiment = async () => {
       try {
-        const response = await fetch(`http://localhost:5000/api/posts/symbol/${symbolId}`);
+        const response = await fetch(`http://localhost:5000/api/symbols/${symbolId}/sentiment?window=${sentimentWindow}`);
         if (!response.ok) {
-          throw new Error('Failed to fetch posts');
+          throw new Error('Failed to fetch sentiment');
         }
         const data = await response.json();
-        const symbolPosts = data.posts || data; // Handle both {posts: [...]} and [...] responses
-
-        // Calculate sentiment statistics
-        const stats = {
-          bullish: symbolPosts.filter(p => p.sentiment === 'Bullish').length,
-          bearish: symbolPosts.filter(p => p.sentiment === 'Bearish').length,
-          neutral: symbolPosts.filter(p => !p.sentiment || p.sentiment === 'Neutral').length,
-          total: symbolPosts.length
-        };
-
-        setSentimentStats(stats);
-        setPosts(symbolPosts);
+        const { bullish, bearish, neutral, total } = data.summary;
+        setSentimentStats({ bullish, bearish, neutral, total });
+        setSentimentSeries(data.series || []);
       } catch (err) {
-        console.error('Error fetching posts:', err);
-        setError(err.message);
-      } finally {
-        setLoading(false);
+        console.error('Error fetching sentiment:', err);
+        setSentimentStats({ bullish: 0, bearish: 0, neutral: 0, total: 0 });
+        setSentimentSeries([]);
       }
     };
 
     if (symbolId) {
-      fetchSymbolPosts();
+      fetchSentiment();
     }
-  }, [symbolId]);
+  }, [symbolId, sentimentWindow]);
+
+  const seriesMax = Math.max(1, ...sentimentSeries.map(bucket => bucket.post_count));
 
   const getPercentage = (count) => {
     return sentimentStats.total > 0 ? ((count / sentimentStats.total) * 100).toFixed(1) : 0;
@@ -269,13 +303,43 @@ const SymbolDetails = ({ symbol }) => {
                   <div className="empty-state-icon">⚠️</div>
                   <p>Error loading data: {error}</p>
                 </div>
-              ) : sentimentStats.total > 0 ? (
+              ) : sentimentStats.total > 0 || posts.length > 0 ? (
                 <div className="sentiment-analysis">
                   <div className="sentiment-overview">
                     <h3>Community Sentiment</h3>
-                    <p className="total-posts">{sentimentStats.total} posts about ${symbolId}</p>
+                    <p className="total-posts">
+                      {sentimentStats.total} posts about ${symbolId} in the last {SENTIMENT_WINDOWS[sentimentWindow]}
+                    </p>
+                    <div className="sentiment-windows">
+                      {Object.keys(SENTIMENT_WINDOWS).map(name => (
+                        <button
+                          key={name}
+                          className={`window-btn ${name === sentimentWindow ? 'active' : ''}`}
+                          onClick={() => setSentimentWindow(name)}
+                        >
+                          {name}
+                        </button>
+                      ))}
+                    </div>
                   </div>
 
+                  {sentimentSeries.length > 0 && (
+                    <div className="sentiment-series">
+                      {sentimentSeries.map(bucket => (
+                        <div
+                          key={bucket.bucket_start}
+                          className="series-bucket"
+                          style={{ height: `${(bucket.post_count / seriesMax) * 100}%` }}
+                          title={`${new Date(bucket.bucket_start).toLocaleString()}: ${bucket.post_count} posts`}
+                        >
+                          <div className="series-fill bullish-fill" style={{ flex: bucket.bullish }}></div>
+                          <div className="series-fill neutral-fill" style={{ flex: bucket.neutral }}></div>
+                          <div className="series-fill bearish-fill" style={{ flex: bucket.bearish }}></div>
+                        </div>
+                      ))}
+                    </div>
+                  )}
+
                   <div className="sentiment-chart">
                     <div className="chart-bars">
                       <div className="chart-bar bullish">
@@ -334,7 +398,7 @@ const SymbolDetails = ({ symbol }) => {
                   <div className="recent-posts">
                     <h4>Recent Posts</h4>
                     <div className="posts-list">
-                      {posts.slice(0, 5).map(post => (
+                      {posts.map(post => (
                         <div key={post.id} className="post-preview">
                           <div className="post-preview-header">
                             <span className="author">{post.user?.first_name} {post.user?.last_name}</span>
@@ -348,6 +412,11 @@ const SymbolDetails = ({ symbol }) => {
                         </div>
                       ))}
                     </div>
+                    {nextCursor && (
+                      <button className="load-more-btn" onClick={() => fetchSymbolPosts(nextCursor)} disabled={loadingMore}>
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                      </button>
+                    )}
                   </div>
                 </div>
               ) : (